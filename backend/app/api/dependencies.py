@@ -4,7 +4,10 @@ from app.core.container import AppContainer
 from app.core.settings import AppSettings
 from app.db.session import get_session
 from app.providers.registry import ProviderRegistry
+from app.services.ingest_jobs import IngestJobManager
 from app.services.rag_service import RagService
+from app.services.response_cache import SemanticResponseCache
+from app.services.warmup import ProviderWarmup
 
 
 def _get_container_from_app(app: object) -> AppContainer:
@@ -38,6 +41,24 @@ def get_rag_service_ws(container: AppContainer = Depends(get_container_ws)) -> R
     return container.rag_service
 
 
+def get_ingest_jobs(container: AppContainer = Depends(get_container)) -> IngestJobManager:
+    return container.ingest_jobs
+
+
+def get_response_cache(container: AppContainer = Depends(get_container)) -> SemanticResponseCache:
+    return container.response_cache
+
+
+def get_response_cache_ws(
+    container: AppContainer = Depends(get_container_ws),
+) -> SemanticResponseCache:
+    return container.response_cache
+
+
+def get_warmup(container: AppContainer = Depends(get_container)) -> ProviderWarmup:
+    return container.warmup
+
+
 def get_app_settings(container: AppContainer = Depends(get_container)) -> AppSettings:
     return container.settings
 
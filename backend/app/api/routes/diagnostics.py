@@ -212,10 +212,10 @@ async def diagnose_embedding(
         vectors = await providers.embedding.aembed([text_input])
     except Exception as exc:  # noqa: BLE001
         raise HTTPException(status_code=502, detail=f"embedding failed: {exc}") from exc
-    if not vectors:
+    if not len(vectors):
         raise HTTPException(status_code=502, detail="embedding provider returned empty vector.")
 
-    vector = [float(value) for value in vectors[0]]
+    vector = vectors[0].tolist()
     fallback_used = providers.embedding.fallback_count > fallback_before
     return EmbeddingDiagResponse(
         vector=vector,
@@ -236,7 +236,9 @@ async def diagnose_rag(
         raise HTTPException(status_code=400, detail="query is empty.")
 
     try:
-        docs = await rag_service.search(query, top_k=body.top_k)
+        rag_result = await rag_service.search_detailed(
+            query, top_k=body.top_k, namespace=body.namespace, character_id=body.character_id
+        )
     except Exception as exc:  # noqa: BLE001
         error_text = str(exc).strip()
         error_summary = f"{exc.__class__.__name__}: {error_text}" if error_text else exc.__class__.__name__
@@ -253,16 +255,19 @@ async def diagnose_rag(
             source=str(doc.metadata.get("source") or "unknown") if doc.metadata else "unknown",
             content=doc.page_content,
         )
-        for doc in docs
+        for doc in rag_result.documents
     ]
-    context_text = rag_service.context_as_text(docs)
+    packed = rag_service.build_context(query, rag_result)
     config_top_k = getattr(getattr(rag_service, "_config", None), "top_k", None)
     effective_top_k = body.top_k or config_top_k or len(documents)
 
     return RagDiagResponse(
         query=query,
         documents=documents,
-        context_text=context_text,
+        context_text=packed.text,
+        context_tokens=packed.tokens,
+        context_tokens_saved=packed.tokens_saved,
+        namespace=rag_result.namespace,
         rag_index_loaded=rag_service.is_loaded,
         top_k=effective_top_k,
     )
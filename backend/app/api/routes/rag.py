@@ -0,0 +1,178 @@
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+
+from app.api.dependencies import get_ingest_jobs, get_rag_service
+from app.schemas.rag import (
+    RagBatchSearchItem,
+    RagBatchSearchRequest,
+    RagBatchSearchResponse,
+    RagBatchSearchTimings,
+    NAMESPACE_PATTERN,
+    RagIndexStatus,
+    RagIngestJob,
+    RagIngestJobList,
+    RagIngestRequest,
+    RagNamespacesStatus,
+    RagReloadRequest,
+    RagReloadResponse,
+    RagSearchHit,
+)
+from app.services.ingest_jobs import IngestJob, IngestJobConflictError, IngestJobManager
+from app.services.rag_service import RagService
+
+router = APIRouter()
+
+# 進捗が止まっていても接続を保つため、この間隔でコメント行を送る。
+_SSE_KEEPALIVE_SEC = 15.0
+
+
+@router.get("/rag/index", response_model=RagIndexStatus)
+async def get_rag_index_status(
+    namespace: str | None = Query(default=None, pattern=NAMESPACE_PATTERN),
+    rag_service: RagService = Depends(get_rag_service),
+) -> RagIndexStatus:
+    return RagIndexStatus(**rag_service.status(namespace))
+
+
+@router.get("/rag/namespaces", response_model=RagNamespacesStatus)
+async def get_rag_namespaces(
+    rag_service: RagService = Depends(get_rag_service),
+) -> RagNamespacesStatus:
+    return RagNamespacesStatus(**rag_service.namespaces_status())
+
+
+@router.post("/rag/reload", response_model=RagReloadResponse)
+async def reload_rag_index(
+    body: RagReloadRequest | None = None,
+    rag_service: RagService = Depends(get_rag_service),
+) -> RagReloadResponse:
+    namespace = body.namespace if body else None
+    try:
+        reloaded = await rag_service.reload(force=body.force if body else False, namespace=namespace)
+    except Exception as exc:  # noqa: BLE001
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"index reload failed: {exc}",
+        ) from exc
+    return RagReloadResponse(
+        reloaded=reloaded, index=RagIndexStatus(**rag_service.status(namespace))
+    )
+
+
+@router.post("/rag/search:batch", response_model=RagBatchSearchResponse)
+async def search_rag_batch(
+    body: RagBatchSearchRequest,
+    rag_service: RagService = Depends(get_rag_service),
+) -> RagBatchSearchResponse:
+    try:
+        result = await rag_service.search_many(
+            body.queries, top_k=body.top_k, namespace=body.namespace
+        )
+    except Exception as exc:  # noqa: BLE001
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"rag batch search failed: {exc}",
+        ) from exc
+    items = [
+        RagBatchSearchItem(
+            query=query,
+            documents=[
+                RagSearchHit(
+                    source=str((doc.metadata or {}).get("source") or "unknown"),
+                    content=doc.page_content,
+                    score=score,
+                )
+                for doc, score in hits
+            ],
+        )
+        for query, hits in zip(body.queries, result.results)
+    ]
+    return RagBatchSearchResponse(
+        results=items,
+        timings=RagBatchSearchTimings(**result.timings_ms),
+        index_version=result.index_version,
+        embedding_fallback=result.embedding_fallback,
+        namespace=result.namespace,
+        top_k=body.top_k or rag_service.top_k,
+    )
+
+
+def _get_job(ingest_jobs: IngestJobManager, job_id: str) -> IngestJob:
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="ingest job not found")
+    return job
+
+
+@router.post("/rag/ingest", response_model=RagIngestJob, status_code=status.HTTP_202_ACCEPTED)
+async def start_rag_ingest(
+    response: Response,
+    body: RagIngestRequest | None = None,
+    ingest_jobs: IngestJobManager = Depends(get_ingest_jobs),
+) -> RagIngestJob:
+    body = body or RagIngestRequest()
+    try:
+        job = ingest_jobs.start(
+            source=body.source,
+            namespace=body.namespace,
+            incremental=body.incremental,
+            index_spec=body.index_spec,
+        )
+    except IngestJobConflictError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc)) from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc)) from exc
+    response.headers["Location"] = f"/api/v1/rag/ingest/{job.id}"
+    return RagIngestJob(**job.snapshot())
+
+
+@router.get("/rag/ingest", response_model=RagIngestJobList)
+async def list_rag_ingest_jobs(
+    ingest_jobs: IngestJobManager = Depends(get_ingest_jobs),
+) -> RagIngestJobList:
+    return RagIngestJobList(jobs=[RagIngestJob(**job.snapshot()) for job in ingest_jobs.jobs()])
+
+
+@router.get("/rag/ingest/{job_id}", response_model=RagIngestJob)
+async def get_rag_ingest_job(
+    job_id: str,
+    ingest_jobs: IngestJobManager = Depends(get_ingest_jobs),
+) -> RagIngestJob:
+    return RagIngestJob(**_get_job(ingest_jobs, job_id).snapshot())
+
+
+@router.delete("/rag/ingest/{job_id}", response_model=RagIngestJob)
+async def cancel_rag_ingest_job(
+    job_id: str,
+    ingest_jobs: IngestJobManager = Depends(get_ingest_jobs),
+) -> RagIngestJob:
+    job = _get_job(ingest_jobs, job_id)
+    if not ingest_jobs.cancel(job_id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"ingest job is {job.status}")
+    return RagIngestJob(**job.snapshot())
+
+
+@router.get("/rag/ingest/{job_id}/events", response_class=StreamingResponse)
+async def stream_rag_ingest_job(
+    job_id: str,
+    ingest_jobs: IngestJobManager = Depends(get_ingest_jobs),
+) -> StreamingResponse:
+    """ジョブの状態を変化のたびに SSE で送る (遅い購読者には最新の状態だけを送る)。終了した時点で閉じる。"""
+    job = _get_job(ingest_jobs, job_id)
+
+    async def event_stream() -> AsyncIterator[bytes]:
+        revision = -1
+        while True:
+            if revision == job.revision:
+                if not await job.wait_changed(revision, _SSE_KEEPALIVE_SEC):
+                    yield b": keep-alive\n\n"
+                    continue
+            revision = job.revision
+            payload = RagIngestJob(**job.snapshot()).model_dump_json()
+            yield f"data: {payload}\n\n".encode("utf-8")
+            if job.finished:
+                return
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
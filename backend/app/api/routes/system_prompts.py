@@ -2,13 +2,14 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.dependencies import get_db_session
+from app.api.dependencies import get_db_session, get_response_cache
 from app.repositories.system_prompts import SystemPromptRepository
 from app.schemas.system_prompts import (
     SystemPromptCreate,
     SystemPromptResponse,
     SystemPromptUpdate,
 )
+from app.services.response_cache import SemanticResponseCache
 
 router = APIRouter()
 
@@ -44,11 +45,13 @@ async def get_system_prompt(
 
 @router.post("/system-prompts", response_model=SystemPromptResponse, status_code=status.HTTP_201_CREATED)
 async def create_system_prompt(
-    body: SystemPromptCreate, session: AsyncSession = Depends(get_db_session)
+    body: SystemPromptCreate,
+    session: AsyncSession = Depends(get_db_session),
+    response_cache: SemanticResponseCache = Depends(get_response_cache),
 ) -> SystemPromptResponse:
     repo = SystemPromptRepository(session)
     try:
-        return await repo.create(
+        record = await repo.create(
             title=body.title,
             content=body.content,
             is_active=body.is_active,
@@ -58,6 +61,8 @@ async def create_system_prompt(
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="system prompt title already exists"
         ) from exc
+    response_cache.invalidate("system_prompt_changed")
+    return record
 
 
 @router.put("/system-prompts/{prompt_id}", response_model=SystemPromptResponse)
@@ -65,13 +70,14 @@ async def update_system_prompt(
     prompt_id: int,
     body: SystemPromptUpdate,
     session: AsyncSession = Depends(get_db_session),
+    response_cache: SemanticResponseCache = Depends(get_response_cache),
 ) -> SystemPromptResponse:
     repo = SystemPromptRepository(session)
     record = await repo.get(prompt_id)
     if record is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="system prompt not found")
     try:
-        return await repo.update(
+        record = await repo.update(
             record,
             title=body.title,
             content=body.content,
@@ -82,14 +88,19 @@ async def update_system_prompt(
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="system prompt title already exists"
         ) from exc
+    response_cache.invalidate("system_prompt_changed")
+    return record
 
 
 @router.delete("/system-prompts/{prompt_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_system_prompt(
-    prompt_id: int, session: AsyncSession = Depends(get_db_session)
+    prompt_id: int,
+    session: AsyncSession = Depends(get_db_session),
+    response_cache: SemanticResponseCache = Depends(get_response_cache),
 ) -> None:
     repo = SystemPromptRepository(session)
     record = await repo.get(prompt_id)
     if record is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="system prompt not found")
     await repo.delete(record)
+    response_cache.invalidate("system_prompt_changed")
@@ -9,6 +9,7 @@ from app.api.dependencies import (
     get_db_session,
     get_provider_registry,
     get_rag_service,
+    get_response_cache,
 )
 from app.providers.registry import ProviderRegistry
 from app.repositories.system_prompts import SystemPromptRepository
@@ -16,6 +17,7 @@ from app.repositories.characters import CharacterRepository
 from app.repositories.conversation_logs import ConversationLogRepository
 from app.schemas.text_chat import TextChatRequest
 from app.services.rag_service import RagService
+from app.services.response_cache import SemanticResponseCache
 from app.services.text_chat import TextChatService
 
 router = APIRouter()
@@ -26,9 +28,12 @@ async def post_text_chat(
     body: TextChatRequest,
     providers: ProviderRegistry = Depends(get_provider_registry),
     rag_service: RagService = Depends(get_rag_service),
+    response_cache: SemanticResponseCache = Depends(get_response_cache),
     session: AsyncSession = Depends(get_db_session),
 ) -> StreamingResponse:
-    service = TextChatService(rag_service=rag_service, llm_client=providers.llm)
+    service = TextChatService(
+        rag_service=rag_service, llm_client=providers.llm, response_cache=response_cache
+    )
     repo = ConversationLogRepository(session)
     character_repo = CharacterRepository(session)
     system_prompt_repo = SystemPromptRepository(session)
@@ -51,6 +56,7 @@ async def post_text_chat(
             turn_id=body.turn_id,
             character=character,
             system_prompt=system_prompt_text,
+            namespace=body.namespace,
         ):
             payload = json.dumps(chunk, ensure_ascii=False)
             yield f"data: {payload}\n\n".encode("utf-8")
@@ -1,12 +1,19 @@
 from fastapi import APIRouter, Depends, WebSocket
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.dependencies import get_db_session, get_provider_registry_ws, get_rag_service_ws
+from app.api.dependencies import (
+    get_db_session,
+    get_provider_registry_ws,
+    get_rag_service_ws,
+    get_response_cache_ws,
+)
 from app.core.logging import generate_request_id, reset_request_id, set_request_id
 from app.providers.registry import ProviderRegistry
 from app.repositories.characters import CharacterRepository
 from app.repositories.system_prompts import SystemPromptRepository
+from app.services.rag_index import validate_namespace
 from app.services.rag_service import RagService
+from app.services.response_cache import SemanticResponseCache
 from app.services.ws_session import WebSocketSession
 
 router = APIRouter()
@@ -18,6 +25,7 @@ async def websocket_session(
     session_id: str,
     providers: ProviderRegistry = Depends(get_provider_registry_ws),
     rag_service: RagService = Depends(get_rag_service_ws),
+    response_cache: SemanticResponseCache = Depends(get_response_cache_ws),
     db_session: AsyncSession = Depends(get_db_session),
 ) -> None:
     request_id = websocket.headers.get("x-request-id") or generate_request_id()
@@ -36,6 +44,13 @@ async def websocket_session(
             if character is None:
                 await websocket.close(code=4404, reason="character not found")
                 return
+        rag_namespace = websocket.query_params.get("namespace") or None
+        if rag_namespace is not None:
+            try:
+                validate_namespace(rag_namespace)
+            except ValueError:
+                await websocket.close(code=4400, reason="invalid namespace")
+                return
         prompt_repo = SystemPromptRepository(db_session)
         system_prompt_record = await prompt_repo.get_active() or await prompt_repo.get_latest()
         system_prompt_text = system_prompt_record.content if system_prompt_record else None
@@ -47,6 +62,9 @@ async def websocket_session(
             request_id=request_id,
             character=character,
             system_prompt=system_prompt_text,
+            response_cache=response_cache,
+            audio_codec=websocket.query_params.get("audio_codec"),
+            rag_namespace=rag_namespace,
         )
         await session.run()
     finally:
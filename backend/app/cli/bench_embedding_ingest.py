@@ -0,0 +1,158 @@
+import argparse
+import base64
+import gc
+import json
+import logging
+import time
+import tracemalloc
+from collections.abc import Callable
+
+import faiss
+import httpx
+import numpy as np
+
+from app.core.providers import EmbeddingConfig
+from app.providers.embedding import EmbeddingClient
+
+logger = logging.getLogger(__name__)
+
+
+def _build_transport(dim: int, batch_size: int, llama: bool, encoding: str) -> httpx.MockTransport:
+    """埋め込みサーバの代わりに、事前にエンコードした応答を返すトランスポートを作る。
+
+    サーバ側のコストを除き、クライアント側のパース・行列化・FAISS 追加だけを測る。
+    """
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((batch_size, dim)).astype(np.float32)
+    bodies: dict[int, bytes] = {}
+
+    def _body(count: int) -> bytes:
+        if count not in bodies:
+            rows = vectors[:count]
+            if llama:
+                payload: object = [
+                    {"index": index, "embedding": [row.tolist()]} for index, row in enumerate(rows)
+                ]
+            elif encoding == "base64":
+                payload = {
+                    "data": [
+                        {"index": index, "embedding": base64.b64encode(row.tobytes()).decode("ascii")}
+                        for index, row in enumerate(rows)
+                    ]
+                }
+            else:
+                payload = {"data": [{"index": index, "embedding": row.tolist()} for index, row in enumerate(rows)]}
+            bodies[count] = json.dumps(payload).encode("utf-8")
+        return bodies[count]
+
+    def _handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        count = len(body["content"] if llama else body["input"])
+        return httpx.Response(
+            200, content=_body(count), headers={"content-type": "application/json"}
+        )
+
+    return httpx.MockTransport(_handler)
+
+
+def _legacy_ingest(client: httpx.Client, config: EmbeddingConfig, texts: list[str]) -> faiss.Index:
+    """変更前の経路: 要素ごとに Python float のリストを作り、FAISS 直前に配列へ変換する。"""
+    embeddings: list[list[float]] = []
+    for start in range(0, len(texts), config.batch_size):
+        batch = texts[start : start + config.batch_size]
+        response = client.post(
+            config.endpoint, json={"input": batch, "model": config.model}
+        )
+        for item in response.json()["data"]:
+            embeddings.append([float(x) for x in item["embedding"]])
+    matrix = np.array(embeddings, dtype=np.float32)
+    index = faiss.IndexFlatL2(matrix.shape[1])
+    index.add(matrix)
+    return index
+
+
+def _array_ingest(embedding_client: EmbeddingClient, texts: list[str]) -> faiss.Index:
+    matrix = embedding_client.embed(texts)
+    index = faiss.IndexFlatL2(matrix.shape[1])
+    index.add(matrix)
+    return index
+
+
+def _measure(label: str, run: Callable[[], faiss.Index], chunks: int) -> dict[str, object]:
+    gc.collect()
+    start = time.perf_counter()
+    index = run()
+    elapsed = time.perf_counter() - start
+    if index.ntotal != chunks:
+        raise RuntimeError(f"{label}: expected {chunks} vectors, got {index.ntotal}")
+    del index
+    # tracemalloc は Python 側の処理を遅くするため、時間とは別に測る。
+    gc.collect()
+    tracemalloc.start()
+    index = run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del index
+    return {
+        "path": label,
+        "seconds": round(elapsed, 3),
+        "chunks_per_sec": round(chunks / elapsed, 1),
+        "peak_traced_mib": round(peak / 1024 / 1024, 1),
+    }
+
+
+def run_benchmark(chunks: int, dim: int, batch_size: int) -> list[dict[str, object]]:
+    texts = [f"chunk {index}" for index in range(chunks)]
+    results: list[dict[str, object]] = []
+    openai_config = EmbeddingConfig(
+        provider="bench",
+        endpoint="http://bench/v1/embeddings",
+        model="bench",
+        batch_size=batch_size,
+        max_concurrency=1,
+        query_cache_size=0,
+    )
+    with httpx.Client(transport=_build_transport(dim, batch_size, False, "float")) as client:
+        results.append(
+            _measure("legacy list[float]", lambda: _legacy_ingest(client, openai_config, texts), chunks)
+        )
+        array_config = openai_config.model_copy(update={"endpoint": "http://bench/v1"})
+        embedding_client = EmbeddingClient(array_config, None, client)
+        results.append(_measure("float32 array (json)", lambda: _array_ingest(embedding_client, texts), chunks))
+
+    with httpx.Client(transport=_build_transport(dim, batch_size, False, "base64")) as client:
+        base64_config = openai_config.model_copy(
+            update={"endpoint": "http://bench/v1", "encoding_format": "base64"}
+        )
+        embedding_client = EmbeddingClient(base64_config, None, client)
+        results.append(_measure("float32 array (base64)", lambda: _array_ingest(embedding_client, texts), chunks))
+
+    with httpx.Client(transport=_build_transport(dim, batch_size, True, "float")) as client:
+        llama_config = openai_config.model_copy(update={"endpoint": "http://bench/embedding"})
+        embedding_client = EmbeddingClient(llama_config, None, client)
+        results.append(_measure("float32 array (llama-server)", lambda: _array_ingest(embedding_client, texts), chunks))
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compare time and peak memory of the embedding -> FAISS ingest path."
+    )
+    parser.add_argument("--chunks", type=int, default=10_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--batch-size", type=int, default=16)
+    return parser.parse_args()
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    args = parse_args()
+    print(json.dumps(run_benchmark(args.chunks, args.dim, args.batch_size), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+import argparse
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import faiss
+import httpx
+import numpy as np
+
+from app.core.providers import load_providers_config
+from app.core.settings import get_settings
+from app.providers.embedding import EmbeddingClient
+from app.services.ann_index import (
+    IndexSpec,
+    apply_search_params,
+    parse_search_params,
+    rebuild_id_index,
+    spec_from_manifest,
+)
+from app.services.rag_index import NativeRagIndex, namespace_index_path, open_rag_index
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryCase:
+    query: str
+    relevant_ids: set[int] = field(default_factory=set)
+    relevant_sources: list[str] = field(default_factory=list)
+
+    @property
+    def labelled(self) -> bool:
+        return bool(self.relevant_ids or self.relevant_sources)
+
+
+def load_queries(path: Path) -> list[QueryCase]:
+    """JSONL (1 行 1 件) か JSON 配列を読む。各要素は文字列か {"query", "relevant_ids", "relevant_sources"}。"""
+    text = path.read_text(encoding="utf-8")
+    stripped = text.lstrip()
+    items = json.loads(text) if stripped.startswith("[") else [
+        json.loads(line) for line in text.splitlines() if line.strip()
+    ]
+    cases: list[QueryCase] = []
+    for item in items:
+        if isinstance(item, str):
+            cases.append(QueryCase(query=item))
+            continue
+        cases.append(
+            QueryCase(
+                query=item["query"],
+                relevant_ids={int(doc_id) for doc_id in item.get("relevant_ids", [])},
+                relevant_sources=list(item.get("relevant_sources", [])),
+            )
+        )
+    return cases
+
+
+def sample_queries(store: NativeRagIndex, count: int, seed: int) -> list[QueryCase]:
+    """ラベル付きクエリがない場合、チャンク冒頭をクエリにしてそのチャンク自身を正解とする。"""
+    ids = _stored_ids(store.index)
+    rng = np.random.default_rng(seed)
+    chosen = sorted(int(doc_id) for doc_id in rng.choice(ids, size=min(count, len(ids)), replace=False))
+    cases = []
+    for doc_id, doc in zip(chosen, store.fetch(chosen)):
+        query = " ".join(doc.page_content.split())[:200]
+        if query:
+            cases.append(QueryCase(query=query, relevant_ids={doc_id}))
+    return cases
+
+
+def _stored_ids(index: faiss.Index) -> np.ndarray:
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.vector_to_array(index.id_map).astype(np.int64)
+    return np.arange(index.ntotal, dtype=np.int64)
+
+
+def _exact_baseline(index: faiss.Index) -> faiss.Index:
+    """同じベクトル (量子化済みなら復元値) を持つ厳密検索のインデックスを作る。"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap2):
+        return rebuild_id_index(index, IndexSpec())
+    baseline = faiss.IndexFlatL2(index.d)
+    baseline.add(index.reconstruct_n(0, index.ntotal))
+    return baseline
+
+
+def _percentiles(samples_ms: list[float]) -> dict[str, float | None]:
+    if not samples_ms:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    values = np.asarray(samples_ms)
+    return {
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+        "mean": round(float(values.mean()), 3),
+    }
+
+
+def _batched_search(
+    index: faiss.Index, queries: np.ndarray, k: int, batch_size: int
+) -> tuple[np.ndarray, float]:
+    results = []
+    started = time.perf_counter()
+    for start in range(0, len(queries), batch_size):
+        _, ids = index.search(queries[start : start + batch_size], k)
+        results.append(ids)
+    return np.concatenate(results, axis=0), time.perf_counter() - started
+
+
+def _single_query_latencies(index: faiss.Index, queries: np.ndarray, k: int) -> list[float]:
+    latencies = []
+    for row in queries:
+        started = time.perf_counter()
+        index.search(row.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def _label_metrics(
+    cases: list[QueryCase], ranked_ids: np.ndarray, store: NativeRagIndex, k: int
+) -> dict[str, Any]:
+    """正解ラベルに対する MRR と recall@k。出典ラベルは metadata.source の末尾一致で判定する。"""
+    reciprocal_ranks: list[float] = []
+    recalls: list[float] = []
+    for case, row in zip(cases, ranked_ids):
+        if not case.labelled:
+            continue
+        ids = [int(doc_id) for doc_id in row if doc_id != -1]
+        sources = (
+            [str((doc.metadata or {}).get("source", "")) for doc in store.fetch(ids)]
+            if case.relevant_sources
+            else [""] * len(ids)
+        )
+        hits = [
+            doc_id in case.relevant_ids
+            or any(source.endswith(label) for label in case.relevant_sources if label)
+            for doc_id, source in zip(ids, sources)
+        ]
+        first = next((rank for rank, hit in enumerate(hits, start=1) if hit), None)
+        reciprocal_ranks.append(1.0 / first if first else 0.0)
+        matched = len(case.relevant_ids & set(ids)) + sum(
+            1 for label in case.relevant_sources if any(source.endswith(label) for source in sources)
+        )
+        recalls.append(matched / (len(case.relevant_ids) + len(case.relevant_sources)))
+    if not reciprocal_ranks:
+        return {"labelled_queries": 0}
+    return {
+        "labelled_queries": len(reciprocal_ranks),
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4),
+        f"label_recall@{k}": round(float(np.mean(recalls)), 4),
+    }
+
+
+def run_benchmark(
+    store: NativeRagIndex,
+    embedding_client: EmbeddingClient,
+    cases: list[QueryCase],
+    k: int,
+    batch_size: int,
+    embed_samples: int,
+) -> dict[str, Any]:
+    texts = [case.query for case in cases]
+
+    # 埋め込み: バッチ全体のスループットと、1 件ずつ送った場合のレイテンシを分けて測る。
+    started = time.perf_counter()
+    vectors = np.ascontiguousarray(embedding_client.embed(texts), dtype=np.float32)
+    embed_total = time.perf_counter() - started
+    single_embed_ms = []
+    for text in texts[:embed_samples]:
+        started = time.perf_counter()
+        embedding_client.embed([text])
+        single_embed_ms.append((time.perf_counter() - started) * 1000)
+    if vectors.shape != (len(texts), store.dimension):
+        raise RuntimeError(
+            f"Query embeddings have shape {vectors.shape}; index expects (n, {store.dimension})"
+        )
+
+    index = store.index
+    k = min(k, int(index.ntotal))
+    approx_ids, approx_sec = _batched_search(index, vectors, k, batch_size)
+    latencies = _single_query_latencies(index, vectors, k)
+
+    baseline = _exact_baseline(index)
+    exact_ids, exact_sec = _batched_search(baseline, vectors, k, batch_size)
+    recall = np.mean(
+        [
+            len(set(approx[approx != -1]) & set(exact[exact != -1])) / max(1, int((exact != -1).sum()))
+            for approx, exact in zip(approx_ids, exact_ids)
+        ]
+    )
+    manifest = store.manifest
+    return {
+        "index": {
+            "version": store.version,
+            "type": (manifest.get("ann") or {}).get("spec", "flat"),
+            "vectors": store.ntotal,
+            "dimension": store.dimension,
+        },
+        "queries": len(cases),
+        "k": k,
+        "batch_size": batch_size,
+        f"recall@{k}_vs_flat": round(float(recall), 4),
+        **_label_metrics(cases, approx_ids, store, k),
+        "search_latency_ms": _percentiles(latencies),
+        "search_qps": round(len(cases) / approx_sec, 1) if approx_sec else None,
+        "flat_search_qps": round(len(cases) / exact_sec, 1) if exact_sec else None,
+        "embedding": {
+            "batch_total_ms": round(embed_total * 1000, 3),
+            "per_query_ms_batched": round(embed_total * 1000 / max(1, len(texts)), 3),
+            "single_query_latency_ms": _percentiles(single_embed_ms),
+        },
+        "end_to_end_qps": round(len(cases) / (embed_total + approx_sec), 1),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Measure retrieval recall/latency of the FAISS index against an exact flat baseline."
+    )
+    parser.add_argument(
+        "--queries",
+        type=Path,
+        default=None,
+        help="JSONL/JSON query set; items are strings or {query, relevant_ids, relevant_sources}.",
+    )
+    parser.add_argument(
+        "--sample",
+        type=int,
+        default=200,
+        help="Without --queries, use the opening text of this many random chunks as self-labelled queries.",
+    )
+    parser.add_argument("--providers", type=Path, default=get_settings().providers_config_path)
+    parser.add_argument("--index", type=Path, default=get_settings().rag_index_path)
+    parser.add_argument("--namespace", default=None, help="Benchmark this namespace's index.")
+    parser.add_argument("-k", "--top-k", type=int, default=None, help="Default: rag.top_k.")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--embed-samples", type=int, default=20, help="Queries embedded one by one for latency.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="Write the JSON report here as well.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    args = parse_args()
+    config = load_providers_config(args.providers)
+    index_path = namespace_index_path(args.index, args.namespace)
+    store = open_rag_index(index_path.parent, index_path.stem)
+    if not isinstance(store, NativeRagIndex):
+        raise SystemExit(
+            f"No native index under {index_path.parent}; run `python -m app.cli.ingest` (or --migrate) first."
+        )
+    params = dict(spec_from_manifest(store.manifest).search_params())
+    if config.rag.search_params:
+        params.update(parse_search_params(config.rag.search_params))
+    applied = apply_search_params(store.index, params) if params else {}
+    cases = load_queries(args.queries) if args.queries else sample_queries(store, args.sample, args.seed)
+    if not cases:
+        raise SystemExit("No queries to run.")
+
+    with httpx.Client(timeout=get_settings().request_timeout_sec) as sync_client:
+        embedding_client = EmbeddingClient(config.embedding, http_client=None, sync_client=sync_client)
+        fallback_before = embedding_client.fallback_count
+        report = run_benchmark(
+            store,
+            embedding_client,
+            cases,
+            args.top_k or config.rag.top_k,
+            args.batch_size,
+            args.embed_samples,
+        )
+        if embedding_client.fallback_count > fallback_before:
+            raise SystemExit("Embedding provider fallback was used; results would be meaningless.")
+    report["index"]["search_params"] = applied
+    report["query_source"] = str(args.queries) if args.queries else f"sampled chunks (seed={args.seed})"
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    print(output)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import resource
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import httpx
+
+from app.core.providers import load_providers_config
+from app.core.settings import get_settings
+from app.providers.tts import TTSClient
+from app.utils.audio import PcmFramer
+from app.utils.opus import OpusStreamEncoder, opus_encoder_available
+
+logger = logging.getLogger(__name__)
+
+
+def synthesize_speech_like_pcm(seconds: float, sample_rate: int, seed: int = 0) -> bytes:
+    """音声に近いスペクトル (基本周波数の揺らぎ + 倍音 + 息成分 + 音節ごとの無音) の PCM を作る。"""
+    rng = random.Random(seed)
+    total = int(seconds * sample_rate)
+    out = bytearray(total * 2)
+    phase = 0.0
+    syllable_len = int(sample_rate * 0.18)
+    for start in range(0, total, syllable_len):
+        voiced = rng.random() > 0.2
+        f0 = rng.uniform(160.0, 260.0)
+        for i in range(start, min(total, start + syllable_len)):
+            envelope = math.sin(math.pi * (i - start) / syllable_len)
+            value = 0.0
+            if voiced:
+                phase += 2 * math.pi * (f0 + 8 * math.sin(i / sample_rate * 5)) / sample_rate
+                for harmonic in range(1, 6):
+                    value += math.sin(phase * harmonic) / harmonic
+            value = value * 0.35 + rng.uniform(-0.05, 0.05)
+            sample = int(max(-1.0, min(1.0, value * envelope)) * 32767)
+            out[i * 2 : i * 2 + 2] = sample.to_bytes(2, "little", signed=True)
+    return bytes(out)
+
+
+async def fetch_tts_pcm(providers_path: Path, text: str) -> tuple[bytes, int]:
+    config = load_providers_config(providers_path)
+    settings = get_settings()
+    async with httpx.AsyncClient(timeout=settings.request_timeout_sec) as http_client:
+        client = TTSClient(config.tts, http_client)
+        if not client.is_raw_pcm:
+            raise RuntimeError("TTS output_format must be raw PCM to benchmark downstream encoding")
+        chunks = [chunk async for chunk in client.stream_tts(text)]
+        if client.fallback_count:
+            raise RuntimeError("TTS provider fell back to silence; is the TTS service running?")
+    return b"".join(chunks), client.sample_rate
+
+
+async def _iter_frames(pcm: bytes, sample_rate: int, chunk_ms: int) -> AsyncIterator[bytes]:
+    framer = PcmFramer(sample_rate, chunk_ms)
+    for frame in framer.feed(pcm):
+        yield frame
+        await asyncio.sleep(0)
+    tail = framer.flush()
+    if tail:
+        yield tail
+
+
+async def bench_stream(
+    pcm: bytes, sample_rate: int, chunk_ms: int, bitrate_kbps: int
+) -> dict[str, object]:
+    encoder = OpusStreamEncoder(sample_rate=sample_rate, bitrate_kbps=bitrate_kbps)
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    first_byte_ms: float | None = None
+    async for _ in encoder.encode(_iter_frames(pcm, sample_rate, chunk_ms)):
+        if first_byte_ms is None:
+            first_byte_ms = (time.perf_counter() - start) * 1000
+    wall_sec = time.perf_counter() - start
+    usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    child_cpu_sec = (usage_after.ru_utime - usage_before.ru_utime) + (
+        usage_after.ru_stime - usage_before.ru_stime
+    )
+
+    stream_sec = len(pcm) / (sample_rate * 2)
+    pcm_kbps = sample_rate * 16 / 1000
+    encoded_kbps = encoder.encoded_bytes * 8 / 1000 / stream_sec if stream_sec else 0.0
+    return {
+        "sample_rate": sample_rate,
+        "chunk_ms": chunk_ms,
+        "bitrate_kbps": bitrate_kbps,
+        "stream_sec": round(stream_sec, 3),
+        "wall_sec": round(wall_sec, 3),
+        "realtime_factor": round(stream_sec / wall_sec, 1) if wall_sec else None,
+        "first_byte_ms": round(first_byte_ms, 1) if first_byte_ms is not None else None,
+        "encode_cpu_sec": round(child_cpu_sec, 4),
+        "cpu_sec_per_stream_sec": round(child_cpu_sec / stream_sec, 4) if stream_sec else None,
+        "pcm_bytes": encoder.pcm_bytes,
+        "encoded_bytes": encoder.encoded_bytes,
+        "pcm_kbps": round(pcm_kbps, 1),
+        "encoded_kbps": round(encoded_kbps, 1),
+        "bandwidth_saved_pct": (
+            round((1 - encoder.encoded_bytes / encoder.pcm_bytes) * 100, 2)
+            if encoder.pcm_bytes
+            else None
+        ),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Measure Opus encode CPU per stream-second and bandwidth saved vs raw PCM."
+    )
+    parser.add_argument("--seconds", type=float, default=30.0, help="Synthetic stream length.")
+    parser.add_argument(
+        "--sample-rate",
+        type=int,
+        action="append",
+        help="PCM sample rate (repeatable, default: 16000 and 44100).",
+    )
+    parser.add_argument("--chunk-ms", type=int, default=40)
+    parser.add_argument("--bitrate-kbps", type=int, action="append", help="Repeatable (default: 24, 32).")
+    parser.add_argument(
+        "--tts-text",
+        help="Synthesize this text with the configured TTS provider instead of synthetic PCM.",
+    )
+    parser.add_argument("--providers", type=Path, default=get_settings().providers_config_path)
+    return parser.parse_args()
+
+
+async def run(args: argparse.Namespace) -> list[dict[str, object]]:
+    bitrates = args.bitrate_kbps or [24, 32]
+    if args.tts_text:
+        pcm, sample_rate = await fetch_tts_pcm(args.providers, args.tts_text)
+        sources = [(sample_rate, pcm)]
+    else:
+        sources = [
+            (rate, synthesize_speech_like_pcm(args.seconds, rate))
+            for rate in (args.sample_rate or [16000, 44100])
+        ]
+    results = []
+    for sample_rate, pcm in sources:
+        for bitrate in bitrates:
+            results.append(await bench_stream(pcm, sample_rate, args.chunk_ms, bitrate))
+    return results
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    args = parse_args()
+    if not opus_encoder_available():
+        raise SystemExit("ffmpeg with libopus is required for this benchmark")
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
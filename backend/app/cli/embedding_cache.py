@@ -0,0 +1,89 @@
+import argparse
+import json
+import logging
+from pathlib import Path
+
+from app.core.providers import load_providers_config
+from app.core.settings import get_settings
+from app.services.embedding_store import EmbeddingStore, resolve_cache_path
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inspect, compact or clear the persistent ingest embedding cache.")
+    parser.add_argument("command", choices=["stats", "compact", "clear"])
+    parser.add_argument(
+        "--providers",
+        type=Path,
+        default=get_settings().providers_config_path,
+        help="Path to providers.yaml",
+    )
+    parser.add_argument(
+        "--index",
+        type=Path,
+        default=get_settings().rag_index_path,
+        help="Index path used to resolve an 'auto' cache location.",
+    )
+    parser.add_argument(
+        "--cache",
+        default=None,
+        help="Cache file (default: rag.ingest_embedding_cache).",
+    )
+    parser.add_argument(
+        "--max-mb",
+        type=int,
+        default=None,
+        help="compact: evict least recently used vectors above this size (default: rag.ingest_embedding_cache_max_mb).",
+    )
+    parser.add_argument(
+        "--max-age-days",
+        type=float,
+        default=0,
+        help="compact: drop vectors not used by an ingest for this many days (0 = keep).",
+    )
+    parser.add_argument(
+        "--all-models",
+        action="store_true",
+        help="compact: keep vectors of models other than the configured embedding model.",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    args = parse_args()
+    config = load_providers_config(args.providers)
+    path = resolve_cache_path(args.cache or config.rag.ingest_embedding_cache, args.index)
+    if path is None:
+        raise SystemExit("The ingest embedding cache is disabled (rag.ingest_embedding_cache).")
+    if not path.exists():
+        raise SystemExit(f"No embedding cache at {path}")
+
+    store = EmbeddingStore(path)
+    try:
+        if args.command == "compact":
+            max_mb = config.rag.ingest_embedding_cache_max_mb if args.max_mb is None else args.max_mb
+            result = store.compact(
+                max_bytes=max_mb * 1024 * 1024,
+                max_age_sec=args.max_age_days * 86400,
+                keep_models=None if args.all_models else [config.embedding.model],
+            )
+            logger.info(
+                "Removed %d vectors; %d -> %d bytes",
+                result["entries_removed"],
+                result["bytes_before"],
+                result["bytes_after"],
+            )
+        elif args.command == "clear":
+            store.clear()
+        print(json.dumps(store.stats(), ensure_ascii=False))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,704 @@
 import argparse
+import gc
+import json
 import logging
+import os
+import queue
+import time
+from collections import defaultdict, deque
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
+from typing import Any, Callable, Iterator
 
+import faiss
 import httpx
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-from langchain_community.vectorstores import FAISS
+import numpy as np
 from langchain_core.documents import Document
-from langchain_core.embeddings import Embeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from app.cli.ingest_pipeline import (
+    IngestCheckpoint,
+    IngestMemoryLimitError,
+    NearDuplicateFilter,
+    RssGuard,
+    StageStats,
+    chunk_hash,
+    embed_stream,
+    file_sha256,
+    iter_parsed_files,
+    iter_source_files,
+    load_file,
+)
 from app.core.providers import load_providers_config
 from app.core.settings import get_settings
 from app.providers.embedding import EmbeddingClient
+from app.services.ann_index import (
+    IndexSpec,
+    parse_index_spec,
+    rebuild_id_index,
+    remove_ids,
+    resolve_index_spec,
+    spec_from_manifest,
+)
+from app.services.rag_index import (
+    DocstoreWriter,
+    NativeRagIndex,
+    legacy_index_exists,
+    migrate_legacy_index,
+    namespace_index_path,
+    open_published_for_update,
+    publish_native_index,
+)
+from app.services.embedding_store import EmbeddingStore, resolve_cache_path, text_digest
 
 logger = logging.getLogger(__name__)
 
+INGEST_MANIFEST_VERSION = 1
+_FETCH_BATCH = 500
 
-class RemoteEmbeddingsAdapter(Embeddings):
-    def __init__(self, client: EmbeddingClient):
-        self._client = client
 
-    def embed_documents(self, texts: list[str]) -> list[list[float]]:
-        return self._client.embed(texts)
+@dataclass
+class IngestReport:
+    mode: str = "full"
+    files_added: int = 0
+    files_changed: int = 0
+    files_removed: int = 0
+    files_unchanged: int = 0
+    chunks_embedded: int = 0
+    chunks_reused: int = 0
+    chunks_removed: int = 0
+    chunks_deduplicated: int = 0
+    chunks_cached: int = 0
+    files_resumed: int = 0
+    index_spec: str | None = None
+    version: str | None = None
+    peak_rss_mb: float = 0.0
+    throughput: dict[str, Any] = field(default_factory=dict)
 
-    def embed_query(self, text: str) -> list[float]:
-        return self._client.embed([text])[0]
+
+@dataclass
+class IngestOptions:
+    workers: int = 1
+    queue_size: int = 256
+    checkpoint_every: int | None = None
+    abort_rss_mb: int | None = None
+    resume: bool = True
+    index_spec: str | None = None
+    dedup_threshold: float | None = None
+    embedding_cache: str | None = None
+    # 埋め込みバッチごとに StageStats を渡して呼ぶ (API のジョブが進捗を送るのに使う)。
+    progress: Callable[[StageStats], None] | None = None
+
+    @property
+    def requested_spec(self) -> IndexSpec | None:
+        return parse_index_spec(self.index_spec or "auto")
+
+    def dedup_filter(self) -> NearDuplicateFilter | None:
+        return NearDuplicateFilter(self.dedup_threshold) if self.dedup_threshold else None
 
 
 def load_documents(source_dir: Path) -> list[Document]:
     documents: list[Document] = []
-    for path in source_dir.rglob("*"):
-        if path.is_dir():
-            continue
-        suffix = path.suffix.lower()
-        if suffix in {".md", ".txt"}:
-            loader = TextLoader(str(path), autodetect_encoding=True)
-            documents.extend(loader.load())
-        elif suffix == ".pdf":
-            loader = PyPDFLoader(str(path))
-            documents.extend(loader.load())
+    for path in iter_source_files(source_dir):
+        documents.extend(load_file(path))
     return documents
 
 
-def split_documents(documents: list[Document]) -> list[Document]:
-    splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=80)
-    return splitter.split_documents(documents)
+def embed_documents(documents: list[Document], embedding_client: EmbeddingClient) -> np.ndarray:
+    matrix = embedding_client.embed([doc.page_content for doc in documents])
+    if matrix.shape[0] != len(documents):
+        raise RuntimeError(
+            f"Embedding count mismatch: documents={len(documents)} vectors={matrix.shape[0]}"
+        )
+    return np.ascontiguousarray(matrix, dtype=np.float32)
+
+
+class _CachedEmbedder:
+    """永続キャッシュにあるベクトルを再利用し、無いチャンクだけを埋め込む。"""
+
+    def __init__(
+        self,
+        embedding_client: EmbeddingClient,
+        store: EmbeddingStore,
+        stats: StageStats,
+    ):
+        self._client = embedding_client
+        self._store = store
+        self._stats = stats
+        self._dimension: int | None = None
+
+    def __call__(self, documents: list[Document]) -> np.ndarray:
+        model = self._client.config.model
+        digests = [text_digest(doc.page_content) for doc in documents]
+        rows: list[np.ndarray | None] = [None] * len(documents)
+        if self._dimension is None:
+            # 最初の 1 件は必ず埋め込み、いまのエンドポイントが返す次元をキーに使う
+            # (同じモデル名で次元が変わった場合に古いベクトルを使わない)。
+            rows[0] = self._embed([0], documents, digests)[0]
+            self._dimension = int(rows[0].shape[0])
+        found = self._store.get_many(
+            [digest for digest, row in zip(digests, rows) if row is None], model, self._dimension
+        )
+        missing: list[int] = []
+        for position, digest in enumerate(digests):
+            if rows[position] is not None:
+                continue
+            if digest in found:
+                rows[position] = found[digest]
+                self._stats.cached += 1
+            else:
+                missing.append(position)
+        if missing:
+            for position, vector in zip(missing, self._embed(missing, documents, digests)):
+                rows[position] = vector
+        return np.stack(rows)  # type: ignore[arg-type]
+
+    def _embed(self, positions: list[int], documents: list[Document], digests: list[bytes]) -> np.ndarray:
+        fallback_before = self._client.fallback_count
+        matrix = embed_documents([documents[position] for position in positions], self._client)
+        if self._dimension is not None and matrix.shape[1] != self._dimension:
+            msg = f"Embedding dimension changed during ingest ({self._dimension} -> {matrix.shape[1]})"
+            raise RuntimeError(msg)
+        # フォールバックのベクトルは保存しない (インジェスト自体もこのバッチの後で中断する)。
+        if self._client.fallback_count == fallback_before:
+            self._store.put_many([digests[position] for position in positions], self._client.config.model, matrix)
+        return matrix
+
+
+def save_vector_index(
+    index: faiss.Index,
+    documents: list[Document] | Iterator[Document],
+    index_path: Path,
+    keep_versions: int = 3,
+    doc_ids: list[int] | None = None,
+    ingest_manifest: dict[str, Any] | None = None,
+    docstore: Path | None = None,
+    spec: IndexSpec | None = None,
+) -> str:
+    """新しいバージョンとして書き出して公開する。稼働中のサーバは次のポーリングで切り替える。"""
+    extra: dict[str, Any] = {"ann": (spec or IndexSpec()).to_manifest()}
+    if ingest_manifest is not None:
+        extra["ingest"] = ingest_manifest
+    version = publish_native_index(
+        index,
+        documents,
+        index_path.parent,
+        index_path.stem,
+        extra,
+        keep_versions=keep_versions,
+        doc_ids=doc_ids,
+        docstore=docstore,
+    )
+    logger.info(
+        "Published FAISS index version %s (%d vectors) under %s",
+        version,
+        index.ntotal,
+        index_path.parent,
+    )
+    return version
+
+
+def migrate(index_path: Path) -> None:
+    index_dir, name = index_path.parent, index_path.stem
+    if not legacy_index_exists(index_dir, name):
+        msg = f"No legacy {name}.faiss/{name}.pkl pair found under {index_dir.resolve()}"
+        logger.error(msg)
+        raise RuntimeError(msg)
+    version, count = migrate_legacy_index(index_dir, name)
+    logger.info(
+        "Migrated %d documents to native index version %s under %s. "
+        "The legacy %s.faiss/%s.pkl files can be removed once the service has reloaded.",
+        count,
+        version,
+        index_dir,
+        name,
+        name,
+    )
+
+
+def _file_entry(
+    mtime_ns: int,
+    size: int,
+    sha256: str,
+    chunks: list[tuple[int, str]],
+    duplicates: list[tuple[str, int]] | None = None,
+) -> dict[str, Any]:
+    """duplicates は近似重複として埋め込まなかったチャンクの (ハッシュ, 代表チャンクの ID)。"""
+    entry: dict[str, Any] = {
+        "mtime_ns": mtime_ns,
+        "size": size,
+        "sha256": sha256,
+        "chunks": [[doc_id, digest] for doc_id, digest in chunks],
+    }
+    if duplicates:
+        entry["duplicates"] = [[digest, twin] for digest, twin in duplicates]
+    return entry
+
+
+def _ingest_manifest(
+    embedding_client: EmbeddingClient, files: dict[str, Any], next_id: int, dimension: int
+) -> dict[str, Any]:
+    return {
+        "manifest_version": INGEST_MANIFEST_VERSION,
+        "embedding_model": embedding_client.config.model,
+        "dimension": dimension,
+        "next_id": next_id,
+        "files": dict(sorted(files.items())),
+    }
+
+
+def _check_fallback(embedding_client: EmbeddingClient, fallback_before: int) -> None:
+    if embedding_client.fallback_count > fallback_before:
+        msg = (
+            "Embedding provider fallback was used during ingest. "
+            "Ensure the embedding service is running to avoid a mismatched FAISS index."
+        )
+        raise RuntimeError(msg)
 
 
-def save_vector_store(store: FAISS, index_path: Path) -> None:
-    index_dir = index_path.parent
-    index_dir.mkdir(parents=True, exist_ok=True)
-    store.save_local(str(index_dir), index_name=index_path.stem)
-    logger.info("Saved FAISS index to %s", index_dir)
+def _embed_batches(
+    chunks: Iterator[tuple[int, Document]],
+    embedding_client: EmbeddingClient,
+    queue_size: int,
+    stats: StageStats,
+    store: EmbeddingStore | None = None,
+    progress: Callable[[StageStats], None] | None = None,
+) -> Iterator[tuple[list[int], list[Document], np.ndarray]]:
+    """パース済みチャンクを有界キュー経由で受け取り、埋め込みクライアントの並列度を使い切る単位で埋め込む。
 
+    store があれば、同じ本文・モデル・次元のベクトルはキャッシュから取り出して埋め込みを省く。
+    """
+    config = embedding_client.config
+    fallback_before = embedding_client.fallback_count
+    if store is not None:
+        embed = _CachedEmbedder(embedding_client, store, stats)
+    else:
+        embed = lambda batch: embed_documents(batch, embedding_client)  # noqa: E731
+    for ids, documents, matrix in embed_stream(
+        chunks,
+        embed,
+        config.batch_size * config.max_concurrency,
+        queue_size,
+        stats,
+    ):
+        # フォールバックのベクトルが混ざった時点で中断し、残りの埋め込みを無駄にしない。
+        _check_fallback(embedding_client, fallback_before)
+        if progress is not None:
+            progress(stats)
+        yield ids, documents, matrix
+
+
+def _copy_documents(
+    previous: NativeRagIndex,
+    ids: list[int],
+    docstore: DocstoreWriter,
+    dedup: NearDuplicateFilter | None = None,
+) -> int:
+    """公開中バージョンの文書を ID ごとに新しい文書ストアへ写す。dedup があれば署名も登録する。"""
+    for start in range(0, len(ids), _FETCH_BATCH):
+        documents = previous.fetch_map(ids[start : start + _FETCH_BATCH])
+        docstore.add(documents.keys(), documents.values())
+        if dedup is not None:
+            for doc_id, doc in documents.items():
+                dedup.add(doc_id, doc.page_content)
+    return len(ids)
+
+
+def _work_dir(index_path: Path, kind: str) -> Path:
+    return index_path.parent / f".{index_path.stem}.{kind}"
+
+
+def _checkpoint_matches(state: dict[str, Any], source_dir: Path, model: str) -> bool:
+    """同じソース・同じモデルで、完了済みファイルがその後変更されていなければ再開できる。"""
+    if state.get("source_dir") != str(source_dir.resolve()) or state.get("embedding_model") != model:
+        return False
+    for relpath, entry in state.get("files", {}).items():
+        path = source_dir / relpath
+        try:
+            stat = path.stat()
+        except OSError:
+            return False
+        if stat.st_mtime_ns != entry["mtime_ns"] or stat.st_size != entry["size"]:
+            return False
+    return True
+
+
+def _full_ingest(
+    source_dir: Path,
+    index_path: Path,
+    embedding_client: EmbeddingClient,
+    keep_versions: int,
+    options: IngestOptions,
+    store: EmbeddingStore | None = None,
+) -> IngestReport:
+    """ローダー → 分割 → 埋め込み → 書き込みをストリーミングで行い、定期的にチェックポイントを残す。
+
+    文書はバッチごとに一時 SQLite へ書き出すため、メモリに残るのは FAISS のベクトルとキュー内のチャンクだけになる。
+    ベクトルはメモリ上の Flat インデックスに溜めるので、RSS 上限は超えた時点で中断するためのもので、上限内に抑えはしない。
+    """
+    stats = StageStats()
+    guard = RssGuard(options.abort_rss_mb)
+    checkpoint = IngestCheckpoint(_work_dir(index_path, "ingest"))
+    model = embedding_client.config.model
+
+    state = checkpoint.load_state() if options.resume else None
+    if state is not None and not _checkpoint_matches(state, source_dir, model):
+        logger.info("Discarding stale ingest checkpoint under %s", checkpoint.work_dir)
+        state = None
+    index: faiss.Index | None = None
+    if state is None:
+        checkpoint.clear()
+        checkpoint.work_dir.mkdir(parents=True, exist_ok=True)
+        state = {"source_dir": str(source_dir.resolve()), "embedding_model": model, "next_id": 0, "files": {}}
+    else:
+        index = faiss.read_index(str(checkpoint.index_path))
+        # チェックポイント後に追加された、完了していないファイルのチャンクを取り除く。
+        index.remove_ids(faiss.IDSelectorRange(int(state["next_id"]), 2**62))
+        logger.info(
+            "Resuming ingest from checkpoint: %d files, %d vectors already indexed",
+            len(state["files"]),
+            index.ntotal,
+        )
+        if guard.over_limit():
+            # 作りかけのインデックスだけで上限を超えており、再開しても 1 バッチも進めない。
+            msg = (
+                f"The checkpointed index ({index.ntotal} vectors) alone exceeds the {options.abort_rss_mb} MB "
+                "RSS abort limit; raise --abort-above-rss-mb (RAG_INGEST_ABORT_RSS_MB) to finish this ingest."
+            )
+            raise IngestMemoryLimitError(msg)
+    docstore = DocstoreWriter(checkpoint.docs_path)
+    docstore.delete_from(int(state["next_id"]))
+    dedup = options.dedup_filter()
+    if dedup is not None:
+        # 再開時はチェックポイント済みのチャンクとも重複判定できるよう、署名を作り直す。
+        for doc_id, content in docstore.iter_contents():
+            dedup.add(doc_id, content)
+
+    files: dict[str, Any] = state["files"]
+    report = IngestReport(mode="full", files_resumed=len(files))
+    pending = [
+        (path, None) for path in iter_source_files(source_dir)
+        if path.relative_to(source_dir).as_posix() not in files
+    ]
+    stats.files_total = len(pending)
+    finished: queue.SimpleQueue[tuple[str, dict[str, Any], int]] = queue.SimpleQueue()
+    waiting: deque[tuple[str, dict[str, Any], int]] = deque()
+    added_upto = int(state["next_id"])
+
+    def _chunks() -> Iterator[tuple[int, Document]]:
+        next_id = int(state["next_id"])
+        for parsed in iter_parsed_files(pending, source_dir, options.workers, stats):
+            entries: list[tuple[int, str]] = []
+            duplicates: list[tuple[str, int]] = []
+            for doc in parsed.chunks:
+                digest = chunk_hash(doc)
+                twin = dedup.check(next_id, doc.page_content) if dedup is not None else None
+                if twin is not None:
+                    duplicates.append((digest, twin))
+                    continue
+                entries.append((next_id, digest))
+                yield next_id, doc
+                next_id += 1
+            entry = _file_entry(parsed.mtime_ns, parsed.size, parsed.sha256, entries, duplicates)
+            finished.put((parsed.relpath, entry, next_id))
+
+    def _mark_finished() -> None:
+        """全チャンクが索引に入ったファイルだけを完了扱いにする (ID はファイル順に連番)。"""
+        while True:
+            try:
+                waiting.append(finished.get_nowait())
+            except queue.Empty:
+                break
+        while waiting and waiting[0][2] <= added_upto:
+            relpath, entry, boundary = waiting.popleft()
+            files[relpath] = entry
+            state["next_id"] = boundary
+
+    def _save_checkpoint() -> None:
+        _mark_finished()
+        if index is not None:
+            checkpoint.save(index, docstore, state)
+
+    since_checkpoint = 0
+    try:
+        batches = _embed_batches(
+            _chunks(), embedding_client, options.queue_size, stats, store, options.progress
+        )
+        for ids, batch, matrix in batches:
+            if index is None:
+                index = faiss.IndexIDMap2(faiss.IndexFlatL2(matrix.shape[1]))
+            elif matrix.shape[1] != index.d:
+                msg = f"Embedding dimension changed ({index.d} -> {matrix.shape[1]}); remove {checkpoint.work_dir} and retry."
+                raise RuntimeError(msg)
+            index.add_with_ids(matrix, np.asarray(ids, dtype=np.int64))
+            docstore.add(ids, batch)
+            added_upto = ids[-1] + 1
+            report.chunks_embedded += len(ids)
+            since_checkpoint += len(ids)
+            if since_checkpoint >= options.checkpoint_every:
+                _save_checkpoint()
+                since_checkpoint = 0
+            if guard.over_limit():
+                _save_checkpoint()
+                gc.collect()
+                if guard.over_limit():
+                    msg = (
+                        f"Ingest RSS exceeded {options.abort_rss_mb} MB after {index.ntotal} vectors; "
+                        "progress was checkpointed. Re-run the same command to resume."
+                    )
+                    raise IngestMemoryLimitError(msg)
+        _mark_finished()
+    except BaseException:
+        # 中断・失敗時も完了済みファイルまでを残し、次回はその続きから再開する。
+        try:
+            _save_checkpoint()
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Failed to write ingest checkpoint: %s", exc)
+        docstore.close()
+        raise
+
+    docstore.close()
+    if index is None or index.ntotal == 0:
+        checkpoint.clear()
+        resolved = source_dir.resolve()
+        msg = f"No documents found under {resolved}"
+        logger.error(msg)
+        raise RuntimeError(msg)
+
+    # 件数が確定してから種類を決め、ストリーミング中に溜めた厳密インデックスから学習・変換する。
+    spec = resolve_index_spec(options.requested_spec, index.ntotal, index.d)
+    if spec != IndexSpec():
+        started = time.perf_counter()
+        index = rebuild_id_index(index, spec)
+        logger.info("Built %s index in %.1f s", spec.describe(), time.perf_counter() - started)
+    report.files_added = len(files)
+    report.chunks_deduplicated = sum(len(entry.get("duplicates", [])) for entry in files.values())
+    report.index_spec = spec.describe()
+    report.chunks_cached = stats.cached
+    report.throughput = stats.summary()
+    report.peak_rss_mb = round(guard.peak_bytes / 1024 / 1024, 1)
+    report.version = save_vector_index(
+        index,
+        (),
+        index_path,
+        keep_versions=keep_versions,
+        ingest_manifest=_ingest_manifest(embedding_client, files, int(state["next_id"]), int(index.d)),
+        docstore=checkpoint.docs_path,
+        spec=spec,
+    )
+    checkpoint.clear()
+    return report
+
+
+def _incremental_ingest(
+    source_dir: Path,
+    index_path: Path,
+    embedding_client: EmbeddingClient,
+    keep_versions: int,
+    options: IngestOptions,
+    index: faiss.Index,
+    previous: NativeRagIndex,
+    store: EmbeddingStore | None = None,
+) -> IngestReport | None:
+    """前回のマニフェストと比較し、変更されたチャンクだけを埋め込み直す。比較できなければ None。"""
+    state = previous.manifest.get("ingest")
+    if (
+        not isinstance(state, dict)
+        or state.get("manifest_version") != INGEST_MANIFEST_VERSION
+        or not isinstance(index, faiss.IndexIDMap2)
+    ):
+        logger.info("Published index has no ingest manifest; running a full rebuild.")
+        return None
+    if state.get("embedding_model") != embedding_client.config.model:
+        logger.info(
+            "Embedding model changed (%s -> %s); running a full rebuild.",
+            state.get("embedding_model"),
+            embedding_client.config.model,
+        )
+        return None
+    spec = spec_from_manifest(previous.manifest)
+    requested = options.requested_spec
+    if requested is not None and requested.name != spec.name:
+        logger.info("Index type changed (%s -> %s); running a full rebuild.", spec.name, requested.name)
+        return None
 
-def ingest(source_dir: Path, providers_path: Path, index_path: Path) -> None:
+    report = IngestReport(mode="incremental", index_spec=spec.describe())
+    stats = StageStats()
+    guard = RssGuard(options.abort_rss_mb)
+    old_files: dict[str, Any] = state.get("files") or {}
+    next_id = int(state.get("next_id", 0))
+    files: dict[str, Any] = {}
+    reused_ids: list[int] = []
+    removed_ids: list[int] = []
+    changed: list[tuple[Path, str | None]] = []
+    unchanged: dict[str, Any] = {}
+
+    for path in iter_source_files(source_dir):
+        relpath = path.relative_to(source_dir).as_posix()
+        entry = old_files.get(relpath)
+        stat = path.stat()
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            unchanged[relpath] = entry
+            continue
+        if not entry:
+            changed.append((path, None))
+            continue
+        sha256 = file_sha256(path)
+        if entry["sha256"] == sha256:
+            # touch されただけのファイルはチャンクもそのまま使う。
+            unchanged[relpath] = {**entry, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+            continue
+        changed.append((path, sha256))
+
+    for relpath, entry in old_files.items():
+        if not (source_dir / relpath).is_file():
+            removed_ids.extend(doc_id for doc_id, _ in entry["chunks"])
+            report.files_removed += 1
+
+    # 近似重複として省いたチャンクの代表が削除・変更されうる場合は、そのファイルも読み直して判定し直す。
+    at_risk = set(removed_ids)
+    for path, _ in changed:
+        entry = old_files.get(path.relative_to(source_dir).as_posix()) or {}
+        at_risk.update(doc_id for doc_id, _ in entry.get("chunks", []))
+    for relpath, entry in list(unchanged.items()):
+        if any(twin in at_risk for _, twin in entry.get("duplicates", [])):
+            changed.append((source_dir / relpath, entry["sha256"]))
+            del unchanged[relpath]
+    files.update(unchanged)
+    reused_ids.extend(doc_id for entry in unchanged.values() for doc_id, _ in entry["chunks"])
+    report.files_unchanged = len(unchanged)
+
+    if not changed and not removed_ids and files == old_files:
+        logger.info("No source changes since version %s; nothing to publish.", previous.version)
+        report.chunks_reused = len(reused_ids)
+        report.version = previous.version
+        return report
+
+    dedup = options.dedup_filter() if changed else None
+    stats.files_total = len(changed)
+
+    def _chunks() -> Iterator[tuple[int, Document]]:
+        nonlocal next_id
+        for parsed in iter_parsed_files(changed, source_dir, options.workers, stats):
+            entry = old_files.get(parsed.relpath)
+            available: dict[str, list[int]] = defaultdict(list)
+            for doc_id, digest in (entry or {}).get("chunks", []):
+                available[digest].append(doc_id)
+            entries: list[tuple[int, str]] = []
+            duplicates: list[tuple[str, int]] = []
+            for doc in parsed.chunks:
+                digest = chunk_hash(doc)
+                if available.get(digest):
+                    doc_id = available[digest].pop(0)
+                    reused_ids.append(doc_id)
+                    if dedup is not None:
+                        dedup.add(doc_id, doc.page_content)
+                else:
+                    twin = dedup.check(next_id, doc.page_content) if dedup is not None else None
+                    if twin is not None:
+                        duplicates.append((digest, twin))
+                        continue
+                    doc_id = next_id
+                    next_id += 1
+                    yield doc_id, doc
+                entries.append((doc_id, digest))
+            removed_ids.extend(doc_id for ids in available.values() for doc_id in ids)
+            files[parsed.relpath] = _file_entry(
+                parsed.mtime_ns, parsed.size, parsed.sha256, entries, duplicates
+            )
+            if entry:
+                report.files_changed += 1
+            else:
+                report.files_added += 1
+
+    staging = IngestCheckpoint(_work_dir(index_path, "incremental"))
+    staging.clear()
+    staging.work_dir.mkdir(parents=True, exist_ok=True)
+    docstore = DocstoreWriter(staging.docs_path)
+    new_ids: list[int] = []
+    copied = 0
+    try:
+        # 変更のないファイルの文書を先に移し、新しいチャンクの重複判定の対象にする。
+        copied = _copy_documents(previous, reused_ids, docstore, dedup)
+        batches = _embed_batches(
+            _chunks(), embedding_client, options.queue_size, stats, store, options.progress
+        )
+        for ids, batch, matrix in batches:
+            if matrix.shape[1] != index.d:
+                msg = (
+                    f"Embedding dimension changed ({index.d} -> {matrix.shape[1]}); "
+                    "re-run without --incremental to rebuild the index."
+                )
+                raise RuntimeError(msg)
+            index.add_with_ids(matrix, np.asarray(ids, dtype=np.int64))
+            docstore.add(ids, batch)
+            new_ids.extend(ids)
+            if guard.over_limit():
+                msg = f"Ingest RSS exceeded {options.abort_rss_mb} MB; run a full ingest to use checkpoints."
+                raise IngestMemoryLimitError(msg)
+    except BaseException:
+        docstore.close()
+        staging.clear()
+        raise
+
+    if not files:
+        docstore.close()
+        staging.clear()
+        resolved = source_dir.resolve()
+        msg = f"No documents found under {resolved}"
+        logger.error(msg)
+        raise RuntimeError(msg)
+
+    report.chunks_reused = len(reused_ids)
+    report.chunks_embedded = len(new_ids)
+    report.chunks_removed = len(removed_ids)
+    report.chunks_deduplicated = dedup.dropped if dedup is not None else 0
+    report.chunks_cached = stats.cached
+    report.throughput = stats.summary()
+    report.peak_rss_mb = round(guard.peak_bytes / 1024 / 1024, 1)
+
+    index = remove_ids(index, spec, removed_ids)
+    _copy_documents(previous, reused_ids[copied:], docstore)
+    docstore.close()
+
+    try:
+        report.version = save_vector_index(
+            index,
+            (),
+            index_path,
+            keep_versions=keep_versions,
+            ingest_manifest=_ingest_manifest(embedding_client, files, next_id, int(index.d)),
+            docstore=staging.docs_path,
+            spec=spec,
+        )
+    finally:
+        staging.clear()
+    return report
+
+
+def ingest(
+    source_dir: Path,
+    providers_path: Path,
+    index_path: Path,
+    incremental: bool = False,
+    options: IngestOptions | None = None,
+) -> IngestReport:
     config = load_providers_config(providers_path)
     settings = get_settings()
+    options = options or IngestOptions()
+    if options.checkpoint_every is None:
+        options.checkpoint_every = config.rag.ingest_checkpoint_every
+    if options.abort_rss_mb is None:
+        options.abort_rss_mb = config.rag.ingest_abort_rss_mb
+    if options.index_spec is None:
+        options.index_spec = config.rag.index_spec
+    if options.dedup_threshold is None:
+        options.dedup_threshold = config.rag.ingest_dedup_threshold
+    if options.embedding_cache is None:
+        options.embedding_cache = config.rag.ingest_embedding_cache
+    cache_path = resolve_cache_path(options.embedding_cache, index_path)
+    store = EmbeddingStore(cache_path) if cache_path is not None else None
+    # 埋め込みを始める前に書式の誤りを検出する。
+    options.requested_spec
 
     with httpx.Client(timeout=settings.request_timeout_sec) as sync_client:
         embedding_client = EmbeddingClient(
@@ -64,22 +706,70 @@ def ingest(source_dir: Path, providers_path: Path, index_path: Path) -> None:
             http_client=None,
             sync_client=sync_client,
         )
-        documents = split_documents(load_documents(source_dir))
-        if not documents:
-            resolved = source_dir.resolve()
-            msg = f"No documents found under {resolved}"
-            logger.error(msg)
-            raise RuntimeError(msg)
-        embeddings = RemoteEmbeddingsAdapter(embedding_client)
-        fallback_before = embedding_client.fallback_count
-        vector_store = FAISS.from_documents(documents, embeddings)
-        if embedding_client.fallback_count > fallback_before:
-            msg = (
-                "Embedding provider fallback was used during ingest. "
-                "Ensure the embedding service is running to avoid a mismatched FAISS index."
-            )
-            raise RuntimeError(msg)
-        save_vector_store(vector_store, index_path)
+        report: IngestReport | None = None
+        try:
+            opened = open_published_for_update(index_path.parent, index_path.stem) if incremental else None
+            if incremental and opened is None:
+                logger.info("No published native index found; running a full build.")
+            if opened is not None:
+                index, previous = opened
+                try:
+                    report = _incremental_ingest(
+                        source_dir,
+                        index_path,
+                        embedding_client,
+                        config.rag.keep_versions,
+                        options,
+                        index,
+                        previous,
+                        store,
+                    )
+                finally:
+                    previous.close()
+            if report is None:
+                report = _full_ingest(
+                    source_dir, index_path, embedding_client, config.rag.keep_versions, options, store
+                )
+            if store is not None and config.rag.ingest_embedding_cache_max_mb:
+                store.compact(max_bytes=config.rag.ingest_embedding_cache_max_mb * 1024 * 1024)
+        finally:
+            if store is not None:
+                store.close()
+
+    logger.info(
+        "Ingest (%s, %s) done: files added=%d changed=%d removed=%d unchanged=%d; "
+        "chunks embedded=%d reused=%d removed=%d",
+        report.mode,
+        report.index_spec,
+        report.files_added,
+        report.files_changed,
+        report.files_removed,
+        report.files_unchanged,
+        report.chunks_embedded,
+        report.chunks_reused,
+        report.chunks_removed,
+    )
+    if store is not None:
+        logger.info(
+            "Embedding cache %s: %d hits, %d vectors stored",
+            store.path,
+            report.chunks_cached,
+            store.writes,
+        )
+    if report.chunks_deduplicated:
+        logger.info("Dropped %d near-duplicate chunks before embedding", report.chunks_deduplicated)
+    if report.files_resumed:
+        logger.info("Resumed %d files from the previous checkpoint", report.files_resumed)
+    logger.info(
+        "Ingest throughput: %.2f files/s, %.2f chunks/s (parse, %d workers), %.2f embeddings/s; "
+        "peak RSS %.1f MB",
+        report.throughput.get("files_per_sec") or 0.0,
+        report.throughput.get("chunks_per_sec") or 0.0,
+        options.workers,
+        report.throughput.get("embeddings_per_sec") or 0.0,
+        report.peak_rss_mb,
+    )
+    return report
 
 
 def parse_args() -> argparse.Namespace:
@@ -104,6 +794,84 @@ def parse_args() -> argparse.Namespace:
         default=get_settings().rag_index_path,
         help="Destination path for FAISS index (file name stem is used).",
     )
+    parser.add_argument(
+        "--namespace",
+        default=None,
+        help=(
+            "Write to <index dir>/namespaces/<namespace>/ instead of the shared index "
+            "(e.g. character-3 for the character with id 3)."
+        ),
+    )
+    parser.add_argument(
+        "--migrate",
+        action="store_true",
+        help="Convert an existing <stem>.faiss/<stem>.pkl pair at --index to the native format and exit.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only embed new/changed chunks and drop vectors of deleted files, based on the published manifest.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=min(4, os.cpu_count() or 1),
+        help="Processes used to load and split files (1 = parse in the main process).",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=256,
+        help="Maximum parsed chunks buffered ahead of the embedding stage.",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=None,
+        help="Chunks between checkpoints of a full ingest (default: rag.ingest_checkpoint_every).",
+    )
+    parser.add_argument(
+        "--abort-above-rss-mb",
+        "--max-rss-mb",
+        dest="abort_rss_mb",
+        type=int,
+        default=None,
+        help=(
+            "Checkpoint and abort when RSS exceeds this many MB (default: rag.ingest_abort_rss_mb, 0 = no limit). "
+            "This does not bound memory: the index being built stays in RAM and is reloaded on resume."
+        ),
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=None,
+        help=(
+            "Estimated Jaccard similarity above which a chunk is dropped as a near duplicate "
+            "(default: rag.ingest_dedup_threshold, 0 = keep all)."
+        ),
+    )
+    parser.add_argument(
+        "--embedding-cache",
+        default=None,
+        help=(
+            "SQLite file reused across runs for chunk embeddings; 'auto' keeps it next to the index, "
+            "'off' disables it (default: rag.ingest_embedding_cache)."
+        ),
+    )
+    parser.add_argument(
+        "--index-spec",
+        default=None,
+        help=(
+            "FAISS index type: auto, flat, sq8, pq, hnsw, hnsw-sq8, hnsw-pq, ivf, ivf-sq8, ivf-pq "
+            "with optional params, e.g. hnsw:M=32,efSearch=64 or ivf-pq:nlist=1024,nprobe=16,pqM=16 "
+            "(default: rag.index_spec)."
+        ),
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Ignore an existing checkpoint and start the full ingest over.",
+    )
     return parser.parse_args()
 
 
@@ -113,7 +881,30 @@ def main() -> None:
         format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
     )
     args = parse_args()
-    ingest(args.source, args.providers, args.index)
+    try:
+        index_path = namespace_index_path(args.index, args.namespace)
+    except ValueError as exc:
+        raise SystemExit(str(exc)) from exc
+    if args.migrate:
+        migrate(index_path)
+        return
+    report = ingest(
+        args.source,
+        args.providers,
+        index_path,
+        incremental=args.incremental,
+        options=IngestOptions(
+            workers=args.workers,
+            queue_size=args.queue_size,
+            checkpoint_every=args.checkpoint_every,
+            abort_rss_mb=args.abort_rss_mb,
+            resume=not args.no_resume,
+            index_spec=args.index_spec,
+            dedup_threshold=args.dedup_threshold,
+            embedding_cache=args.embedding_cache,
+        ),
+    )
+    print(json.dumps(asdict(report), ensure_ascii=False))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,394 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import faiss
+import numpy as np
+from langchain_community.document_loaders import PyPDFLoader, TextLoader
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.services.rag_index import DocstoreWriter
+
+SOURCE_SUFFIXES = {".md", ".txt", ".pdf"}
+
+
+def iter_source_files(source_dir: Path) -> list[Path]:
+    return sorted(
+        path for path in source_dir.rglob("*") if path.is_file() and path.suffix.lower() in SOURCE_SUFFIXES
+    )
+
+
+def load_file(path: Path) -> list[Document]:
+    if path.suffix.lower() == ".pdf":
+        return PyPDFLoader(str(path)).load()
+    return TextLoader(str(path), autodetect_encoding=True).load()
+
+
+def split_documents(documents: list[Document]) -> list[Document]:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=80)
+    return splitter.split_documents(documents)
+
+
+def chunk_hash(doc: Document) -> str:
+    """本文とメタデータ (出典・ページ等) が同じチャンクは同じベクトルを再利用できる。"""
+    material = json.dumps([doc.page_content, doc.metadata or {}], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class ParsedFile:
+    relpath: str
+    path: Path
+    sha256: str
+    mtime_ns: int
+    size: int
+    chunks: list[Document]
+
+
+def parse_file(path: Path, source_dir: Path, sha256: str | None = None) -> ParsedFile:
+    """1 ファイルを読み込んで分割する。ワーカープロセスから呼ばれるためモジュール直下に置く。"""
+    stat = path.stat()
+    return ParsedFile(
+        relpath=path.relative_to(source_dir).as_posix(),
+        path=path,
+        sha256=sha256 or file_sha256(path),
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+        chunks=split_documents(load_file(path)),
+    )
+
+
+@dataclass
+class StageStats:
+    """ステージごとの処理量と所要時間。parse は並列パース全体の経過時間、embed は埋め込み呼び出しの合計時間。"""
+
+    files: int = 0
+    chunks: int = 0
+    embeddings: int = 0
+    cached: int = 0
+    parse_sec: float = 0.0
+    embed_sec: float = 0.0
+    queue_wait_sec: float = 0.0
+    files_total: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "files": self.files,
+            "chunks": self.chunks,
+            "embeddings": self.embeddings,
+            "embeddings_cached": self.cached,
+            "parse_sec": round(self.parse_sec, 3),
+            "embed_sec": round(self.embed_sec, 3),
+            "embed_wait_for_parse_sec": round(self.queue_wait_sec, 3),
+            "files_per_sec": round(self.files / self.parse_sec, 2) if self.parse_sec else None,
+            "chunks_per_sec": round(self.chunks / self.parse_sec, 2) if self.parse_sec else None,
+            "embeddings_per_sec": round(self.embeddings / self.embed_sec, 2) if self.embed_sec else None,
+        }
+
+    def progress(self) -> dict[str, Any]:
+        """途中経過。残り時間はパース済みファイルの割合から経過時間を按分して見積もる。"""
+        elapsed = time.perf_counter() - self.started_at
+        remaining = max(0, self.files_total - self.files)
+        return {
+            "files": self.files,
+            "files_total": self.files_total,
+            "chunks": self.chunks,
+            "embeddings": self.embeddings,
+            "embeddings_cached": self.cached,
+            "embeddings_per_sec": round(self.embeddings / elapsed, 2) if elapsed > 0 else None,
+            "elapsed_sec": round(elapsed, 1),
+            "eta_sec": round(elapsed * remaining / self.files, 1) if self.files else None,
+        }
+
+
+def _worker_context() -> multiprocessing.context.BaseContext:
+    """スレッドを持つ親から fork するとロック状態を引き継ぐため、forkserver でワーカーを起動する。
+
+    forkserver にこのモジュールを事前ロードさせ、ワーカーごとの LangChain の import を省く。
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+def iter_parsed_files(
+    paths: Iterable[tuple[Path, str | None]],
+    source_dir: Path,
+    workers: int,
+    stats: StageStats,
+) -> Iterator[ParsedFile]:
+    """(パス, 既知の SHA-256) を入力順のままパースして返す。workers > 1 ならプロセスプールで並列化する。
+
+    先読みは workers * 2 件までに抑え、パース済みチャンクが溜まり続けないようにする。
+    """
+    start = time.perf_counter()
+
+    def _record(parsed: ParsedFile) -> ParsedFile:
+        stats.files += 1
+        stats.chunks += len(parsed.chunks)
+        stats.parse_sec = time.perf_counter() - start
+        return parsed
+
+    paths = list(paths)
+    workers = min(workers, len(paths))
+    if workers <= 1:
+        for path, sha256 in paths:
+            yield _record(parse_file(path, source_dir, sha256))
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=_worker_context())
+    pending: deque[Future[ParsedFile]] = deque()
+    remaining = iter(paths)
+    try:
+        for path, sha256 in remaining:
+            pending.append(executor.submit(parse_file, path, source_dir, sha256))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            parsed = pending.popleft().result()
+            next_item = next(remaining, None)
+            if next_item is not None:
+                pending.append(executor.submit(parse_file, next_item[0], source_dir, next_item[1]))
+            yield _record(parsed)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def embed_stream(
+    items: Iterator[tuple[int, Document]],
+    embed: Callable[[list[Document]], np.ndarray],
+    batch_size: int,
+    queue_size: int,
+    stats: StageStats,
+) -> Iterator[tuple[list[int], list[Document], np.ndarray]]:
+    """items (ID 付きチャンク) を別スレッドで生成しつつ、有界キューから batch_size ずつ埋め込む。
+
+    パース側が先行しすぎるとキューが埋まって待たされるため、メモリ上のチャンク数は queue_size に抑えられる。
+    """
+    channel: queue.Queue[Any] = queue.Queue(maxsize=max(1, queue_size))
+    stop = threading.Event()
+
+    def _put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                channel.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce() -> None:
+        try:
+            for item in items:
+                if not _put(item):
+                    return
+            _put(_DONE)
+        except BaseException as exc:  # noqa: BLE001
+            _put(_Failure(exc))
+        finally:
+            # 途中で止めた場合もプロセスプールを後始末させる。
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+
+    def _embed(batch: list[tuple[int, Document]]) -> tuple[list[int], list[Document], np.ndarray]:
+        documents = [doc for _, doc in batch]
+        started = time.perf_counter()
+        matrix = embed(documents)
+        stats.embed_sec += time.perf_counter() - started
+        stats.embeddings += len(documents)
+        return [doc_id for doc_id, _ in batch], documents, matrix
+
+    producer = threading.Thread(target=_produce, name="ingest-parse", daemon=True)
+    producer.start()
+    try:
+        batch: list[tuple[int, Document]] = []
+        while True:
+            waited = time.perf_counter()
+            item = channel.get()
+            stats.queue_wait_sec += time.perf_counter() - waited
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.exc
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield _embed(batch)
+                batch = []
+        if batch:
+            yield _embed(batch)
+    finally:
+        stop.set()
+        producer.join()
+
+
+class NearDuplicateFilter:
+    """文字 5-gram の MinHash と LSH で、採用済みチャンクとの推定 Jaccard 類似度が threshold 以上のものを見つける。
+
+    署名と LSH のバケットはこのプロセスのメモリにだけ置く (1 チャンクあたり数百バイト)。
+    """
+
+    def __init__(self, threshold: float, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+        self.bands, self.rows = _lsh_shape(threshold, num_perm)
+        self._buckets: dict[int, int] = {}
+        self._signatures: dict[int, bytes] = {}
+        self.dropped = 0
+
+    def _signature(self, text: str) -> np.ndarray | None:
+        compact = " ".join(text.split())
+        codes = np.frombuffer(compact.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        if not len(codes):
+            return None
+        size = min(self.shingle_size, len(codes))
+        shingles = np.zeros(len(codes) - size + 1, dtype=np.uint64)
+        for offset in range(size):
+            shingles = shingles * np.uint64(1_000_003) + codes[offset : offset + len(shingles)]
+        shingles = np.unique(shingles)
+        # 乗算シフト法のハッシュ族 (mod 2^64 の桁あふれは意図どおり)。
+        hashed = (shingles[:, None] * self._a[None, :] + self._b[None, :]) >> np.uint64(32)
+        return hashed.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> list[int]:
+        return [
+            hash((band, signature[band * self.rows : (band + 1) * self.rows].tobytes()))
+            for band in range(self.bands)
+        ]
+
+    def _insert(self, doc_id: int, signature: np.ndarray, keys: list[int]) -> None:
+        for key in keys:
+            self._buckets.setdefault(key, doc_id)
+        self._signatures[doc_id] = signature.tobytes()
+
+    def add(self, doc_id: int, text: str) -> None:
+        """既存のチャンクとして登録する (重複でも落とさない)。"""
+        signature = self._signature(text)
+        if signature is not None:
+            self._insert(doc_id, signature, self._band_keys(signature))
+
+    def check(self, doc_id: int, text: str) -> int | None:
+        """近似重複なら一致した採用済みチャンクの ID を返す。そうでなければ登録して None を返す。"""
+        signature = self._signature(text)
+        if signature is None:
+            return None
+        keys = self._band_keys(signature)
+        for candidate in dict.fromkeys(self._buckets[key] for key in keys if key in self._buckets):
+            other = np.frombuffer(self._signatures[candidate], dtype=np.uint32)
+            if np.count_nonzero(other == signature) / self.num_perm >= self.threshold:
+                self.dropped += 1
+                return candidate
+        self._insert(doc_id, signature, keys)
+        return None
+
+
+def _lsh_shape(threshold: float, num_perm: int) -> tuple[int, int]:
+    """類似度 threshold のペアが 95% 以上の確率で候補になる (bands, rows) のうち、rows が最大のものを選ぶ。"""
+    shape = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if 1 - (1 - threshold**rows) ** bands >= 0.95:
+            shape = (bands, rows)
+    return shape
+
+
+def current_rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm", encoding="ascii") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class IngestMemoryLimitError(RuntimeError):
+    pass
+
+
+class RssGuard:
+    """プロセスの RSS を監視し、limit_mb を超えたかを返す (メモリを抑える機能はない)。limit_mb=0 なら記録のみ。"""
+
+    def __init__(self, limit_mb: int):
+        self.limit_bytes = limit_mb * 1024 * 1024
+        self.peak_bytes = 0
+
+    def sample(self) -> int | None:
+        rss = current_rss_bytes()
+        if rss is not None:
+            self.peak_bytes = max(self.peak_bytes, rss)
+        return rss
+
+    def over_limit(self) -> bool:
+        rss = self.sample()
+        return bool(self.limit_bytes) and rss is not None and rss > self.limit_bytes
+
+
+class IngestCheckpoint:
+    """インジェスト途中の FAISS インデックス・文書ストア・完了済みファイルを work_dir に保存する。
+
+    状態ファイルは最後に置き換えるため、インデックスと文書ストアには状態より先の ID が含まれうる。
+    再開時は next_id 以降を削除してから続きを処理する。
+    """
+
+    def __init__(self, work_dir: Path):
+        self.work_dir = work_dir
+        self.index_path = work_dir / "partial.index"
+        self.docs_path = work_dir / "partial.docs.sqlite"
+        self.state_path = work_dir / "checkpoint.json"
+
+    def load_state(self) -> dict[str, Any] | None:
+        try:
+            state = json.loads(self.state_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not self.index_path.exists() or not self.docs_path.exists():
+            return None
+        return state
+
+    def save(self, index: faiss.Index, docstore: DocstoreWriter, state: dict[str, Any]) -> None:
+        docstore.commit()
+        tmp_index = self.index_path.with_name(self.index_path.name + ".tmp")
+        faiss.write_index(index, str(tmp_index))
+        os.replace(tmp_index, self.index_path)
+        tmp_state = self.state_path.with_name(self.state_path.name + ".tmp")
+        tmp_state.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_state, self.state_path)
+
+    def clear(self) -> None:
+        shutil.rmtree(self.work_dir, ignore_errors=True)
@@ -5,7 +5,10 @@ import httpx
 from app.core.providers import ProvidersConfig
 from app.core.settings import AppSettings
 from app.providers.registry import ProviderRegistry
+from app.services.ingest_jobs import IngestJobManager
 from app.services.rag_service import RagService
+from app.services.response_cache import SemanticResponseCache
+from app.services.warmup import ProviderWarmup
 
 
 @dataclass
@@ -15,3 +18,6 @@ class AppContainer:
     http_client: httpx.AsyncClient
     providers: ProviderRegistry
     rag_service: RagService
+    response_cache: SemanticResponseCache
+    warmup: ProviderWarmup
+    ingest_jobs: IngestJobManager
@@ -4,7 +4,7 @@ from pathlib import Path
 from typing import Any
 
 import yaml
-from pydantic import BaseModel, Field
+from pydantic import AliasChoices, BaseModel, Field, field_validator
 
 
 class LLMProviderConfig(BaseModel):
@@ -37,6 +37,30 @@ class TTSProviderConfig(BaseModel):
     stream: bool = True
     chunk_ms: int = Field(default=40, ge=10)
     timeout_sec: int = Field(default=30, ge=1)
+    downstream_codec: str = "pcm"
+    opus_bitrate_kbps: int = Field(default=32, ge=6, le=510)
+    pipeline_max_in_flight: int = Field(default=2, ge=1)
+    pipeline_memory_budget_bytes: int = Field(default=8 * 1024 * 1024, ge=0)
+
+
+class TTSCacheConfig(BaseModel):
+    enabled: bool = True
+    directory: str = "tts_cache"
+    memory_max_bytes: int = Field(default=64 * 1024 * 1024, ge=0)
+    disk_max_bytes: int = Field(default=512 * 1024 * 1024, ge=0)
+    replay_cadence: bool = True
+    prerender: list[str] = Field(default_factory=list)
+    prerender_fallbacks: bool = True
+
+    @field_validator("prerender", mode="before")
+    @classmethod
+    def _parse_prerender(cls, value: list[str] | str | None) -> list[str]:
+        if value is None:
+            return []
+        if isinstance(value, str):
+            # 日本語の句読点と衝突しないよう、環境変数では "|" 区切りで指定する。
+            return [phrase.strip() for phrase in value.split("|") if phrase.strip()]
+        return value
 
 
 class RagConfig(BaseModel):
@@ -44,13 +68,44 @@ class RagConfig(BaseModel):
     index_path: str
     top_k: int = 5
     embedding_provider: str | None = None
+    reload_interval_sec: float = Field(default=10.0, ge=0)
+    keep_versions: int = Field(default=3, ge=1)
+    index_spec: str = "auto"
+    search_params: str = ""
+    ingest_checkpoint_every: int = Field(default=4096, ge=1)
+    # 旧名 ingest_max_rss_mb も受け付ける。
+    ingest_abort_rss_mb: int = Field(
+        default=0, ge=0, validation_alias=AliasChoices("ingest_abort_rss_mb", "ingest_max_rss_mb")
+    )
+    ingest_dedup_threshold: float = Field(default=0.9, ge=0, le=1)
+    ingest_embedding_cache: str = "auto"
+    ingest_embedding_cache_max_mb: int = Field(default=0, ge=0)
+    ingest_source_dir: str = "/workspace/memories"
+    ingest_workers: int = Field(default=1, ge=1)
+    context_token_budget: int = Field(default=600, ge=0)
+    context_mmr_lambda: float = Field(default=0.7, ge=0, le=1)
+    context_duplicate_threshold: float = Field(default=0.8, gt=0, le=1)
+    namespace_cache_mb: int = Field(default=1024, ge=0)
+    hybrid_search: bool = True
+    hybrid_candidates: int = Field(default=20, ge=1)
+    rrf_k: int = Field(default=60, ge=1)
+    lexical_fast_path_ratio: float = Field(default=2.0, ge=0)
+    gate_enabled: bool = True
+    gate_min_chars: int = Field(default=4, ge=0)
+    gate_small_talk: str = ""
+    gate_max_distance: float = Field(default=0.0, ge=0)
 
 
 class EmbeddingConfig(BaseModel):
     provider: str
     endpoint: str
     model: str
-    batch_size: int = 16
+    batch_size: int = Field(default=16, ge=1)
+    max_concurrency: int = Field(default=4, ge=1)
+    llama_multi_input: bool = True
+    encoding_format: str = "float"
+    query_cache_size: int = Field(default=512, ge=0)
+    query_cache_ttl_sec: float = Field(default=600, ge=0)
     timeout_sec: int = Field(default=30, ge=1)
 
 
@@ -61,6 +116,28 @@ class MotionProviderConfig(BaseModel):
     output_format: str = "vrm-json"
 
 
+class ResponseCacheConfig(BaseModel):
+    enabled: bool = False
+    similarity_threshold: float = Field(default=0.95, ge=0.0, le=1.0)
+    ttl_sec: int = Field(default=3600, ge=1)
+    max_entries: int = Field(default=256, ge=1)
+
+
+class WarmupConfig(BaseModel):
+    enabled: bool = True
+    providers: list[str] = Field(default_factory=lambda: ["llm", "tts", "embedding", "rag"])
+    timeout_sec: int = Field(default=60, ge=1)
+
+    @field_validator("providers", mode="before")
+    @classmethod
+    def _parse_providers(cls, value: list[str] | str | None) -> list[str]:
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return [name.strip() for name in value.split(",") if name.strip()]
+        return value
+
+
 class ProvidersConfig(BaseModel):
     llm: LLMProviderConfig
     stt: STTProviderConfig
@@ -68,11 +145,22 @@ class ProvidersConfig(BaseModel):
     rag: RagConfig
     embedding: EmbeddingConfig
     motion: MotionProviderConfig
+    response_cache: ResponseCacheConfig = Field(default_factory=ResponseCacheConfig)
+    warmup: WarmupConfig = Field(default_factory=WarmupConfig)
+    tts_cache: TTSCacheConfig = Field(default_factory=TTSCacheConfig)
 
     model_config = {"extra": "ignore"}
 
 
 _ENV_PATTERN = re.compile(r"\$\{[^}]+\}|\$[A-Za-z0-9_]+")
+_ENV_DEFAULT_PATTERN = re.compile(r"\$\{([A-Za-z0-9_]+):-([^}]*)\}")
+
+
+def _expand_env_defaults(value: str) -> str:
+    """Resolve docker compose style `${VAR:-default}` placeholders."""
+    return _ENV_DEFAULT_PATTERN.sub(
+        lambda match: os.environ.get(match.group(1)) or match.group(2), value
+    )
 
 
 def _resolve_env_vars(data: Any) -> Any:
@@ -81,7 +169,7 @@ def _resolve_env_vars(data: Any) -> Any:
     if isinstance(data, list):
         return [_resolve_env_vars(value) for value in data]
     if isinstance(data, str):
-        expanded = os.path.expandvars(data)
+        expanded = os.path.expandvars(_expand_env_defaults(data))
         if _ENV_PATTERN.search(expanded):
             msg = f"Environment variable not set for providers config value: {data}"
             raise ValueError(msg)
@@ -1,5 +1,7 @@
+import asyncio
 import logging
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
+from pathlib import Path
 from typing import Any
 
 import httpx
@@ -9,7 +11,7 @@ from fastapi.staticfiles import StaticFiles
 from sqlalchemy import text
 
 from app.api import dependencies
-from app.api.routes import characters, diagnostics, motion, system_prompts, text_chat, websocket
+from app.api.routes import characters, diagnostics, motion, rag, system_prompts, text_chat, websocket
 from app.core.logging import configure_logging, generate_request_id, reset_request_id, set_request_id
 from app.core.container import AppContainer
 from app.core.providers import load_providers_config
@@ -17,7 +19,12 @@ from app.core.settings import get_settings
 from app.db import session as db_session
 from app.db.session import init_db
 from app.providers.registry import ProviderRegistry
+from app.repositories.system_prompts import SystemPromptRepository
+from app.services.ingest_jobs import IngestJobManager
+from app.services.prompt_builder import EMPTY_INPUT_FALLBACK_TEXT, FALLBACK_ASSISTANT_TEXT
 from app.services.rag_service import RagService
+from app.services.response_cache import SemanticResponseCache
+from app.services.warmup import ProviderWarmup
 
 configure_logging()
 logger = logging.getLogger(__name__)
@@ -36,6 +43,30 @@ def _collect_provider_warnings(status: dict[str, dict[str, Any]]) -> list[str]:
     return warnings
 
 
+async def _load_system_prompt_text() -> str | None:
+    if db_session.SessionLocal is None:
+        return None
+    try:
+        async with db_session.SessionLocal() as session:
+            repo = SystemPromptRepository(session)
+            record = await repo.get_active() or await repo.get_latest()
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("Failed to load system prompt for warm-up: %s", exc)
+        return None
+    return record.content if record else None
+
+
+async def _run_warmup(warmup: ProviderWarmup, providers: ProviderRegistry) -> None:
+    await warmup.run(await _load_system_prompt_text())
+    cache_config = providers.config.tts_cache
+    phrases = list(cache_config.prerender)
+    if cache_config.prerender_fallbacks:
+        phrases.extend([FALLBACK_ASSISTANT_TEXT, EMPTY_INPUT_FALLBACK_TEXT])
+    if cache_config.enabled and phrases:
+        rendered = await providers.tts.prerender(phrases)
+        logger.info("TTS cache prerendered %s/%s phrase(s)", rendered, len(phrases))
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     providers_config = load_providers_config(settings.providers_config_path)
@@ -53,19 +84,40 @@ async def lifespan(app: FastAPI):
         embedding_client=providers.embedding,
     )
 
+    response_cache = SemanticResponseCache(providers_config.response_cache)
+    warmup = ProviderWarmup(providers_config.warmup, providers=providers, rag_service=rag_service)
+    ingest_jobs = IngestJobManager(
+        rag_service,
+        providers_path=settings.providers_config_path,
+        index_path=Path(providers_config.rag.index_path),
+        source_root=Path(providers_config.rag.ingest_source_dir),
+        workers=providers_config.rag.ingest_workers,
+    )
+
     await init_db(settings.database_url)
     await rag_service.load()
+    rag_service.start_watching()
     app.state.container = AppContainer(
         settings=settings,
         providers_config=providers_config,
         http_client=http_client,
         providers=providers,
         rag_service=rag_service,
+        response_cache=response_cache,
+        warmup=warmup,
+        ingest_jobs=ingest_jobs,
     )
+    # ウォームアップはバックグラウンドで進め、完了までは /ready が warming を返す。
+    warmup_task = asyncio.create_task(_run_warmup(warmup, providers))
 
     try:
         yield
     finally:
+        warmup_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await warmup_task
+        await ingest_jobs.shutdown()
+        await rag_service.stop_watching()
         await http_client.aclose()
 
 
@@ -87,6 +139,7 @@ app.include_router(diagnostics.router, prefix="/api/v1")
 app.include_router(motion.router, prefix="/api/v1")
 app.include_router(characters.router, prefix="/api/v1")
 app.include_router(system_prompts.router, prefix="/api/v1")
+app.include_router(rag.router, prefix="/api/v1")
 app.include_router(websocket.router)
 
 
@@ -105,12 +158,16 @@ async def add_request_id_context(request: Request, call_next):
 
 
 @app.get("/health")
-async def health(providers: ProviderRegistry = Depends(dependencies.get_provider_registry)):
+async def health(
+    providers: ProviderRegistry = Depends(dependencies.get_provider_registry),
+    response_cache: SemanticResponseCache = Depends(dependencies.get_response_cache),
+):
     provider_status = providers.status()
     return {
         "app": settings.app_name,
         "version": settings.app_version,
         "providers": provider_status,
+        "response_cache": response_cache.stats(),
         "warnings": _collect_provider_warnings(provider_status),
     }
 
@@ -119,6 +176,7 @@ async def health(providers: ProviderRegistry = Depends(dependencies.get_provider
 async def ready(
     providers: ProviderRegistry = Depends(dependencies.get_provider_registry),
     rag_service: RagService = Depends(dependencies.get_rag_service),
+    warmup: ProviderWarmup = Depends(dependencies.get_warmup),
 ) -> dict[str, Any]:
     provider_status = providers.status()
     provider_warnings = _collect_provider_warnings(provider_status)
@@ -134,12 +192,16 @@ async def ready(
             db_status = f"error: {exc}"
 
     rag_ready = rag_service.is_loaded
-    status = "ok" if db_ok and rag_ready and not provider_warnings else "degraded"
+    if warmup.in_progress:
+        status = "warming"
+    else:
+        status = "ok" if db_ok and rag_ready and not provider_warnings else "degraded"
 
     return {
         "status": status,
         "providers": provider_status,
         "database": db_status,
         "rag_index_loaded": rag_ready,
+        "warmup": warmup.snapshot(),
         "warnings": provider_warnings,
     }
@@ -1,12 +1,21 @@
+import asyncio
+import base64
 import hashlib
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
 
 import httpx
+import numpy as np
 
 from app.core.providers import EmbeddingConfig
+from app.providers.embedding_cache import EmbeddingQueryCache
+from app.providers.singleflight import SingleFlight, canonical_key
 
 logger = logging.getLogger(__name__)
 
+_FALLBACK_DIM = 32
+
 
 class EmbeddingClient:
     def __init__(
@@ -18,21 +27,85 @@ class EmbeddingClient:
         self.config = config
         self._http_client = http_client
         self._sync_client = sync_client
+        self._singleflight = SingleFlight()
+        self._query_cache = EmbeddingQueryCache(config.query_cache_size, config.query_cache_ttl_sec)
         self.fallback_count = 0
         endpoint = config.endpoint.rstrip("/")
         self._llama_server_mode = endpoint.endswith("/embedding")
+        # None: 未確認、True/False: llama-server が {"content": [...]} を受け付けるか
+        self._llama_multi_input: bool | None = None if config.llama_multi_input else False
+
+    async def aembed(self, texts: list[str]) -> np.ndarray:
+        """(len(texts), dim) の C 連続 float32 行列を返す。
+
+        キャッシュのキーは表記ゆれを吸収した正規化文字列から作るが、埋め込むのは元の文字列のまま
+        (文書側と同じ前処理に揃え、キャッシュの有無で検索結果が変わらないようにする)。
+        """
+        cache = self._query_cache if self._query_cache.enabled else None
+        cached: list[np.ndarray | None] = [None] * len(texts)
+        cache_keys: list[str] = []
+        if cache is not None:
+            cache.bind(self.config.model, self.config.endpoint)
+            cache_keys = [cache.build_key(text) for text in texts]
+            cached = [cache.get(key) for key in cache_keys]
+        missing = [index for index, vector in enumerate(cached) if vector is None]
+        if not missing:
+            return np.stack(cached)  # type: ignore[arg-type]
+
+        missing_texts = [texts[index] for index in missing]
+        key = canonical_key(
+            "embedding",
+            {"endpoint": self.config.endpoint, "model": self.config.model, "input": missing_texts},
+        )
+        vectors, fallback = await self._singleflight.do(
+            key, lambda: self._aembed_uncoalesced(missing_texts)
+        )
+        if len(missing) == len(texts):
+            if cache is not None and not fallback:
+                for index, vector in zip(missing, vectors):
+                    cache.put(cache_keys[index], vector.copy())
+            return vectors
+        if fallback:
+            # ハッシュによるフォールバック埋め込みは次元も意味も違うので、キャッシュには触れず全件をそろえて返す。
+            return self._fallback_embeddings(texts)
+        if cache is not None:
+            for index, vector in zip(missing, vectors):
+                cache.put(cache_keys[index], vector.copy())
+        if any(row is not None and row.shape[0] != vectors.shape[1] for row in cached):
+            # モデルが差し替わって次元が変わった。put で古い次元のエントリは破棄済みなので取り直す。
+            return await self.aembed(texts)
+        matrix = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+        for index, row in enumerate(cached):
+            if row is not None:
+                matrix[index] = row
+        matrix[missing] = vectors
+        return matrix
+
+    def coalescing_stats(self) -> dict[str, int]:
+        return self._singleflight.stats()
 
-    async def aembed(self, texts: list[str]) -> list[list[float]]:
+    def cache_stats(self) -> dict[str, Any]:
+        return self._query_cache.stats()
+
+    async def warmup(self, text: str) -> int:
+        """フォールバックせずに 1 件埋め込み、次元数を返す。"""
+        vectors = await self._request_async([text])
+        if vectors.size == 0:
+            raise RuntimeError("embedding provider returned no vectors")
+        return int(vectors.shape[1])
+
+    async def _aembed_uncoalesced(self, texts: list[str]) -> tuple[np.ndarray, bool]:
+        """埋め込みと、フォールバックを使ったかどうかを返す。"""
         try:
             result = await self._request_async(texts)
-            if result:
-                return result
+            if result.size:
+                return result, False
             self.fallback_count += 1
             logger.warning(
                 "Embedding provider returned empty result; using fallback.",
                 extra={"fallback": True},
             )
-            return [self._fallback_embedding(text) for text in texts]
+            return self._fallback_embeddings(texts), True
         except Exception as exc:
             self.fallback_count += 1
             logger.warning(
@@ -40,19 +113,19 @@ class EmbeddingClient:
                 exc,
                 extra={"fallback": True},
             )
-            return [self._fallback_embedding(text) for text in texts]
+            return self._fallback_embeddings(texts), True
 
-    def embed(self, texts: list[str]) -> list[list[float]]:
+    def embed(self, texts: list[str]) -> np.ndarray:
         try:
             result = self._request_sync(texts)
-            if result:
+            if result.size:
                 return result
             self.fallback_count += 1
             logger.warning(
                 "Embedding provider returned empty result; using fallback.",
                 extra={"fallback": True},
             )
-            return [self._fallback_embedding(text) for text in texts]
+            return self._fallback_embeddings(texts)
         except Exception as exc:
             self.fallback_count += 1
             logger.warning(
@@ -60,98 +133,198 @@ class EmbeddingClient:
                 exc,
                 extra={"fallback": True},
             )
-            return [self._fallback_embedding(text) for text in texts]
-
-    async def _request_async(self, texts: list[str]) -> list[list[float]]:
-        if self._llama_server_mode:
-            return await self._request_llama_async(texts)
-
-        payload = {"input": texts, "model": self.config.model}
-        url = self._build_url("embeddings")
-        if self._http_client is None:
-            async with httpx.AsyncClient(timeout=self.config.timeout_sec) as client:
-                response = await client.post(url, json=payload)
-        else:
-            response = await self._http_client.post(
-                url, json=payload, timeout=self.config.timeout_sec
-            )
-        response.raise_for_status()
-        return self._parse_response(response.json())
-
-    def _request_sync(self, texts: list[str]) -> list[list[float]]:
-        if self._llama_server_mode:
-            return self._request_llama_sync(texts)
-
-        payload = {"input": texts, "model": self.config.model}
-        url = self._build_url("embeddings")
-        if self._sync_client is None:
-            with httpx.Client(timeout=self.config.timeout_sec) as client:
-                response = client.post(url, json=payload)
-        else:
-            response = self._sync_client.post(url, json=payload)
-        response.raise_for_status()
-        return self._parse_response(response.json())
-
-    async def _request_llama_async(self, texts: list[str]) -> list[list[float]]:
-        url = self.config.endpoint.rstrip("/")
-        embeddings: list[list[float]] = []
+            return self._fallback_embeddings(texts)
+
+    def _plan_batches(self, texts: list[str]) -> list[list[str]]:
+        """batch_size ごとに分割する。llama-server が複数入力非対応なら 1 件ずつにする。"""
+        size = self.config.batch_size
+        if self._llama_server_mode and self._llama_multi_input is False:
+            size = 1
+        return [texts[start : start + size] for start in range(0, len(texts), size)]
+
+    async def _request_async(self, texts: list[str]) -> np.ndarray:
+        batches = self._plan_batches(texts)
         client = self._http_client
-        owns_client = False
+        owns_client = client is None
         if client is None:
             client = httpx.AsyncClient(timeout=self.config.timeout_sec)
-            owns_client = True
+        semaphore = asyncio.Semaphore(self.config.max_concurrency)
+
+        async def _run(batch: list[str]) -> np.ndarray:
+            async with semaphore:
+                return await self._request_batch_async(client, batch)
+
         try:
-            for text in texts:
-                response = await client.post(url, json={"content": text})
-                response.raise_for_status()
-                embedding = self._parse_llama_response(response.json())
-                if embedding:
-                    embeddings.append(embedding)
+            results = await asyncio.gather(*(_run(batch) for batch in batches))
         finally:
             if owns_client:
                 await client.aclose()
-        return embeddings
+        return self._concat(results)
 
-    def _request_llama_sync(self, texts: list[str]) -> list[list[float]]:
-        url = self.config.endpoint.rstrip("/")
-        embeddings: list[list[float]] = []
+    def _request_sync(self, texts: list[str]) -> np.ndarray:
+        batches = self._plan_batches(texts)
         client = self._sync_client
-        owns_client = False
+        owns_client = client is None
         if client is None:
             client = httpx.Client(timeout=self.config.timeout_sec)
-            owns_client = True
         try:
-            for text in texts:
-                response = client.post(url, json={"content": text})
-                response.raise_for_status()
-                embedding = self._parse_llama_response(response.json())
-                if embedding:
-                    embeddings.append(embedding)
+            if len(batches) <= 1 or self.config.max_concurrency <= 1:
+                results = [self._request_batch_sync(client, batch) for batch in batches]
+            else:
+                # httpx.Client はスレッドセーフなので接続プールを共有して並列に送る。
+                with ThreadPoolExecutor(max_workers=self.config.max_concurrency) as executor:
+                    results = list(
+                        executor.map(lambda batch: self._request_batch_sync(client, batch), batches)
+                    )
         finally:
             if owns_client:
                 client.close()
+        return self._concat(results)
+
+    async def _request_batch_async(
+        self, client: httpx.AsyncClient, batch: list[str]
+    ) -> np.ndarray:
+        if not self._llama_server_mode:
+            response = await client.post(
+                self._build_url("embeddings"),
+                json=self._openai_payload(batch),
+                timeout=self.config.timeout_sec,
+            )
+            response.raise_for_status()
+            return self._expect_count(self._parse_response(response.json()), batch)
+
+        url = self.config.endpoint.rstrip("/")
+        if len(batch) > 1 and self._llama_multi_input is not False:
+            try:
+                response = await client.post(
+                    url, json={"content": batch}, timeout=self.config.timeout_sec
+                )
+                response.raise_for_status()
+                embeddings = self._expect_count(self._parse_llama_batch(response.json()), batch)
+                self._llama_multi_input = True
+                return embeddings
+            except (httpx.HTTPStatusError, ValueError) as exc:
+                if not self._can_fall_back_to_single_input(exc):
+                    raise
+                self._disable_llama_multi_input(exc)
+
+        rows = []
+        for text in batch:
+            response = await client.post(
+                url, json={"content": text}, timeout=self.config.timeout_sec
+            )
+            response.raise_for_status()
+            rows.append(self._parse_llama_batch(response.json()))
+        return self._expect_count(self._concat(rows), batch)
+
+    def _request_batch_sync(self, client: httpx.Client, batch: list[str]) -> np.ndarray:
+        if not self._llama_server_mode:
+            response = client.post(
+                self._build_url("embeddings"),
+                json=self._openai_payload(batch),
+            )
+            response.raise_for_status()
+            return self._expect_count(self._parse_response(response.json()), batch)
+
+        url = self.config.endpoint.rstrip("/")
+        if len(batch) > 1 and self._llama_multi_input is not False:
+            try:
+                response = client.post(url, json={"content": batch})
+                response.raise_for_status()
+                embeddings = self._expect_count(self._parse_llama_batch(response.json()), batch)
+                self._llama_multi_input = True
+                return embeddings
+            except (httpx.HTTPStatusError, ValueError) as exc:
+                if not self._can_fall_back_to_single_input(exc):
+                    raise
+                self._disable_llama_multi_input(exc)
+
+        rows = []
+        for text in batch:
+            response = client.post(url, json={"content": text})
+            response.raise_for_status()
+            rows.append(self._parse_llama_batch(response.json()))
+        return self._expect_count(self._concat(rows), batch)
+
+    def _can_fall_back_to_single_input(self, exc: Exception) -> bool:
+        if self._llama_multi_input:
+            return False
+        # 5xx はサーバ側の一時的な障害なので、複数入力非対応とは判断しない。
+        if isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code >= 500:
+            return False
+        return True
+
+    def _disable_llama_multi_input(self, exc: Exception) -> None:
+        if self._llama_multi_input is None:
+            logger.info("llama-server rejected multi-input embedding; sending one text per request: %s", exc)
+        self._llama_multi_input = False
+
+    @staticmethod
+    def _expect_count(embeddings: np.ndarray, batch: list[str]) -> np.ndarray:
+        # 件数がずれると文書とベクトルの対応が崩れるため、部分的な結果は使わない。
+        if len(embeddings) != len(batch):
+            raise ValueError(f"expected {len(batch)} embeddings, got {len(embeddings)}")
         return embeddings
 
-    def _parse_response(self, data: dict) -> list[list[float]]:
-        items = data.get("data") or []
-        embeddings: list[list[float]] = []
-        for item in items:
+    @staticmethod
+    def _concat(matrices: list[np.ndarray]) -> np.ndarray:
+        if len(matrices) == 1:
+            return matrices[0]
+        non_empty = [matrix for matrix in matrices if matrix.size]
+        if not non_empty:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(non_empty, axis=0)
+
+    def _openai_payload(self, batch: list[str]) -> dict[str, Any]:
+        payload: dict[str, Any] = {"input": batch, "model": self.config.model}
+        if self.config.encoding_format == "base64":
+            payload["encoding_format"] = "base64"
+        return payload
+
+    def _parse_response(self, data: dict) -> np.ndarray:
+        items = [item for item in data.get("data") or [] if item.get("embedding") is not None]
+        items.sort(key=lambda item: item.get("index", 0))
+        return self._fill_matrix([item["embedding"] for item in items])
+
+    def _parse_llama_batch(self, data: dict | list) -> np.ndarray:
+        """単一入力 ({...}) と複数入力 ([{index, embedding}, ...]) の両方の応答を扱う。"""
+        items = data if isinstance(data, list) else [data]
+        ordered = sorted(items, key=lambda item: item.get("index", 0))
+        embeddings = []
+        for item in ordered:
             embedding = item.get("embedding")
-            if embedding is None:
+            if not embedding:
                 continue
-            embeddings.append([float(x) for x in embedding])
-        return embeddings
+            # 新しい llama-server はプーリング済みでも [[...]] の形で返す。
+            if isinstance(embedding[0], list):
+                embedding = embedding[0]
+            embeddings.append(embedding)
+        return self._fill_matrix(embeddings)
 
-    def _parse_llama_response(self, data: dict) -> list[float]:
-        embedding = data.get("embedding")
-        if embedding is None:
-            return []
-        return [float(x) for x in embedding]
+    @staticmethod
+    def _fill_matrix(embeddings: list[list[float] | str]) -> np.ndarray:
+        """JSON の数値配列または base64 (little-endian float32) を 1 つの float32 行列に詰める。"""
+        if not embeddings:
+            return np.empty((0, 0), dtype=np.float32)
+        rows = [
+            np.frombuffer(base64.b64decode(item), dtype="<f4") if isinstance(item, str) else item
+            for item in embeddings
+        ]
+        matrix = np.empty((len(rows), len(rows[0])), dtype=np.float32)
+        for index, row in enumerate(rows):
+            if len(row) != matrix.shape[1]:
+                raise ValueError("embedding dimensions differ within a batch")
+            matrix[index] = row
+        return matrix
 
-    def _fallback_embedding(self, text: str) -> list[float]:
-        digest = hashlib.sha256(text.encode("utf-8")).digest()
+    def _fallback_embeddings(self, texts: list[str]) -> np.ndarray:
         # Simple deterministic embedding to keep the pipeline working when provider is absent.
-        return [byte / 255.0 for byte in digest[:32]]
+        matrix = np.empty((len(texts), _FALLBACK_DIM), dtype=np.float32)
+        for index, text in enumerate(texts):
+            digest = hashlib.sha256(text.encode("utf-8")).digest()[:_FALLBACK_DIM]
+            matrix[index] = np.frombuffer(digest, dtype=np.uint8)
+        matrix /= 255.0
+        return matrix
 
     def _build_url(self, path: str) -> str:
         base = self.config.endpoint.rstrip("/")
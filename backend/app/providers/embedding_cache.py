@@ -0,0 +1,88 @@
+import hashlib
+import json
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """NFKC 正規化・小文字化・空白の畳み込みで表記ゆれを吸収する。"""
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+class EmbeddingQueryCache:
+    """クエリ埋め込みの LRU/TTL キャッシュ。イベントループ上からのみ操作する前提。"""
+
+    def __init__(self, max_entries: int, ttl_sec: float):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self._entries: OrderedDict[str, tuple[float, np.ndarray]] = OrderedDict()
+        self._fingerprint: tuple[str, str] | None = None
+        self._dimension: int | None = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def bind(self, model: str, endpoint: str) -> None:
+        """モデル/エンドポイントが前回と変わっていれば全エントリを破棄する。"""
+        fingerprint = (model, endpoint.rstrip("/"))
+        if self._fingerprint is not None and fingerprint != self._fingerprint:
+            self.invalidate()
+        self._fingerprint = fingerprint
+
+    def build_key(self, text: str) -> str:
+        material = json.dumps([normalize_query(text), *(self._fingerprint or ())], ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> np.ndarray | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        stored_at, vector = entry
+        if self.ttl_sec > 0 and time.monotonic() - stored_at > self.ttl_sec:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return vector
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        if not self.enabled or not vector.size:
+            return
+        if self._dimension is not None and len(vector) != self._dimension:
+            # 同じモデル名のまま中身が差し替えられた場合も古いベクトルを使わない。
+            self.invalidate()
+        self._dimension = len(vector)
+        self._entries[key] = (time.monotonic(), vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self) -> None:
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._dimension = None
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
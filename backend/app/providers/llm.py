@@ -8,6 +8,7 @@ from typing import Any
 import httpx
 
 from app.core.providers import LLMProviderConfig
+from app.providers.singleflight import SingleFlight, canonical_key
 
 logger = logging.getLogger(__name__)
 
@@ -28,12 +29,52 @@ class LLMClient:
         self.config = config
         self._http_client = http_client
         self._api_key = api_key
+        self._singleflight = SingleFlight()
         self.fallback_count = 0
 
     async def stream_chat(self, messages: list[ChatMessage]) -> AsyncIterator[str]:
         if not messages:
             return
 
+        key = canonical_key(
+            "llm",
+            {
+                "endpoint": self.config.endpoint,
+                "model": self.config.model,
+                "messages": [msg.__dict__ for msg in messages],
+                "temperature": self.config.temperature,
+                "max_tokens": self.config.max_tokens,
+                "stream": self.config.stream,
+            },
+        )
+        async for token in self._singleflight.stream(
+            key, lambda: self._stream_with_fallback(messages)
+        ):
+            yield token
+
+    def coalescing_stats(self) -> dict[str, int]:
+        return self._singleflight.stats()
+
+    async def warmup(self, messages: list[ChatMessage]) -> None:
+        """1 トークンだけ生成させてシステムプロンプトを llama-server のキャッシュに載せる。"""
+        payload = {
+            "model": self.config.model,
+            "messages": [msg.__dict__ for msg in messages],
+            "temperature": self.config.temperature,
+            "max_tokens": 1,
+            "stream": False,
+        }
+        response = await self._http_client.post(
+            self._build_url("chat/completions"),
+            json=payload,
+            headers=self._build_headers(),
+            timeout=self.config.timeout_sec,
+        )
+        response.raise_for_status()
+
+    async def _stream_with_fallback(
+        self, messages: list[ChatMessage]
+    ) -> AsyncIterator[str]:
         try:
             if self.config.stream:
                 async for token in self._stream_response(messages):
@@ -7,6 +7,7 @@ from uuid import uuid4
 import httpx
 
 from app.core.providers import MotionProviderConfig
+from app.providers.singleflight import SingleFlight, canonical_key
 from app.schemas.motion import (
     MotionGenerateRequest,
     MotionGenerateResponse,
@@ -31,10 +32,30 @@ class MotionClient:
         self._http_client = http_client
         self._data_root = Path(data_root) if data_root else None
         self._data_mount_path = data_mount_path.rstrip("/") or "/data"
+        self._singleflight = SingleFlight()
         self.fallback_count = 0
 
     async def generate(self, request: MotionGenerateRequest) -> MotionGenerateResponse:
         payload = self._build_payload(request)
+        key = canonical_key("motion", {"endpoint": self.config.endpoint, **payload})
+        return await self._singleflight.do(key, lambda: self._generate(request, payload))
+
+    def coalescing_stats(self) -> dict[str, int]:
+        return self._singleflight.stats()
+
+    async def warmup(self, prompt: str) -> None:
+        """短いモーションを 1 本生成してチェックポイントをロードさせる。"""
+        request = MotionGenerateRequest(prompt=prompt, duration_sec=1.0)
+        response = await self._http_client.post(
+            self.config.endpoint.rstrip("/"),
+            json=self._build_payload(request),
+            timeout=self.config.timeout_sec,
+        )
+        response.raise_for_status()
+
+    async def _generate(
+        self, request: MotionGenerateRequest, payload: dict[str, object]
+    ) -> MotionGenerateResponse:
         try:
             response = await self._http_client.post(
                 self.config.endpoint.rstrip("/"),
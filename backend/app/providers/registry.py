@@ -10,6 +10,7 @@ from app.providers.llm import LLMClient
 from app.providers.motion import MotionClient
 from app.providers.stt import STTClient
 from app.providers.tts import TTSClient
+from app.providers.tts_cache import TTSAudioCache
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +31,12 @@ class ProviderRegistry:
             http_client=http_client,
         )
         self.stt = STTClient(providers_config.stt, http_client=http_client)
-        self.tts = TTSClient(providers_config.tts, http_client=http_client)
+        tts_cache = (
+            TTSAudioCache(providers_config.tts_cache, data_root=data_root)
+            if providers_config.tts_cache.enabled
+            else None
+        )
+        self.tts = TTSClient(providers_config.tts, http_client=http_client, cache=tts_cache)
         self.motion = MotionClient(
             providers_config.motion,
             http_client=http_client,
@@ -53,11 +59,14 @@ class ProviderRegistry:
                 provider=self.config.llm.provider,
                 endpoint=self.config.llm.endpoint,
                 fallback_count=self.llm.fallback_count,
+                coalescing=self.llm.coalescing_stats(),
             ),
             "embedding": self._provider_status(
                 provider=self.config.embedding.provider,
                 endpoint=self.config.embedding.endpoint,
                 fallback_count=self.embedding.fallback_count,
+                coalescing=self.embedding.coalescing_stats(),
+                cache=self.embedding.cache_stats(),
             ),
             "stt": self._provider_status(
                 provider=self.config.stt.provider,
@@ -68,25 +77,38 @@ class ProviderRegistry:
                 provider=self.config.tts.provider,
                 endpoint=self.config.tts.endpoint,
                 fallback_count=self.tts.fallback_count,
+                coalescing=self.tts.coalescing_stats(),
+                cache=self.tts.cache_stats(),
             ),
             "motion": self._provider_status(
                 provider=self.config.motion.provider,
                 endpoint=self.config.motion.endpoint,
                 fallback_count=self.motion.fallback_count,
+                coalescing=self.motion.coalescing_stats(),
             ),
         }
 
     def _provider_status(
-        self, provider: str, endpoint: str, fallback_count: int
+        self,
+        provider: str,
+        endpoint: str,
+        fallback_count: int,
+        coalescing: dict[str, int] | None = None,
+        cache: dict[str, Any] | None = None,
     ) -> dict[str, Any]:
         endpoint_lower = endpoint.lower()
         provider_lower = provider.lower()
         is_mock = "mock" in provider_lower or "echo-server" in endpoint_lower
         degraded = is_mock or fallback_count > 0
-        return {
+        status: dict[str, Any] = {
             "provider": provider,
             "endpoint": endpoint,
             "is_mock": is_mock,
             "fallback_count": fallback_count,
             "degraded": degraded,
         }
+        if coalescing is not None:
+            status["coalescing"] = coalescing
+        if cache is not None:
+            status["cache"] = cache
+        return status
@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import json
+from collections.abc import AsyncIterator, Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+def canonical_key(namespace: str, payload: Any) -> str:
+    """リクエストペイロードを正規化 JSON にしてハッシュ化したキーを返す。"""
+    body = json.dumps(
+        payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str
+    )
+    digest = hashlib.sha256(body.encode("utf-8")).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+@dataclass
+class _Call(Generic[T]):
+    task: asyncio.Task[T]
+    waiters: int = 0
+
+
+@dataclass
+class _StreamFlight(Generic[T]):
+    items: list[T] = field(default_factory=list)
+    done: bool = False
+    error: BaseException | None = None
+    subscribers: int = 0
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+    task: asyncio.Task[None] | None = None
+
+    def notify(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    """同一キーの同時呼び出しを 1 本の上流リクエストにまとめ、結果を全員に配る。"""
+
+    def __init__(self) -> None:
+        self._calls: dict[str, _Call[Any]] = {}
+        self._streams: dict[str, _StreamFlight[Any]] = {}
+        self.leader_count = 0
+        self.coalesced_count = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(task=asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget_call(key, call))
+            self.leader_count += 1
+        else:
+            self.coalesced_count += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # 待っている呼び出し元が全員キャンセルされたら上流も止める。
+                call.task.cancel()
+
+    async def stream(
+        self, key: str, factory: Callable[[], AsyncIterator[T]]
+    ) -> AsyncIterator[T]:
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = _StreamFlight()
+            self._streams[key] = flight
+            flight.task = asyncio.create_task(self._pump(key, flight, factory))
+            self.leader_count += 1
+        else:
+            self.coalesced_count += 1
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                changed = flight.changed
+                if index < len(flight.items):
+                    item = flight.items[index]
+                    index += 1
+                    yield item
+                    continue
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and flight.task is not None and not flight.task.done():
+                flight.task.cancel()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "leader_count": self.leader_count,
+            "coalesced_count": self.coalesced_count,
+        }
+
+    def _forget_call(self, key: str, call: _Call[Any]) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled():
+            # 待機者がいない状態で失敗しても "exception was never retrieved" を出さない。
+            call.task.exception()
+
+    async def _pump(
+        self, key: str, flight: _StreamFlight[T], factory: Callable[[], AsyncIterator[T]]
+    ) -> None:
+        try:
+            async for item in factory():
+                flight.items.append(item)
+                flight.notify()
+        except Exception as exc:  # noqa: BLE001
+            flight.error = exc
+        finally:
+            if self._streams.get(key) is flight:
+                del self._streams[key]
+            flight.done = True
+            flight.notify()
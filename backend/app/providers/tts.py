@@ -1,32 +1,61 @@
 import asyncio
 import logging
-from typing import AsyncIterator
+import time
+from typing import Any, AsyncIterator
 
 import httpx
 
 from app.core.providers import TTSProviderConfig
+from app.providers.singleflight import SingleFlight, canonical_key
+from app.providers.tts_cache import TTSAudioCache
+from app.providers.tts_pipeline import TTSPipeline, split_sentences
+from app.utils.audio import PcmFramer, pcm_frame_bytes
 
 logger = logging.getLogger(__name__)
 
+_RAW_PCM_FORMATS = {"", "pcm", "s16le", "raw"}
+
 
 class TTSClient:
     """TTS クライアント。HTTP ストリーミングを優先し、失敗時はサイレントチャンクを返す。"""
 
-    def __init__(self, config: TTSProviderConfig, http_client: httpx.AsyncClient):
+    def __init__(
+        self,
+        config: TTSProviderConfig,
+        http_client: httpx.AsyncClient,
+        cache: TTSAudioCache | None = None,
+    ):
         self.config = config
         self._http_client = http_client
+        self._cache = cache
+        self._singleflight = SingleFlight()
         self.fallback_count = 0
 
     @property
     def sample_rate(self) -> int:
         return self.config.sample_rate or 16000
 
+    @property
+    def is_raw_pcm(self) -> bool:
+        return (self.config.output_format or "").lower() in _RAW_PCM_FORMATS
+
+    @property
+    def frame_bytes(self) -> int | None:
+        """PCM 出力時に 1 フレーム (chunk_ms) が占めるバイト数。"""
+        if not self.is_raw_pcm:
+            return None
+        return pcm_frame_bytes(self.sample_rate, self.config.chunk_ms)
+
     def metadata(self) -> dict[str, int]:
-        return {
+        metadata = {
             "sample_rate": self.sample_rate,
             "channels": 1,
             "chunk_ms": self.config.chunk_ms,
         }
+        frame_bytes = self.frame_bytes
+        if frame_bytes is not None:
+            metadata["frame_bytes"] = frame_bytes
+        return metadata
 
     async def stream_tts(
         self, text: str, voice: str | None = None
@@ -36,7 +65,81 @@ class TTSClient:
             return
 
         url = self.config.endpoint.rstrip("/")
-        payload = {
+        payload = self._build_payload(text, voice)
+        cache_key = self._cache_key(payload)
+        if cache_key is not None and self._cache is not None:
+            cached = await self._cache.get(cache_key)
+            if cached is not None:
+                async for chunk in self._cache.replay(cached, max_gap_ms=self.config.chunk_ms):
+                    yield chunk
+                return
+
+        # 同一テキストの同時合成は 1 本の上流ストリームを共有する。
+        key = canonical_key("tts", {"url": url, **payload})
+        async for chunk in self._singleflight.stream(
+            key, lambda: self._synthesize(url, payload, text, cache_key)
+        ):
+            yield chunk
+
+    async def stream_sentences(
+        self, text: str, voice: str | None = None
+    ) -> AsyncIterator[bytes]:
+        """文単位に分割して先行合成し、文の順番どおりに音声を返す。
+
+        文ごとの応答を連結できるのは生 PCM のみ。Ogg/Opus などはコンテナが文ごとに分かれ、
+        フロントエンドの一括デコードで先頭しか再生されないため、全文を 1 回で合成する。
+        """
+        sentences = split_sentences(text)
+        if not self.is_raw_pcm or len(sentences) <= 1 or self.config.pipeline_max_in_flight <= 1:
+            async for chunk in self.stream_tts(text, voice):
+                yield chunk
+            return
+        pipeline = TTSPipeline(
+            lambda sentence: self.stream_tts(sentence, voice),
+            max_in_flight=self.config.pipeline_max_in_flight,
+            memory_budget_bytes=self.config.pipeline_memory_budget_bytes,
+        )
+        async for chunk in pipeline.stream(sentences):
+            yield chunk
+
+    async def prerender(self, phrases: list[str]) -> int:
+        """定型フレーズを事前合成してキャッシュに載せ、新たに保存した件数を返す。"""
+        if self._cache is None:
+            return 0
+        url = self.config.endpoint.rstrip("/")
+        rendered = 0
+        for phrase in dict.fromkeys(phrase.strip() for phrase in phrases):
+            if not phrase:
+                continue
+            payload = self._build_payload(phrase, None)
+            cache_key = self._cache_key(payload)
+            if cache_key is None or await self._cache.get(cache_key) is not None:
+                continue
+            try:
+                async for _ in self._stream_upstream(url, payload, cache_key):
+                    pass
+                rendered += 1
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("TTS prerender failed for %r: %s", phrase, exc)
+        return rendered
+
+    def coalescing_stats(self) -> dict[str, int]:
+        return self._singleflight.stats()
+
+    def cache_stats(self) -> dict[str, Any] | None:
+        return self._cache.stats() if self._cache is not None else None
+
+    async def warmup(self, text: str) -> int:
+        """デフォルト話者で 1 文合成し、受信したバイト数を返す。失敗時は例外を送出する。"""
+        received = 0
+        async for chunk in self._stream_upstream(
+            self.config.endpoint.rstrip("/"), self._build_payload(text, None), cache_key=None
+        ):
+            received += len(chunk)
+        return received
+
+    def _build_payload(self, text: str, voice: str | None) -> dict[str, object]:
+        return {
             "text": text,
             "reference_id": voice or self.config.default_voice,
             "language": self.config.language,
@@ -45,18 +148,60 @@ class TTSClient:
             "stream": self.config.stream,
         }
 
+    def _cache_key(self, payload: dict[str, object]) -> str | None:
+        if self._cache is None or not self._cache.enabled:
+            return None
+        return self._cache.build_key(
+            text=str(payload["text"]),
+            voice=payload["reference_id"],  # type: ignore[arg-type]
+            language=self.config.language,
+            sample_rate=self.sample_rate,
+            output_format=self.config.output_format,
+        )
+
+    async def _stream_upstream(
+        self, url: str, payload: dict[str, object], cache_key: str | None
+    ) -> AsyncIterator[bytes]:
+        """上流 TTS から受信する。最後まで受信できた音声だけをキャッシュに保存する。"""
+        chunks: list[bytes] = []
+        gaps_ms: list[float] = []
+        start = time.monotonic()
+        last_at: float | None = None
+        # 生 PCM はサンプル境界に揃えた chunk_ms 固定長フレームへ組み直す。
+        framer = PcmFramer(self.sample_rate, self.config.chunk_ms) if self.is_raw_pcm else None
+        async with self._http_client.stream(
+            "POST",
+            url,
+            json=payload,
+            timeout=self.config.timeout_sec,
+        ) as response:
+            response.raise_for_status()
+            async for data in response.aiter_bytes():
+                if not data:
+                    continue
+                for chunk in framer.feed(data) if framer is not None else (data,):
+                    now = time.monotonic()
+                    if cache_key is not None:
+                        chunks.append(chunk)
+                        gaps_ms.append(0.0 if last_at is None else (now - last_at) * 1000)
+                    last_at = now
+                    yield chunk
+            tail = framer.flush() if framer is not None else b""
+            if tail:
+                if cache_key is not None:
+                    chunks.append(tail)
+                    gaps_ms.append(0.0)
+                yield tail
+        if cache_key is not None and chunks and self._cache is not None:
+            await self._cache.put(cache_key, chunks, gaps_ms, synth_sec=time.monotonic() - start)
+
+    async def _synthesize(
+        self, url: str, payload: dict[str, object], text: str, cache_key: str | None
+    ) -> AsyncIterator[bytes]:
         try:
-            async with self._http_client.stream(
-                "POST",
-                url,
-                json=payload,
-                timeout=self.config.timeout_sec,
-            ) as response:
-                response.raise_for_status()
-                async for chunk in response.aiter_bytes():
-                    if chunk:
-                        yield chunk
-                return
+            async for chunk in self._stream_upstream(url, payload, cache_key):
+                yield chunk
+            return
         except Exception as exc:  # noqa: BLE001
             self.fallback_count += 1
             logger.warning(
@@ -70,7 +215,9 @@ class TTSClient:
 
     async def _fallback_stream(self, text: str) -> AsyncIterator[bytes]:
         """実プロバイダ不在時の簡易サイレント音声を返す。"""
-        frame_bytes = max(640, int(self.sample_rate * 2 * self.config.chunk_ms / 1000))
+        frame_bytes = self.frame_bytes or max(
+            640, int(self.sample_rate * 2 * self.config.chunk_ms / 1000)
+        )
         chunk = b"\x00" * frame_bytes
         # 音声長はテキスト長に応じて伸ばすが、上限をかける。
         chunk_count = min(50, max(1, len(text) // 40))
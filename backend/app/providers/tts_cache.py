@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from app.core.providers import TTSCacheConfig
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAudio:
+    chunks: list[bytes]
+    gaps_ms: list[float]
+    synth_sec: float
+
+    @property
+    def byte_length(self) -> int:
+        return sum(len(chunk) for chunk in self.chunks)
+
+
+class TTSAudioCache:
+    """合成パラメータのハッシュで音声を保存する 2 段 (メモリ + ディスク) の LRU キャッシュ。"""
+
+    def __init__(self, config: TTSCacheConfig, data_root: Path | None = None):
+        self.config = config
+        directory = Path(config.directory)
+        if not directory.is_absolute():
+            directory = (data_root or Path("/data")) / directory
+        self._directory = directory
+        self._memory: OrderedDict[str, CachedAudio] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes: int | None = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.gpu_seconds_saved = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.enabled
+
+    @staticmethod
+    def build_key(
+        text: str,
+        voice: str | None,
+        language: str | None,
+        sample_rate: int,
+        output_format: str | None,
+    ) -> str:
+        material = json.dumps(
+            [text, voice, language, sample_rate, output_format], ensure_ascii=False
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> CachedAudio | None:
+        cached = self._memory.get(key)
+        if cached is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            self.gpu_seconds_saved += cached.synth_sec
+            return cached
+
+        if self.config.disk_max_bytes > 0:
+            cached = await asyncio.to_thread(self._read_disk, key)
+            if cached is not None:
+                self.disk_hits += 1
+                self.gpu_seconds_saved += cached.synth_sec
+                self._remember(key, cached)
+                return cached
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, chunks: list[bytes], gaps_ms: list[float], synth_sec: float) -> None:
+        if not chunks:
+            return
+        cached = CachedAudio(chunks=list(chunks), gaps_ms=list(gaps_ms), synth_sec=synth_sec)
+        self._remember(key, cached)
+        self.stores += 1
+        if self.config.disk_max_bytes > 0:
+            try:
+                await asyncio.to_thread(self._write_disk, key, cached)
+            except OSError as exc:
+                logger.warning("Failed to persist TTS cache entry %s: %s", key, exc)
+
+    async def replay(self, cached: CachedAudio, max_gap_ms: float) -> AsyncIterator[bytes]:
+        """元のチャンク境界と受信間隔 (上限付き) を保って再生する。"""
+        for chunk, gap_ms in zip(cached.chunks, cached.gaps_ms):
+            if self.config.replay_cadence and gap_ms > 0:
+                await asyncio.sleep(min(gap_ms, max_gap_ms) / 1000)
+            yield chunk
+
+    def stats(self) -> dict[str, Any]:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_bytes": self._disk_bytes,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "gpu_seconds_saved": round(self.gpu_seconds_saved, 3),
+        }
+
+    def _remember(self, key: str, cached: CachedAudio) -> None:
+        size = cached.byte_length
+        if size > self.config.memory_max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous.byte_length
+        self._memory[key] = cached
+        self._memory_bytes += size
+        while self._memory_bytes > self.config.memory_max_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.byte_length
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        bucket = self._directory / key[:2]
+        return bucket / f"{key}.pcm", bucket / f"{key}.json"
+
+    def _read_disk(self, key: str) -> CachedAudio | None:
+        audio_path, meta_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            data = audio_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        sizes: list[int] = meta.get("chunk_sizes") or []
+        if sum(sizes) != len(data):
+            return None
+        view = memoryview(data)
+        chunks: list[bytes] = []
+        offset = 0
+        for size in sizes:
+            chunks.append(bytes(view[offset : offset + size]))
+            offset += size
+        # ディスク側の LRU 判定用に最終アクセス時刻を更新する。
+        now = time.time()
+        os.utime(meta_path, (now, now))
+        return CachedAudio(
+            chunks=chunks,
+            gaps_ms=list(meta.get("gaps_ms") or [0.0] * len(chunks)),
+            synth_sec=float(meta.get("synth_sec") or 0.0),
+        )
+
+    def _write_disk(self, key: str, cached: CachedAudio) -> None:
+        audio_path, meta_path = self._paths(key)
+        audio_path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "chunk_sizes": [len(chunk) for chunk in cached.chunks],
+            "gaps_ms": [round(gap, 2) for gap in cached.gaps_ms],
+            "synth_sec": cached.synth_sec,
+        }
+        tmp_audio = audio_path.with_suffix(".pcm.tmp")
+        tmp_meta = meta_path.with_suffix(".json.tmp")
+        tmp_audio.write_bytes(b"".join(cached.chunks))
+        tmp_meta.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp_audio, audio_path)
+        os.replace(tmp_meta, meta_path)
+        if self._disk_bytes is not None:
+            self._disk_bytes += audio_path.stat().st_size + meta_path.stat().st_size
+        if self._disk_bytes is None or self._disk_bytes > self.config.disk_max_bytes:
+            self._enforce_disk_limit()
+
+    def _enforce_disk_limit(self) -> None:
+        """ディスク層を走査し、最終アクセスが古いものから上限まで削除する。"""
+        entries: list[tuple[float, int, Path, Path]] = []
+        total = 0
+        for meta_path in self._directory.glob("*/*.json"):
+            audio_path = meta_path.with_suffix(".pcm")
+            try:
+                size = audio_path.stat().st_size + meta_path.stat().st_size
+                accessed = meta_path.stat().st_mtime
+            except OSError:
+                continue
+            entries.append((accessed, size, audio_path, meta_path))
+            total += size
+        if total > self.config.disk_max_bytes:
+            for _, size, audio_path, meta_path in sorted(entries, key=lambda item: item[0]):
+                meta_path.unlink(missing_ok=True)
+                audio_path.unlink(missing_ok=True)
+                total -= size
+                if total <= self.config.disk_max_bytes:
+                    break
+        self._disk_bytes = total
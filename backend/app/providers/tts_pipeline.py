@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import re
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Iterable
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?…\n])|(?<=\.)(?=\s)")
+
+
+def split_sentences(text: str, min_chars: int = 8) -> list[str]:
+    """読点ではなく文末記号で区切り、短すぎる断片は直前の文に連結する。"""
+    sentences: list[str] = []
+    for part in _SENTENCE_END.split(text):
+        part = part.strip()
+        if not part:
+            continue
+        if sentences and (len(sentences[-1]) < min_chars or len(part) < min_chars):
+            sentences[-1] = sentences[-1] + part
+        else:
+            sentences.append(part)
+    return sentences
+
+
+@dataclass
+class _SentenceJob:
+    index: int
+    text: str
+    chunks: deque[bytes] = field(default_factory=deque)
+    done: bool = False
+    error: BaseException | None = None
+    task: asyncio.Task[None] | None = None
+
+
+class TTSPipeline:
+    """複数文の合成を最大 N 本並列で先行させ、音声は必ず文の順番で返す。
+
+    先頭の文は受信したそばから流し、後続の文はメモリ上限の範囲でバッファする。
+    上限に達した後続文は先頭の消費が進むまで上流からの読み出しを止める。
+    """
+
+    def __init__(
+        self,
+        synthesize: Callable[[str], AsyncIterator[bytes]],
+        max_in_flight: int = 2,
+        memory_budget_bytes: int = 8 * 1024 * 1024,
+    ):
+        self._synthesize = synthesize
+        self._max_in_flight = max(1, max_in_flight)
+        self._memory_budget_bytes = memory_budget_bytes
+        self._buffered_bytes = 0
+        self._head_index = 0
+        self._changed = asyncio.Condition()
+        self.peak_buffered_bytes = 0
+        self.budget_waits = 0
+
+    async def stream(self, sentences: Iterable[str]) -> AsyncIterator[bytes]:
+        pending = deque(text for text in sentences if text.strip())
+        jobs: deque[_SentenceJob] = deque()
+        next_index = 0
+        try:
+            while pending or jobs:
+                while pending and len(jobs) < self._max_in_flight:
+                    job = _SentenceJob(index=next_index, text=pending.popleft())
+                    job.task = asyncio.create_task(self._run_job(job))
+                    jobs.append(job)
+                    next_index += 1
+
+                head = jobs[0]
+                async with self._changed:
+                    self._head_index = head.index
+                    # 先頭が変わったことを上限待ちの後続ジョブにも知らせる。
+                    self._changed.notify_all()
+                while True:
+                    async with self._changed:
+                        await self._changed.wait_for(lambda: bool(head.chunks) or head.done)
+                        ready = list(head.chunks)
+                        head.chunks.clear()
+                        self._buffered_bytes -= sum(len(chunk) for chunk in ready)
+                        self._changed.notify_all()
+                        finished = head.done and not head.chunks
+                    for chunk in ready:
+                        yield chunk
+                    if finished:
+                        break
+                jobs.popleft()
+                if head.error is not None:
+                    raise head.error
+        finally:
+            for job in jobs:
+                if job.task is not None and not job.task.done():
+                    job.task.cancel()
+            logger.debug(
+                "TTS pipeline finished",
+                extra={
+                    "sentences": next_index,
+                    "peak_buffered_bytes": self.peak_buffered_bytes,
+                    "budget_waits": self.budget_waits,
+                },
+            )
+
+    async def _run_job(self, job: _SentenceJob) -> None:
+        try:
+            async for chunk in self._synthesize(job.text):
+                if not chunk:
+                    continue
+                async with self._changed:
+                    if job.index != self._head_index and self._over_budget(len(chunk)):
+                        self.budget_waits += 1
+                        await self._changed.wait_for(
+                            lambda: job.index == self._head_index or not self._over_budget(len(chunk))
+                        )
+                    job.chunks.append(chunk)
+                    self._buffered_bytes += len(chunk)
+                    self.peak_buffered_bytes = max(self.peak_buffered_bytes, self._buffered_bytes)
+                    self._changed.notify_all()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            job.error = exc
+        finally:
+            async with self._changed:
+                job.done = True
+                self._changed.notify_all()
+
+    def _over_budget(self, incoming: int) -> bool:
+        return self._buffered_bytes + incoming > self._memory_budget_bytes
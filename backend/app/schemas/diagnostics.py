@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
 
+from app.schemas.rag import NAMESPACE_PATTERN
+
 
 class SttDiagResponse(BaseModel):
     text: str
@@ -56,6 +58,8 @@ class EmbeddingDiagResponse(BaseModel):
 class RagDiagRequest(BaseModel):
     query: str = Field(min_length=1)
     top_k: int | None = Field(default=None, ge=1, le=50)
+    namespace: str | None = Field(default=None, pattern=NAMESPACE_PATTERN)
+    character_id: int | None = Field(default=None, ge=1)
 
 
 class RagDocument(BaseModel):
@@ -67,6 +71,9 @@ class RagDiagResponse(BaseModel):
     query: str
     documents: list[RagDocument]
     context_text: str
+    context_tokens: int = 0
+    context_tokens_saved: int = 0
+    namespace: str | None = None
     rag_index_loaded: bool
     top_k: int
 
@@ -0,0 +1,137 @@
+from typing import Any
+
+from pydantic import BaseModel, Field
+
+# app.services.rag_index.validate_namespace と同じ規則。
+NAMESPACE_PATTERN = r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$"
+
+
+class RagGateStats(BaseModel):
+    enabled: bool = True
+    retrieved: int = 0
+    skipped: dict[str, int] = Field(default_factory=dict)
+    skip_rate: float = 0.0
+    avg_retrieval_ms: float | None = None
+    estimated_saved_ms: float = Field(
+        default=0.0, description="Skipped retrievals times the moving average retrieval latency."
+    )
+
+
+class RagIndexStatus(BaseModel):
+    namespace: str | None = None
+    loaded: bool
+    version: str | None = None
+    published_version: str | None = None
+    format: str | None = None
+    vectors: int = 0
+    dimension: int | None = None
+    index_type: str | None = None
+    search_params: dict[str, float] = Field(default_factory=dict)
+    loaded_at: float | None = None
+    generation: int = 0
+    lexical_index: bool = False
+    mmapped: bool = Field(
+        default=False,
+        description="Inverted lists are memory-mapped (IVF only); other index types are read into memory.",
+    )
+    search_modes: dict[str, int] = Field(
+        default_factory=dict, description="Searches served per mode (vector, hybrid, lexical) since startup."
+    )
+    gate: RagGateStats = Field(default_factory=RagGateStats)
+
+
+class RagReloadRequest(BaseModel):
+    force: bool = Field(default=False, description="Reload even if the published version is unchanged.")
+    namespace: str | None = Field(
+        default=None, pattern=NAMESPACE_PATTERN, description="Namespace to reload; omit for the shared index."
+    )
+
+
+class RagReloadResponse(BaseModel):
+    reloaded: bool
+    index: RagIndexStatus
+
+
+class RagNamespacesStatus(BaseModel):
+    published: list[str]
+    loaded: list[RagIndexStatus]
+    resident_mb: float
+    cache_limit_mb: int
+
+
+class RagBatchSearchRequest(BaseModel):
+    queries: list[str] = Field(min_length=1, max_length=256)
+    top_k: int | None = Field(default=None, ge=1, le=50)
+    namespace: str | None = Field(
+        default=None, pattern=NAMESPACE_PATTERN, description="Search this namespace instead of the shared index."
+    )
+
+
+class RagSearchHit(BaseModel):
+    source: str
+    content: str
+    score: float = Field(description="L2 distance between the query and the chunk (smaller is closer).")
+
+
+class RagBatchSearchItem(BaseModel):
+    query: str
+    documents: list[RagSearchHit]
+
+
+class RagBatchSearchTimings(BaseModel):
+    embed_ms: float
+    search_ms: float
+    fetch_ms: float
+    total_ms: float
+
+
+class RagBatchSearchResponse(BaseModel):
+    results: list[RagBatchSearchItem]
+    timings: RagBatchSearchTimings
+    index_version: str | None = None
+    embedding_fallback: bool = False
+    namespace: str | None = None
+    top_k: int
+
+
+class RagIngestRequest(BaseModel):
+    source: str | None = Field(
+        default=None, description="Directory relative to rag.ingest_source_dir; omit for the whole source root."
+    )
+    namespace: str | None = Field(
+        default=None, pattern=NAMESPACE_PATTERN, description="Build this namespace instead of the shared index."
+    )
+    incremental: bool = Field(default=True, description="Re-embed only changed files when a manifest exists.")
+    index_spec: str | None = Field(default=None, description="FAISS index type (default: rag.index_spec).")
+
+
+class RagIngestProgress(BaseModel):
+    files: int = 0
+    files_total: int = 0
+    chunks: int = 0
+    embeddings: int = 0
+    embeddings_cached: int = 0
+    embeddings_per_sec: float | None = None
+    elapsed_sec: float = 0.0
+    eta_sec: float | None = Field(default=None, description="Remaining time estimated from the parsed file ratio.")
+
+
+class RagIngestJob(BaseModel):
+    id: str
+    status: str = Field(description="running, succeeded, failed or cancelled.")
+    source: str
+    namespace: str | None = None
+    incremental: bool = True
+    index_spec: str | None = None
+    created_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+    progress: RagIngestProgress = Field(default_factory=RagIngestProgress)
+    report: dict[str, Any] | None = Field(default=None, description="Ingest report (same as the CLI JSON output).")
+    error: str | None = None
+    reloaded: bool = Field(default=False, description="Whether the running RagService switched to the new version.")
+    revision: int = 0
+
+
+class RagIngestJobList(BaseModel):
+    jobs: list[RagIngestJob]
@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
 
+from app.schemas.rag import NAMESPACE_PATTERN
+
 
 class TextChatRequest(BaseModel):
     session_id: str = Field(..., description="Client session identifier")
@@ -13,3 +15,8 @@ class TextChatRequest(BaseModel):
     character_id: int | None = Field(
         default=None, ge=1, description="Optional character profile id for persona prompt."
     )
+    namespace: str | None = Field(
+        default=None,
+        pattern=NAMESPACE_PATTERN,
+        description="RAG namespace to search. Defaults to the character's namespace, then the shared index.",
+    )
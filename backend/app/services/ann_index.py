@@ -0,0 +1,240 @@
+import logging
+import math
+from dataclasses import asdict, dataclass, replace
+from typing import Any
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_KINDS = {
+    "flat": ("flat", "flat"),
+    "sq8": ("flat", "sq8"),
+    "pq": ("flat", "pq"),
+    "hnsw": ("hnsw", "flat"),
+    "hnsw-sq8": ("hnsw", "sq8"),
+    "hnsw-pq": ("hnsw", "pq"),
+    "ivf": ("ivf", "flat"),
+    "ivf-flat": ("ivf", "flat"),
+    "ivf-sq8": ("ivf", "sq8"),
+    "ivf-pq": ("ivf", "pq"),
+}
+_PARAMS = {
+    "m": "hnsw_m",
+    "efconstruction": "ef_construction",
+    "efsearch": "ef_search",
+    "nlist": "nlist",
+    "nprobe": "nprobe",
+    "pqm": "pq_m",
+    "nbits": "pq_nbits",
+}
+_ADD_BATCH = 65_536
+_MAX_TRAIN = 200_000
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """FAISS インデックスの種類とパラメータ。kind は探索構造、encoding はベクトルの保存形式。"""
+
+    kind: str = "flat"
+    encoding: str = "flat"
+    hnsw_m: int = 32
+    ef_construction: int = 80
+    ef_search: int = 64
+    nlist: int | None = None
+    nprobe: int | None = None
+    pq_m: int = 16
+    pq_nbits: int = 8
+
+    @property
+    def name(self) -> str:
+        if self.kind == "flat":
+            return self.encoding
+        return self.kind if self.encoding == "flat" else f"{self.kind}-{self.encoding}"
+
+    @property
+    def needs_training(self) -> bool:
+        return self.kind == "ivf" or self.encoding != "flat"
+
+    @property
+    def supports_remove(self) -> bool:
+        # HNSW のグラフからはベクトルを削除できない。
+        return self.kind != "hnsw"
+
+    def describe(self) -> str:
+        params: list[str] = []
+        if self.kind == "hnsw":
+            params += [f"M={self.hnsw_m}", f"efConstruction={self.ef_construction}", f"efSearch={self.ef_search}"]
+        if self.kind == "ivf":
+            if self.nlist is not None:
+                params.append(f"nlist={self.nlist}")
+            if self.nprobe is not None:
+                params.append(f"nprobe={self.nprobe}")
+        if self.encoding == "pq":
+            params += [f"pqM={self.pq_m}", f"nbits={self.pq_nbits}"]
+        return self.name + (":" + ",".join(params) if params else "")
+
+    def factory_string(self) -> str:
+        if self.encoding == "sq8":
+            code = "SQ8"
+        elif self.encoding == "pq":
+            code = f"PQ{self.pq_m}x{self.pq_nbits}"
+        else:
+            code = "Flat"
+        if self.kind == "hnsw":
+            if self.encoding == "pq":
+                return f"HNSW{self.hnsw_m}_PQ{self.pq_m}x{self.pq_nbits}"
+            return f"HNSW{self.hnsw_m}" + ("_SQ8" if self.encoding == "sq8" else "")
+        if self.kind == "ivf":
+            return f"IVF{self.nlist},{code}"
+        return code
+
+    def search_params(self) -> dict[str, int]:
+        if self.kind == "hnsw":
+            return {"efSearch": self.ef_search}
+        if self.kind == "ivf" and self.nprobe is not None:
+            return {"nprobe": self.nprobe}
+        return {}
+
+    def to_manifest(self) -> dict[str, Any]:
+        return {
+            "spec": self.describe(),
+            "factory": self.factory_string(),
+            "search_params": self.search_params(),
+            "params": asdict(self),
+        }
+
+
+def parse_index_spec(text: str) -> IndexSpec | None:
+    """"hnsw:M=32,efSearch=64" 形式を解析する。"auto" は None (件数から自動選択) を返す。"""
+    name, _, raw_params = text.strip().partition(":")
+    name = name.strip().lower()
+    if name == "auto":
+        return None
+    if name not in _KINDS:
+        raise ValueError(f"unknown index type {name!r}; expected auto or one of {', '.join(_KINDS)}")
+    kind, encoding = _KINDS[name]
+    values: dict[str, int] = {}
+    for item in filter(None, (part.strip() for part in raw_params.split(","))):
+        key, sep, value = item.partition("=")
+        field_name = _PARAMS.get(key.strip().lower().replace("_", ""))
+        if not sep or field_name is None:
+            raise ValueError(f"invalid index parameter {item!r}; expected one of {', '.join(_PARAMS)}")
+        values[field_name] = int(value)
+    return IndexSpec(kind=kind, encoding=encoding, **values)
+
+
+def auto_index_spec(ntotal: int) -> IndexSpec:
+    """件数に応じた既定値。小さいうちは厳密検索、中規模は HNSW、大規模は IVF + SQ8 で省メモリにする。"""
+    if ntotal < 50_000:
+        return IndexSpec()
+    if ntotal < 1_000_000:
+        return IndexSpec(kind="hnsw", hnsw_m=32, ef_search=64)
+    return IndexSpec(kind="ivf", encoding="sq8")
+
+
+def resolve_index_spec(spec: IndexSpec | None, ntotal: int, dimension: int) -> IndexSpec:
+    """件数と次元が分かった時点で未確定のパラメータを埋め、学習できない組み合わせは縮退させる。"""
+    resolved = spec or auto_index_spec(ntotal)
+    if resolved.kind == "ivf":
+        nlist = resolved.nlist or int(4 * math.sqrt(max(ntotal, 1)))
+        # k-means の学習にはクラスタあたり 39 点程度が必要。
+        nlist = max(1, min(nlist, ntotal // 39))
+        nprobe = resolved.nprobe or max(8, nlist // 32)
+        resolved = replace(resolved, nlist=nlist, nprobe=min(nprobe, nlist))
+    if resolved.encoding == "pq":
+        pq_m = max(m for m in range(1, min(resolved.pq_m, dimension) + 1) if dimension % m == 0)
+        resolved = replace(resolved, pq_m=pq_m)
+        if ntotal < 2**resolved.pq_nbits:
+            logger.warning(
+                "Too few vectors (%d) to train PQ with %d bits; using %s without PQ.",
+                ntotal,
+                resolved.pq_nbits,
+                resolved.kind,
+            )
+            resolved = replace(resolved, encoding="flat")
+    if resolved.kind == "ivf" and ntotal < 39:
+        logger.warning("Too few vectors (%d) to train IVF; using a flat index.", ntotal)
+        resolved = replace(resolved, kind="flat")
+    return resolved
+
+
+def spec_from_manifest(manifest: dict[str, Any]) -> IndexSpec:
+    params = (manifest.get("ann") or {}).get("params")
+    return IndexSpec(**params) if params else IndexSpec()
+
+
+def parse_search_params(text: str) -> dict[str, float]:
+    """faiss.ParameterSpace と同じ "efSearch=128,nprobe=32" 形式を辞書にする。"""
+    pairs = (item.partition("=") for item in text.split(",") if item.strip())
+    return {key.strip(): float(value) for key, _, value in pairs}
+
+
+def apply_search_params(index: faiss.Index, params: dict[str, Any]) -> dict[str, float]:
+    """efSearch/nprobe 等の検索時パラメータを設定し、適用できたものを返す (IDMap 等のラッパー越しでも効く)。"""
+    space = faiss.ParameterSpace()
+    applied: dict[str, float] = {}
+    for name, value in params.items():
+        try:
+            space.set_index_parameter(index, name, float(value))
+        except RuntimeError as exc:
+            logger.warning("Search parameter %s=%s does not apply to this index: %s", name, value, exc)
+            continue
+        applied[name] = float(value)
+    return applied
+
+
+def new_id_index(spec: IndexSpec, dimension: int) -> faiss.Index:
+    index = faiss.index_factory(dimension, "IDMap2," + spec.factory_string(), faiss.METRIC_L2)
+    if spec.kind == "hnsw":
+        faiss.downcast_index(faiss.downcast_index(index).index).hnsw.efConstruction = spec.ef_construction
+    return index
+
+
+def train_size(spec: IndexSpec, ntotal: int) -> int:
+    wanted = 50_000
+    if spec.kind == "ivf" and spec.nlist:
+        wanted = max(wanted, spec.nlist * 64)
+    return min(ntotal, wanted, _MAX_TRAIN)
+
+
+def rebuild_id_index(
+    source: faiss.Index, spec: IndexSpec, drop_ids: np.ndarray | None = None, seed: int = 0
+) -> faiss.Index:
+    """ID 付きインデックスのベクトルを取り出し、spec の構造で作り直す (学習が必要なら標本で学習する)。
+
+    量子化済みのインデックスから作り直す場合は復元ベクトル (近似値) を使う。
+    """
+    source = faiss.downcast_index(source)
+    ids = faiss.vector_to_array(source.id_map).astype(np.int64)
+    base = faiss.downcast_index(source.index)
+    rows = np.arange(len(ids))
+    if drop_ids is not None and len(drop_ids):
+        rows = rows[~np.isin(ids, drop_ids)]
+    target = new_id_index(spec, source.d)
+    if not target.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(rows, size=train_size(spec, len(rows)), replace=False))
+        target.train(base.reconstruct_batch(sample))
+    for start in range(0, len(rows), _ADD_BATCH):
+        batch = rows[start : start + _ADD_BATCH]
+        if len(batch) and batch[-1] - batch[0] + 1 == len(batch):
+            vectors = base.reconstruct_n(int(batch[0]), len(batch))
+        else:
+            vectors = base.reconstruct_batch(batch)
+        target.add_with_ids(vectors, ids[batch])
+    apply_search_params(target, spec.search_params())
+    return target
+
+
+def remove_ids(index: faiss.Index, spec: IndexSpec, ids: list[int]) -> faiss.Index:
+    """ID を削除したインデックスを返す。HNSW のように削除できない構造は残りのベクトルで作り直す。"""
+    if not ids:
+        return index
+    drop = np.asarray(ids, dtype=np.int64)
+    if spec.supports_remove:
+        index.remove_ids(drop)
+        return index
+    logger.info("Rebuilding %s index without %d removed vectors", spec.name, len(drop))
+    return rebuild_id_index(index, spec, drop)
@@ -0,0 +1,196 @@
+import math
+import re
+from dataclasses import dataclass, field
+
+from langchain_core.documents import Document
+
+_CJK = re.compile(r"[぀-ヿ㐀-䶿一-鿿豈-﫿ｦ-ﾟ]")
+_SENTENCE_BREAK = re.compile(r"(?<=[。！？!?])|(?<=\.)\s+|\n+")
+_SPACE = re.compile(r"\s+")
+_CJK_END = re.compile(r"[。！？」』）]$")
+# チャンク分割の重なり (chunk_overlap=80) より十分短い一致は偶然とみなす。
+_MIN_OVERLAP_CHARS = 20
+
+
+def estimate_tokens(text: str) -> int:
+    """トークナイザなしの概算。かな・漢字は 1 文字 1 トークン、それ以外は 4 文字で 1 トークンとする。"""
+    cjk = len(_CJK.findall(text))
+    other = len(_SPACE.sub("", text)) - cjk
+    return cjk + math.ceil(other / 4)
+
+
+def format_passage(position: int, doc: Document, content: str | None = None) -> str:
+    meta = doc.metadata or {}
+    source = meta.get("source") or "unknown"
+    return f"[{position}] ({source}) {doc.page_content if content is None else content}"
+
+
+def format_context(docs: list[Document]) -> str:
+    return "\n\n".join(format_passage(position, doc) for position, doc in enumerate(docs, start=1))
+
+
+def _shingles(text: str, size: int = 3) -> set[str]:
+    compact = _SPACE.sub("", text.lower())
+    if len(compact) <= size:
+        return {compact} if compact else set()
+    return {compact[start : start + size] for start in range(len(compact) - size + 1)}
+
+
+def _containment(a: set[str], b: set[str]) -> float:
+    """小さい方の集合がもう一方にどれだけ含まれるか。片方が他方の部分文字列なら 1 に近い。"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def _same_source(a: Document, b: Document) -> bool:
+    meta_a, meta_b = a.metadata or {}, b.metadata or {}
+    return meta_a.get("source") is not None and meta_a.get("source") == meta_b.get("source")
+
+
+def _strip_overlap(kept: str, text: str) -> str:
+    """同じ出典の隣接チャンク同士で、末尾と先頭の重なり部分を後者から取り除く。"""
+    limit = min(len(kept), len(text))
+    for size in range(limit, _MIN_OVERLAP_CHARS - 1, -1):
+        if kept.endswith(text[:size]):
+            return text[size:].lstrip()
+        if text.endswith(kept[:size]):
+            return text[: len(text) - size].rstrip()
+    return text
+
+
+def _split_sentences(text: str) -> list[str]:
+    return [sentence.strip() for sentence in _SENTENCE_BREAK.split(text) if sentence.strip()]
+
+
+def _trim_to_sentences(text: str, query_grams: set[str], budget: int) -> str:
+    """クエリとの文字 n-gram 一致が多い文から予算内で採用し、元の順序で連結する。"""
+    sentences = _split_sentences(text)
+    scored = sorted(
+        range(len(sentences)),
+        key=lambda i: (-len(_shingles(sentences[i], 2) & query_grams), i),
+    )
+    chosen: list[int] = []
+    used = 0
+    for i in scored:
+        cost = estimate_tokens(sentences[i])
+        if used + cost > budget:
+            continue
+        chosen.append(i)
+        used += cost
+    parts: list[str] = []
+    for i in sorted(chosen):
+        # 和文の句点の後は詰め、それ以外は空白で区切る。
+        if parts and not _CJK_END.search(parts[-1]):
+            parts.append(" ")
+        parts.append(sentences[i])
+    return "".join(parts)
+
+
+@dataclass
+class PackedContext:
+    text: str
+    documents: list[Document] = field(default_factory=list)
+    tokens: int = 0
+    original_tokens: int = 0
+    duplicates_removed: int = 0
+    passages_trimmed: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.original_tokens - self.tokens)
+
+
+def pack_context(
+    query: str,
+    docs: list[Document],
+    distances: list[float | None] | None = None,
+    token_budget: int = 0,
+    mmr_lambda: float = 0.7,
+    duplicate_threshold: float = 0.8,
+) -> PackedContext:
+    """検索結果をプロンプト用に詰める。
+
+    重複・重なりを除き、MMR (関連度と既採用文書との類似度の兼ね合い) で順序を決め、
+    token_budget (0 で無制限) に収まらない文書はクエリに近い文だけに切り詰める。
+    関連度は L2 距離 (distances) を 0..1 に正規化した値で、距離の無い文書 (語彙検索だけで見つかったもの) は
+    検索順位から求める。
+    """
+    original_tokens = estimate_tokens(format_context(docs))
+    if not docs:
+        return PackedContext(text="", original_tokens=original_tokens)
+
+    relevance = [1.0 - rank / len(docs) for rank in range(len(docs))]
+    known = [d for d in distances or [] if d is not None]
+    if known and distances is not None and len(distances) == len(docs):
+        low, high = min(known), max(known)
+        relevance = [
+            by_rank if d is None else 1.0 if high == low else (high - d) / (high - low)
+            for by_rank, d in zip(relevance, distances)
+        ]
+
+    # 順位の高い文書を基準に、ほぼ同じ内容の文書を落とし、同じ出典の重なりを削る。
+    contents: list[str] = []
+    grams: list[set[str]] = []
+    kept: list[int] = []
+    duplicates = 0
+    for rank, doc in enumerate(docs):
+        content = doc.page_content.strip()
+        for position, other in enumerate(kept):
+            if _same_source(doc, docs[other]):
+                content = _strip_overlap(contents[position], content)
+        content_grams = _shingles(content)
+        if not content_grams or any(
+            _containment(content_grams, existing) >= duplicate_threshold for existing in grams
+        ):
+            duplicates += 1
+            continue
+        kept.append(rank)
+        contents.append(content)
+        grams.append(content_grams)
+
+    # MMR: max(λ·関連度 - (1-λ)·既採用文書との最大類似度) の順に並べる。
+    order: list[int] = []
+    remaining = list(range(len(kept)))
+    while remaining:
+        best = max(
+            remaining,
+            key=lambda i: mmr_lambda * relevance[kept[i]]
+            - (1 - mmr_lambda)
+            * max((_containment(grams[i], grams[j]) for j in order), default=0.0),
+        )
+        order.append(best)
+        remaining.remove(best)
+
+    query_grams = _shingles(query, 2)
+    passages: list[str] = []
+    selected: list[Document] = []
+    used = 0
+    trimmed = 0
+    for i in order:
+        doc = docs[kept[i]]
+        position = len(passages) + 1
+        passage = format_passage(position, doc, contents[i])
+        cost = estimate_tokens(passage)
+        if token_budget and used + cost > token_budget:
+            header = estimate_tokens(format_passage(position, doc, ""))
+            content = _trim_to_sentences(contents[i], query_grams, token_budget - used - header)
+            if not content:
+                continue
+            passage = format_passage(position, doc, content)
+            cost = estimate_tokens(passage)
+            trimmed += 1
+        passages.append(passage)
+        selected.append(doc)
+        used += cost
+        if token_budget and used >= token_budget:
+            break
+
+    return PackedContext(
+        text="\n\n".join(passages),
+        documents=selected,
+        tokens=used,
+        original_tokens=original_tokens,
+        duplicates_removed=duplicates,
+        passages_trimmed=trimmed,
+    )
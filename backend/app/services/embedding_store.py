@@ -0,0 +1,169 @@
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from app.services.rag_index import NAMESPACES_DIR
+
+DEFAULT_FILE_NAME = "embedding-cache.sqlite"
+# SQLite の変数上限 (既定 999) を超えないように IN 句を分割する。
+_LOOKUP_BATCH = 500
+# 1 行あたりのキー・列の概算バイト数。容量上限の判定に使う。
+_ROW_OVERHEAD = 96
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def resolve_cache_path(setting: str, index_path: Path) -> Path | None:
+    """"auto" は共有インデックスと同じディレクトリ、空文字 / "off" は無効、それ以外はパスとして扱う。
+
+    名前空間のインデックス (<dir>/namespaces/<ns>/<file>) も <dir> のキャッシュを共有する。
+    """
+    value = setting.strip()
+    if not value or value.lower() == "off":
+        return None
+    if value.lower() == "auto":
+        base = index_path.parent
+        if base.parent.name == NAMESPACES_DIR:
+            base = base.parent.parent
+        return base / DEFAULT_FILE_NAME
+    return Path(value)
+
+
+class EmbeddingStore:
+    """インジェスト用の永続埋め込みキャッシュ。(本文の SHA-256, モデル, 次元) をキーに float32 ベクトルを保存する。
+
+    同じ接続は作成したスレッドからのみ使う。複数のインジェストが同時に開いても WAL で読み書きできる。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "digest BLOB NOT NULL, model TEXT NOT NULL, dimension INTEGER NOT NULL, "
+            "vector BLOB NOT NULL, created_at REAL NOT NULL, used_at REAL NOT NULL, "
+            "PRIMARY KEY (digest, model, dimension)) WITHOUT ROWID"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS embeddings_used_at ON embeddings (used_at)")
+        self._connection.commit()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def get_many(self, digests: list[bytes], model: str, dimension: int) -> dict[bytes, np.ndarray]:
+        found: dict[bytes, np.ndarray] = {}
+        unique = list(dict.fromkeys(digests))
+        for start in range(0, len(unique), _LOOKUP_BATCH):
+            batch = unique[start : start + _LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._connection.execute(
+                f"SELECT digest, vector FROM embeddings WHERE model = ? AND dimension = ? "
+                f"AND digest IN ({placeholders})",
+                (model, dimension, *batch),
+            ).fetchall()
+            for digest, blob in rows:
+                found[bytes(digest)] = np.frombuffer(blob, dtype=np.float32)
+        if found:
+            # 最終利用時刻は容量超過時に古いものから消すために使う。
+            now = time.time()
+            self._connection.executemany(
+                "UPDATE embeddings SET used_at = ? WHERE digest = ? AND model = ? AND dimension = ?",
+                ((now, digest, model, dimension) for digest in found),
+            )
+            self._connection.commit()
+        self.hits += sum(1 for digest in digests if digest in found)
+        self.misses += sum(1 for digest in digests if digest not in found)
+        return found
+
+    def put_many(self, digests: list[bytes], model: str, matrix: np.ndarray) -> None:
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        now = time.time()
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (digest, model, int(matrix.shape[1]), row.tobytes(), now, now)
+                for digest, row in zip(digests, matrix)
+            ),
+        )
+        self._connection.commit()
+        self.writes += len(digests)
+
+    def compact(
+        self,
+        max_bytes: int = 0,
+        max_age_sec: float = 0,
+        keep_models: list[str] | None = None,
+    ) -> dict[str, Any]:
+        """keep_models 以外のモデルと max_age_sec 以上使われていない行を消す。
+
+        max_bytes を超える分は最終利用の古い順に消し、最後に VACUUM でファイルを縮める。
+        """
+        before = self.stats()
+        if keep_models:
+            placeholders = ",".join("?" * len(keep_models))
+            self._connection.execute(f"DELETE FROM embeddings WHERE model NOT IN ({placeholders})", keep_models)
+        if max_age_sec > 0:
+            self._connection.execute("DELETE FROM embeddings WHERE used_at < ?", (time.time() - max_age_sec,))
+        if max_bytes > 0:
+            excess = self._payload_bytes() - max_bytes
+            if excess > 0:
+                cursor = self._connection.execute(
+                    "SELECT digest, model, dimension, length(vector) FROM embeddings ORDER BY used_at"
+                )
+                doomed: list[tuple[bytes, str, int]] = []
+                while excess > 0 and (row := cursor.fetchone()) is not None:
+                    doomed.append(row[:3])
+                    excess -= row[3] + _ROW_OVERHEAD
+                cursor.close()
+                self._connection.executemany(
+                    "DELETE FROM embeddings WHERE digest = ? AND model = ? AND dimension = ?", doomed
+                )
+        self._connection.commit()
+        self._vacuum()
+        after = self.stats()
+        return {
+            "entries_removed": before["entries"] - after["entries"],
+            "bytes_before": before["file_bytes"],
+            "bytes_after": after["file_bytes"],
+        }
+
+    def clear(self) -> None:
+        self._connection.execute("DELETE FROM embeddings")
+        self._connection.commit()
+        self._vacuum()
+
+    def _vacuum(self) -> None:
+        self._connection.execute("VACUUM")
+        self._connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _payload_bytes(self) -> int:
+        row = self._connection.execute(
+            "SELECT count(*), coalesce(sum(length(vector)), 0) FROM embeddings"
+        ).fetchone()
+        return int(row[1]) + int(row[0]) * _ROW_OVERHEAD
+
+    def stats(self) -> dict[str, Any]:
+        models = [
+            {"model": model, "dimension": dimension, "entries": count}
+            for model, dimension, count in self._connection.execute(
+                "SELECT model, dimension, count(*) FROM embeddings GROUP BY model, dimension ORDER BY model"
+            )
+        ]
+        files = [self.path, self.path.with_name(self.path.name + "-wal")]
+        return {
+            "path": str(self.path),
+            "entries": sum(item["entries"] for item in models),
+            "models": models,
+            "file_bytes": sum(path.stat().st_size for path in files if path.exists()),
+        }
+
+    def close(self) -> None:
+        self._connection.close()
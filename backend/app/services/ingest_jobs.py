@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field, fields
+from pathlib import Path
+from typing import Any
+
+from app.services.rag_index import namespace_index_path
+from app.services.rag_service import RagService
+
+logger = logging.getLogger(__name__)
+
+# 終了したジョブは新しいものから保持する件数。
+_HISTORY = 20
+# 進捗はこの間隔より細かく送らない。
+_PROGRESS_INTERVAL_SEC = 0.5
+_POLL_SEC = 0.5
+
+
+class IngestJobConflictError(RuntimeError):
+    pass
+
+
+@dataclass
+class IngestJob:
+    id: str
+    source: str
+    namespace: str | None = None
+    incremental: bool = True
+    index_spec: str | None = None
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    progress: dict[str, Any] = field(default_factory=dict)
+    report: dict[str, Any] | None = None
+    error: str | None = None
+    reloaded: bool = False
+    revision: int = 0
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in {"succeeded", "failed", "cancelled"}
+
+    def snapshot(self) -> dict[str, Any]:
+        return {item.name: getattr(self, item.name) for item in fields(self) if not item.name.startswith("_")}
+
+    def touch(self) -> None:
+        """購読者を起こし、次の変更待ち用に Event を差し替える。"""
+        self.revision += 1
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_changed(self, revision: int, timeout: float) -> bool:
+        if self.revision != revision:
+            return True
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+def _run_ingest(params: dict[str, Any], events: Any) -> None:
+    """ワーカープロセスの本体。進捗と結果を events キューへ送る。"""
+    from app.cli.ingest import IngestOptions, ingest
+    from app.core.logging import configure_logging
+
+    configure_logging()
+    last_sent = 0.0
+
+    def _progress(stats: Any) -> None:
+        nonlocal last_sent
+        now = time.monotonic()
+        if now - last_sent >= _PROGRESS_INTERVAL_SEC:
+            last_sent = now
+            events.put({"type": "progress", "progress": stats.progress()})
+
+    try:
+        report = ingest(
+            Path(params["source"]),
+            Path(params["providers_path"]),
+            Path(params["index_path"]),
+            incremental=params["incremental"],
+            options=IngestOptions(
+                workers=params["workers"],
+                index_spec=params["index_spec"],
+                progress=_progress,
+            ),
+        )
+    except BaseException as exc:  # noqa: BLE001
+        events.put({"type": "error", "error": f"{type(exc).__name__}: {exc}"})
+        return
+    events.put({"type": "done", "report": asdict(report)})
+
+
+class IngestJobManager:
+    """インジェストを別プロセスで 1 件ずつ実行し、終わったら RagService に新しいバージョンを読み込ませる。
+
+    イベントループはキューの待ち受けをスレッドに逃がすだけで、パース・埋め込み・索引構築で塞がれない。
+    """
+
+    def __init__(
+        self,
+        rag_service: RagService,
+        providers_path: Path,
+        index_path: Path,
+        source_root: Path,
+        workers: int = 1,
+    ):
+        self._rag_service = rag_service
+        self._providers_path = providers_path
+        self._index_path = index_path
+        self._source_root = source_root
+        self._workers = workers
+        self._jobs: OrderedDict[str, IngestJob] = OrderedDict()
+        self._active: tuple[IngestJob, multiprocessing.process.BaseProcess, asyncio.Task] | None = None
+        # 稼働中のサーバはスレッドを持つため fork は使わない。
+        self._context = multiprocessing.get_context("spawn")
+
+    def resolve_source(self, source: str | None) -> Path:
+        """ソースは設定したルート配下の相対パスに限る。"""
+        root = self._source_root.resolve()
+        path = (root / source).resolve() if source else root
+        if path != root and root not in path.parents:
+            raise ValueError(f"source must stay under {root}")
+        if not path.is_dir():
+            raise ValueError(f"source directory not found: {path}")
+        return path
+
+    def start(
+        self,
+        source: str | None = None,
+        namespace: str | None = None,
+        incremental: bool = True,
+        index_spec: str | None = None,
+    ) -> IngestJob:
+        if self._active is not None:
+            raise IngestJobConflictError(f"ingest job {self._active[0].id} is still running")
+        source_dir = self.resolve_source(source)
+        index_path = namespace_index_path(self._index_path, namespace)
+        job = IngestJob(
+            id=uuid.uuid4().hex,
+            source=str(source_dir),
+            namespace=namespace,
+            incremental=incremental,
+            index_spec=index_spec,
+        )
+        events = self._context.Queue()
+        process = self._context.Process(
+            target=_run_ingest,
+            args=(
+                {
+                    "source": str(source_dir),
+                    "providers_path": str(self._providers_path),
+                    "index_path": str(index_path),
+                    "incremental": incremental,
+                    "index_spec": index_spec,
+                    "workers": self._workers,
+                },
+                events,
+            ),
+            name=f"ingest-{job.id[:8]}",
+        )
+        process.start()
+        job.status = "running"
+        job.started_at = time.time()
+        self._remember(job)
+        task = asyncio.create_task(self._supervise(job, process, events))
+        self._active = (job, process, task)
+        logger.info("Started ingest job %s (source=%s, namespace=%s)", job.id, source_dir, namespace)
+        return job
+
+    def get(self, job_id: str) -> IngestJob | None:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> list[IngestJob]:
+        return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> bool:
+        """実行中なら終了させる。チェックポイント済みの分は次回の全件インジェストで再開される。"""
+        if self._active is None or self._active[0].id != job_id:
+            return False
+        job, process, _ = self._active
+        job.status = "cancelled"
+        process.terminate()
+        return True
+
+    async def shutdown(self) -> None:
+        if self._active is None:
+            return
+        job, process, task = self._active
+        job.status = "cancelled"
+        process.terminate()
+        await task
+
+    def _remember(self, job: IngestJob) -> None:
+        self._jobs[job.id] = job
+        finished = [key for key, item in self._jobs.items() if item.finished]
+        for key in finished[: max(0, len(finished) - _HISTORY)]:
+            del self._jobs[key]
+
+    @staticmethod
+    def _apply_event(job: IngestJob, event: dict[str, Any]) -> dict[str, Any] | None:
+        """進捗ならジョブに反映して None、done/error ならそのイベントを返す。"""
+        if event["type"] == "progress":
+            job.progress = event["progress"]
+            job.touch()
+            return None
+        return event
+
+    async def _supervise(self, job: IngestJob, process: Any, events: Any) -> None:
+        result: dict[str, Any] | None = None
+        try:
+            while result is None:
+                try:
+                    event = await asyncio.to_thread(events.get, True, _POLL_SEC)
+                except queue.Empty:
+                    if not process.is_alive():
+                        break
+                    continue
+                result = self._apply_event(job, event)
+            await asyncio.to_thread(process.join)
+            # 終了直前に送られたイベントがタイムアウトと入れ違いで残っていることがあるので読み切る。
+            while result is None:
+                try:
+                    event = events.get_nowait()
+                except queue.Empty:
+                    break
+                result = self._apply_event(job, event)
+            if job.status == "cancelled":
+                job.error = "cancelled"
+            elif result is None:
+                job.status = "failed"
+                job.error = f"worker exited with code {process.exitcode}"
+            elif result["type"] == "error":
+                job.status = "failed"
+                job.error = result["error"]
+            else:
+                job.report = result["report"]
+                job.progress = {**job.progress, "files": job.progress.get("files_total", 0), "eta_sec": 0.0}
+                try:
+                    job.reloaded = await self._rag_service.reload(namespace=job.namespace)
+                except Exception as exc:  # noqa: BLE001
+                    logger.warning("Ingest job %s finished but the index reload failed: %s", job.id, exc)
+                job.status = "succeeded"
+        except Exception as exc:  # noqa: BLE001
+            job.status = "failed"
+            job.error = str(exc)
+            logger.exception("Ingest job %s supervision failed", job.id)
+        finally:
+            events.close()
+            job.finished_at = time.time()
+            self._active = None
+            self._remember(job)
+            job.touch()
+            logger.info(
+                "Ingest job %s %s in %.1f s",
+                job.id,
+                job.status,
+                job.finished_at - (job.started_at or job.created_at),
+            )
@@ -0,0 +1,107 @@
+import logging
+import re
+import sqlite3
+import unicodedata
+from collections.abc import Iterable
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_TABLE = "lexical"
+TOKENIZER_NAME = "cjk-bigram+word"
+_WORD = re.compile(r"[a-z0-9]+")
+_CJK_RUN = re.compile(r"[々〆ぁ-ゖァ-ヺー㐀-䶿一-鿿豈-﫿]+")
+_TOKEN = re.compile(f"{_WORD.pattern}|{_CJK_RUN.pattern}")
+_MAX_QUERY_TERMS = 64
+_BUILD_BATCH = 1000
+
+
+def lexical_terms(text: str) -> list[str]:
+    """NFKC 正規化した本文を、英数字は単語、かな・漢字の連続は文字 bigram (1 文字なら unigram) に分ける。"""
+    terms: list[str] = []
+    for match in _TOKEN.finditer(unicodedata.normalize("NFKC", text).lower()):
+        token = match.group(0)
+        if _WORD.fullmatch(token) or len(token) == 1:
+            terms.append(token)
+        else:
+            terms.extend(token[start : start + 2] for start in range(len(token) - 1))
+    return terms
+
+
+def _match_expression(query: str) -> tuple[list[str], str | None]:
+    terms = list(dict.fromkeys(lexical_terms(query)))[:_MAX_QUERY_TERMS]
+    if not terms:
+        return terms, None
+    # 語は英数字とかな・漢字のみなので、二重引用符で囲めば FTS5 の演算子と衝突しない。
+    return terms, " OR ".join(f'"{term}"' for term in terms)
+
+
+def build_lexical_index(path: Path) -> int | None:
+    """SQLite 文書ストアに FTS5 (contentless) の転置インデックスを作り、登録件数を返す。
+
+    FTS5 が使えない SQLite では作らずに None を返す (検索はベクトルのみになる)。
+    """
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute(f"DROP TABLE IF EXISTS {LEXICAL_TABLE}")
+        try:
+            connection.execute(
+                f"CREATE VIRTUAL TABLE {LEXICAL_TABLE} USING fts5("
+                "terms, content='', tokenize='unicode61 remove_diacritics 0')"
+            )
+        except sqlite3.OperationalError as exc:
+            logger.warning("SQLite FTS5 is unavailable (%s); skipping the lexical index.", exc)
+            return None
+        reader = connection.cursor()
+        reader.execute("SELECT id, content FROM documents ORDER BY id")
+        count = 0
+        while rows := reader.fetchmany(_BUILD_BATCH):
+            connection.executemany(
+                f"INSERT INTO {LEXICAL_TABLE}(rowid, terms) VALUES (?, ?)",
+                ((doc_id, " ".join(lexical_terms(content))) for doc_id, content in rows),
+            )
+            count += len(rows)
+        connection.execute(f"INSERT INTO {LEXICAL_TABLE}({LEXICAL_TABLE}) VALUES ('optimize')")
+        connection.commit()
+        return count
+    finally:
+        connection.close()
+
+
+def has_lexical_index(connection: sqlite3.Connection) -> bool:
+    row = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (LEXICAL_TABLE,)
+    ).fetchone()
+    return row is not None
+
+
+def search_lexical_index(connection: sqlite3.Connection, query: str, k: int) -> list[tuple[int, float]]:
+    """BM25 の高い順に (文書 ID, スコア) を返す。スコアは大きいほど一致が強い。"""
+    _, expression = _match_expression(query)
+    if expression is None:
+        return []
+    rows = connection.execute(
+        f"SELECT rowid, bm25({LEXICAL_TABLE}) AS score FROM {LEXICAL_TABLE} "
+        f"WHERE {LEXICAL_TABLE} MATCH ? ORDER BY score LIMIT ?",
+        (expression, k),
+    ).fetchall()
+    return [(int(doc_id), -float(score)) for doc_id, score in rows]
+
+
+def is_decisive(query: str, hits: list[tuple[int, float]], top_content: str, ratio: float) -> bool:
+    """最上位の文書がクエリの語をすべて含み、2 位との BM25 差が ratio 倍以上なら語彙一致で確定とみなす。"""
+    if ratio <= 0 or not hits:
+        return False
+    terms, _ = _match_expression(query)
+    if not terms or not set(terms) <= set(lexical_terms(top_content)):
+        return False
+    return len(hits) == 1 or hits[0][1] >= ratio * max(hits[1][1], 1e-9)
+
+
+def reciprocal_rank_fusion(rankings: Iterable[list[int]], rrf_k: int = 60) -> list[tuple[int, float]]:
+    """各ランキングの順位 r から 1 / (rrf_k + r) を合計し、スコアの高い順に並べる。"""
+    scores: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -3,6 +3,9 @@ from app.providers.llm import ChatMessage
 
 MAX_ASSISTANT_CHARACTERS = 150
 
+FALLBACK_ASSISTANT_TEXT = "現在応答を生成できません。時間をおいてもう一度お試しください。"
+EMPTY_INPUT_FALLBACK_TEXT = "応答を生成できませんでした。"
+
 DEFAULT_SYSTEM_PROMPT = (
     "あなたは音声対応の VRM アシスタントです。ユーザーと自然な会話をするように口語で話し、"
     "本文は150文字以内にまとめてください。要点だけを端的に返し、一息で読み上げられる長さを維持します。"
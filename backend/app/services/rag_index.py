@@ -0,0 +1,514 @@
+import itertools
+import json
+import logging
+import os
+import re
+import secrets
+import shutil
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Protocol
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.services.lexical_index import (
+    TOKENIZER_NAME,
+    build_lexical_index,
+    has_lexical_index,
+    search_lexical_index,
+)
+
+logger = logging.getLogger(__name__)
+
+NATIVE_FORMAT_VERSION = 1
+NAMESPACES_DIR = "namespaces"
+_NAMESPACE_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+
+class DummyEmbeddings(Embeddings):
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [[0.0] * 1 for _ in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return [0.0]
+
+
+class RagIndex(Protocol):
+    index: faiss.Index
+    mmapped: bool
+
+    @property
+    def ntotal(self) -> int: ...
+
+    @property
+    def dimension(self) -> int: ...
+
+    @property
+    def version(self) -> str | None: ...
+
+    def search(self, vector: np.ndarray, k: int) -> list[Document]: ...
+
+    def search_ids(self, vectors: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]: ...
+
+    def fetch_map(self, ids: list[int]) -> dict[int, Document]: ...
+
+    def search_lexical(self, query: str, k: int) -> list[tuple[int, float]]: ...
+
+    @property
+    def nbytes(self) -> int: ...
+
+    def close(self) -> None: ...
+
+
+def validate_namespace(namespace: str) -> str:
+    if not _NAMESPACE_PATTERN.fullmatch(namespace):
+        raise ValueError(
+            f"invalid namespace {namespace!r}; use 1-64 letters, digits, '_', '.' or '-' "
+            "starting with a letter or digit"
+        )
+    return namespace
+
+
+def character_namespace(character_id: int) -> str:
+    return f"character-{character_id}"
+
+
+def namespace_index_path(index_path: Path, namespace: str | None) -> Path:
+    """名前空間ごとのインデックスは <dir>/namespaces/<namespace>/<file> に置く。None は既定 (全体共有) のインデックス。"""
+    if namespace is None:
+        return index_path
+    return index_path.parent / NAMESPACES_DIR / validate_namespace(namespace) / index_path.name
+
+
+def list_namespaces(index_path: Path) -> list[str]:
+    """公開済みのインデックスを持つ名前空間の一覧。"""
+    root = index_path.parent / NAMESPACES_DIR
+    if not root.is_dir():
+        return []
+    return sorted(
+        path.name
+        for path in root.iterdir()
+        if path.is_dir()
+        and _NAMESPACE_PATTERN.fullmatch(path.name)
+        and current_version(path, index_path.stem) is not None
+    )
+
+
+def native_paths(index_dir: Path, name: str) -> tuple[Path, Path, Path]:
+    """ネイティブ形式のファイル (FAISS 本体, SQLite 文書ストア, マニフェスト) のパス。"""
+    return (
+        index_dir / f"{name}.index",
+        index_dir / f"{name}.docs.sqlite",
+        index_dir / f"{name}.manifest.json",
+    )
+
+
+def legacy_paths(index_dir: Path, name: str) -> tuple[Path, Path]:
+    return index_dir / f"{name}.faiss", index_dir / f"{name}.pkl"
+
+
+def native_index_exists(index_dir: Path, name: str) -> bool:
+    return all(path.exists() for path in native_paths(index_dir, name))
+
+
+def legacy_index_exists(index_dir: Path, name: str) -> bool:
+    return all(path.exists() for path in legacy_paths(index_dir, name))
+
+
+def _vector_nbytes(index: faiss.Index) -> int:
+    return int(index.ntotal) * int(index.d) * 4
+
+
+def _is_mmapped(index: faiss.Index) -> bool:
+    """IO_FLAG_MMAP が効いたか。faiss 1.8 で mmap されるのは IVF 系の転置リストのみで、
+
+    Flat/HNSW/PQ などはフラグを付けてもベクトルがプロセスのメモリへ読み込まれる。
+    """
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return False
+    return isinstance(faiss.downcast_InvertedLists(ivf.invlists), faiss.OnDiskInvertedLists)
+
+
+class NativeRagIndex:
+    """FAISS インデックスと、ID で遅延取得する SQLite 文書ストア。
+
+    IVF 系は転置リストを mmap で参照し、それ以外の種別はベクトル全体をメモリに読み込む (mmapped で判別)。
+    """
+
+    def __init__(
+        self,
+        index: faiss.Index,
+        docs_path: Path,
+        manifest: dict[str, Any],
+        index_path: Path | None = None,
+    ):
+        self.index = index
+        self.manifest = manifest
+        self.mmapped = _is_mmapped(index)
+        # ファイルの大きさをメモリ使用量の目安にする。メモリに読み込んだ種別ではほぼ実際の使用量、
+        # mmap した IVF ではページキャッシュに載りうる上限 (古いバージョンが消されても変わらない)。
+        self._nbytes = index_path.stat().st_size if index_path is not None else _vector_nbytes(index)
+        # 接続は開いた時点で確立し、古いバージョンが削除されても読み続けられるようにする。
+        self._connection = sqlite3.connect(
+            f"{docs_path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._connection.execute("SELECT count(*) FROM documents").fetchone()
+        self.has_lexical = has_lexical_index(self._connection)
+        # 検索は asyncio.to_thread の任意のスレッドから呼ばれるため、接続の利用を直列化する。
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, index_dir: Path, name: str) -> "NativeRagIndex":
+        index_path, docs_path, manifest_path = native_paths(index_dir, name)
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        try:
+            index = faiss.read_index(str(index_path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as exc:
+            # mmap で読めない種別は通常読み込みにフォールバックする (読めても IVF 以外はメモリに載る)。
+            logger.info("mmap load not supported for %s (%s); reading into memory", index_path, exc)
+            index = faiss.read_index(str(index_path))
+        return cls(index, docs_path, manifest, index_path)
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.index.ntotal)
+
+    @property
+    def dimension(self) -> int:
+        return int(self.index.d)
+
+    @property
+    def version(self) -> str | None:
+        return self.manifest.get("version")
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def search(self, vector: np.ndarray, k: int) -> list[Document]:
+        _, ids = self.search_ids(vector.reshape(1, -1), k)
+        return self.fetch([int(doc_id) for doc_id in ids[0] if doc_id != -1])
+
+    def search_ids(self, vectors: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """(n, d) のクエリ行列を 1 回の FAISS 呼び出しで検索し、(距離, ID) を返す。"""
+        return self.index.search(np.ascontiguousarray(vectors, dtype=np.float32), k)
+
+    def fetch(self, ids: list[int]) -> list[Document]:
+        """FAISS の行 ID に対応する文書を、与えた ID の順番で返す。"""
+        by_id = self.fetch_map(ids)
+        return [by_id[doc_id] for doc_id in ids if doc_id in by_id]
+
+    def fetch_map(self, ids: list[int]) -> dict[int, Document]:
+        if not ids:
+            return {}
+        unique = list(dict.fromkeys(ids))
+        placeholders = ",".join("?" for _ in unique)
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT id, content, metadata FROM documents WHERE id IN ({placeholders})", unique
+            ).fetchall()
+        return {
+            row[0]: Document(page_content=row[1], metadata=json.loads(row[2]) if row[2] else {})
+            for row in rows
+        }
+
+    def search_lexical(self, query: str, k: int) -> list[tuple[int, float]]:
+        """インジェスト時に作った語彙インデックスを BM25 で検索する。無い (古い) バージョンでは空。"""
+        if not self.has_lexical:
+            return []
+        with self._lock:
+            return search_lexical_index(self._connection, query, k)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class LegacyRagIndex:
+    """LangChain の pickle 形式 (index.faiss + index.pkl) を読む互換実装。"""
+
+    def __init__(self, store: FAISS):
+        self.store = store
+        self.index = store.index
+        self.has_lexical = False
+        self.mmapped = False
+
+    @classmethod
+    def open(cls, index_dir: Path, name: str) -> "LegacyRagIndex":
+        store = FAISS.load_local(
+            folder_path=str(index_dir),
+            embeddings=DummyEmbeddings(),
+            index_name=name,
+            allow_dangerous_deserialization=True,
+        )
+        return cls(store)
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.index.ntotal)
+
+    @property
+    def dimension(self) -> int:
+        return int(self.index.d)
+
+    @property
+    def version(self) -> str | None:
+        return None
+
+    @property
+    def nbytes(self) -> int:
+        return _vector_nbytes(self.index)
+
+    def search(self, vector: np.ndarray, k: int) -> list[Document]:
+        return self.store.similarity_search_by_vector(vector, k)
+
+    def search_ids(self, vectors: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        return self.index.search(np.ascontiguousarray(vectors, dtype=np.float32), k)
+
+    def search_lexical(self, query: str, k: int) -> list[tuple[int, float]]:
+        return []
+
+    def fetch_map(self, ids: list[int]) -> dict[int, Document]:
+        documents: dict[int, Document] = {}
+        for row in ids:
+            doc = self.store.docstore.search(self.store.index_to_docstore_id.get(row, ""))
+            if isinstance(doc, Document):
+                documents[row] = doc
+        return documents
+
+    def close(self) -> None:
+        return None
+
+
+def versions_dir(index_dir: Path, name: str) -> Path:
+    return index_dir / f"{name}.versions"
+
+
+def pointer_path(index_dir: Path, name: str) -> Path:
+    return index_dir / f"{name}.current"
+
+
+def current_version(index_dir: Path, name: str) -> str | None:
+    """公開中のバージョン ID を返す。バージョン管理されていない配置なら None。"""
+    try:
+        version = pointer_path(index_dir, name).read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    if not version or not native_index_exists(versions_dir(index_dir, name) / version, name):
+        return None
+    return version
+
+
+def publish_native_index(
+    index: faiss.Index,
+    documents: Iterable[Document],
+    index_dir: Path,
+    name: str,
+    extra_manifest: dict[str, Any] | None = None,
+    keep_versions: int = 3,
+    doc_ids: Iterable[int] | None = None,
+    docstore: Path | None = None,
+) -> str:
+    """新しいバージョンディレクトリに書き出し、ポインタファイルの置き換えで公開する。
+
+    読み込み中のサーバは古いバージョンのファイルを開いたまま検索を続けられる。
+    docstore に書き込み済みの SQLite 文書ストアを渡すと、documents の代わりにそれを移動して使う。
+    """
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + f"-{secrets.token_hex(3)}"
+    root = versions_dir(index_dir, name)
+    staging = root / f".{version}.tmp"
+    write_native_index(
+        index,
+        documents,
+        staging,
+        name,
+        {"version": version, **(extra_manifest or {})},
+        doc_ids,
+        docstore,
+    )
+    os.replace(staging, root / version)
+
+    pointer = pointer_path(index_dir, name)
+    tmp_pointer = pointer.with_name(pointer.name + ".tmp")
+    tmp_pointer.write_text(version + "\n", encoding="utf-8")
+    os.replace(tmp_pointer, pointer)
+    prune_versions(index_dir, name, keep_versions)
+    return version
+
+
+def prune_versions(index_dir: Path, name: str, keep: int) -> list[str]:
+    """公開中を除いた古いバージョンを新しい順に keep 件まで残して削除する。"""
+    root = versions_dir(index_dir, name)
+    if keep <= 0 or not root.is_dir():
+        return []
+    active = current_version(index_dir, name)
+    versions = sorted(
+        (path for path in root.iterdir() if path.is_dir() and not path.name.startswith(".")),
+        key=lambda path: path.name,
+        reverse=True,
+    )
+    removed: list[str] = []
+    for path in versions[keep:]:
+        if path.name == active:
+            continue
+        # Linux では mmap 済みのファイルを消しても開いているプロセスからは読める。
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(path.name)
+    return removed
+
+
+def open_published_for_update(index_dir: Path, name: str) -> tuple[faiss.Index, NativeRagIndex] | None:
+    """公開中バージョンを、書き換え可能なインデックス (メモリ読み込み) と文書参照用に開く。"""
+    version = current_version(index_dir, name)
+    if version is None:
+        return None
+    version_dir = versions_dir(index_dir, name) / version
+    index = faiss.read_index(str(native_paths(version_dir, name)[0]))
+    return index, NativeRagIndex.open(version_dir, name)
+
+
+def open_rag_index(index_dir: Path, name: str) -> RagIndex | None:
+    version = current_version(index_dir, name)
+    if version is not None:
+        return NativeRagIndex.open(versions_dir(index_dir, name) / version, name)
+    if native_index_exists(index_dir, name):
+        return NativeRagIndex.open(index_dir, name)
+    if legacy_index_exists(index_dir, name):
+        logger.warning(
+            "Loading legacy pickle FAISS index from %s; run `python -m app.cli.ingest --migrate` "
+            "to convert it to the native format.",
+            index_dir,
+        )
+        return LegacyRagIndex.open(index_dir, name)
+    return None
+
+
+def write_native_index(
+    index: faiss.Index,
+    documents: Iterable[Document],
+    index_dir: Path,
+    name: str,
+    extra_manifest: dict[str, Any] | None = None,
+    doc_ids: Iterable[int] | None = None,
+    docstore: Path | None = None,
+) -> None:
+    """FAISS 本体と文書ストアを一時ファイルに書き出し、最後にマニフェストを置き換えて公開する。
+
+    doc_ids は FAISS が検索結果として返す ID (IndexIDMap の場合はその ID) と対応させる。
+    省略時は documents の並び順 (0..ntotal-1) を ID とする。
+    """
+    index_dir.mkdir(parents=True, exist_ok=True)
+    index_path, docs_path, manifest_path = native_paths(index_dir, name)
+    tmp_index = index_path.with_name(index_path.name + ".tmp")
+    tmp_docs = docs_path.with_name(docs_path.name + ".tmp")
+    tmp_manifest = manifest_path.with_name(manifest_path.name + ".tmp")
+    tmp_docs.unlink(missing_ok=True)
+
+    faiss.write_index(index, str(tmp_index))
+    if docstore is not None:
+        os.replace(docstore, tmp_docs)
+        count = DocstoreWriter(tmp_docs).count_and_close()
+    else:
+        count = _write_docstore(tmp_docs, documents, doc_ids)
+    if count != index.ntotal:
+        tmp_index.unlink(missing_ok=True)
+        tmp_docs.unlink(missing_ok=True)
+        raise RuntimeError(f"Document count mismatch: index={index.ntotal} documents={count}")
+    lexical_count = build_lexical_index(tmp_docs)
+
+    manifest = {
+        "format_version": NATIVE_FORMAT_VERSION,
+        "dimension": int(index.d),
+        "ntotal": int(index.ntotal),
+        "metric": "l2" if index.metric_type == faiss.METRIC_L2 else "inner_product",
+        "lexical": (
+            {"tokenizer": TOKENIZER_NAME, "documents": lexical_count} if lexical_count is not None else None
+        ),
+        **(extra_manifest or {}),
+    }
+    tmp_manifest.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp_index, index_path)
+    os.replace(tmp_docs, docs_path)
+    os.replace(tmp_manifest, manifest_path)
+
+
+class DocstoreWriter:
+    """SQLite 文書ストアへ ID 付きで追記する。インジェスト途中の一時ストアとしても使う。"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS documents "
+            "(id INTEGER PRIMARY KEY, content TEXT NOT NULL, metadata TEXT)"
+        )
+
+    def add(self, ids: Iterable[int], documents: Iterable[Document]) -> int:
+        count = 0
+
+        def _rows() -> Iterable[tuple[int, str, str]]:
+            nonlocal count
+            for doc_id, doc in zip(ids, documents):
+                yield int(doc_id), doc.page_content, json.dumps(doc.metadata or {}, ensure_ascii=False)
+                count += 1
+
+        self._connection.executemany("INSERT INTO documents VALUES (?, ?, ?)", _rows())
+        return count
+
+    def iter_contents(self, batch_size: int = 1000) -> Iterator[tuple[int, str]]:
+        cursor = self._connection.execute("SELECT id, content FROM documents ORDER BY id")
+        while rows := cursor.fetchmany(batch_size):
+            yield from rows
+
+    def delete_from(self, first_id: int) -> None:
+        self._connection.execute("DELETE FROM documents WHERE id >= ?", (first_id,))
+
+    def count(self) -> int:
+        return int(self._connection.execute("SELECT count(*) FROM documents").fetchone()[0])
+
+    def commit(self) -> None:
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.commit()
+        self._connection.close()
+
+    def count_and_close(self) -> int:
+        try:
+            return self.count()
+        finally:
+            self.close()
+
+
+def _write_docstore(
+    path: Path, documents: Iterable[Document], doc_ids: Iterable[int] | None = None
+) -> int:
+    writer = DocstoreWriter(path)
+    try:
+        return writer.add(doc_ids if doc_ids is not None else itertools.count(), documents)
+    finally:
+        writer.close()
+
+
+def migrate_legacy_index(index_dir: Path, name: str) -> tuple[str, int]:
+    """pickle 形式のインデックスを新バージョンとして公開し、(バージョン, 文書数) を返す。元ファイルは残す。"""
+    legacy = LegacyRagIndex.open(index_dir, name)
+    store = legacy.store
+    documents = []
+    for row in range(legacy.ntotal):
+        doc = store.docstore.search(store.index_to_docstore_id[row])
+        if not isinstance(doc, Document):
+            raise RuntimeError(f"Docstore entry missing for FAISS row {row}")
+        documents.append(doc)
+    version = publish_native_index(
+        legacy.index, documents, index_dir, name, {"migrated_from": "langchain-pickle"}
+    )
+    return version, len(documents)
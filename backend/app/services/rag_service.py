@@ -1,24 +1,68 @@
 import asyncio
 import logging
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, replace
 from pathlib import Path
 from typing import Optional
 
-from langchain_community.vectorstores import FAISS
+import numpy as np
 from langchain_core.documents import Document
-from langchain_core.embeddings import Embeddings
 
 from app.core.providers import RagConfig
 from app.providers.embedding import EmbeddingClient
+from app.services.ann_index import apply_search_params, parse_search_params
+from app.services.context_packer import PackedContext, format_context, pack_context
+from app.services.lexical_index import is_decisive, reciprocal_rank_fusion
+from app.services.retrieval_gate import RetrievalGate
+from app.services.rag_index import (
+    RagIndex,
+    character_namespace,
+    current_version,
+    list_namespaces,
+    namespace_index_path,
+    open_rag_index,
+    validate_namespace,
+)
 
 logger = logging.getLogger(__name__)
 
 
-class DummyEmbeddings(Embeddings):
-    def embed_documents(self, texts: list[str]) -> list[list[float]]:
-        return [[0.0] * 1 for _ in texts]
+@dataclass
+class RagSearchResult:
+    documents: list[Document]
+    query_vector: np.ndarray | None = None
+    embedding_fallback: bool = False
+    # documents と同じ順の L2 距離。ハイブリッド検索で語彙検索だけに当たった文書は None。
+    distances: list[float | None] | None = None
+    # RRF で統合する前のベクトル検索 1 位の L2 距離 (ベクトル検索をしなかった場合は None)。
+    top_distance: float | None = None
+    namespace: str | None = None
+    generation: int = 0
+    mode: str = "vector"
+    skipped_reason: str | None = None
 
-    def embed_query(self, text: str) -> list[float]:
-        return [0.0]
+
+@dataclass
+class RagBatchSearchResult:
+    """クエリごとの (文書, L2 距離) の一覧とステージ別の所要時間 (ms)。"""
+
+    results: list[list[tuple[Document, float]]]
+    timings_ms: dict[str, float]
+    index_version: str | None = None
+    embedding_fallback: bool = False
+    namespace: str | None = None
+
+
+@dataclass
+class _LoadedIndex:
+    """読み込み済みのインデックス。generation は読み込みごとに全体で一意に増える番号。"""
+
+    namespace: str | None
+    store: RagIndex
+    search_params: dict[str, float]
+    loaded_at: float
+    generation: int
 
 
 class RagService:
@@ -29,11 +73,24 @@ class RagService:
     ):
         self._config = rag_config
         self._embedding_client = embedding_client
-        self._vector_store: Optional[FAISS] = None
         self._index_path = Path(rag_config.index_path)
         self._index_dir = self._index_path.parent
         self._index_name = self._index_path.stem
         self._loaded = False
+        self._index_version = 0
+        self._default: _LoadedIndex | None = None
+        # 名前空間のインデックスは初回利用時に読み込み、LRU 順に保持する (末尾が直近)。
+        self._namespaces: OrderedDict[str, _LoadedIndex] = OrderedDict()
+        # 公開版が無かった名前空間。会話ターンごとにファイルを確認しないよう、監視の周期か再読み込みまで覚えておく。
+        self._missing_namespaces: set[str] = set()
+        self._load_locks: dict[str | None, asyncio.Lock] = {}
+        self._watch_task: asyncio.Task[None] | None = None
+        self._mode_counts: Counter[str] = Counter()
+        self._gate = RetrievalGate(
+            enabled=rag_config.gate_enabled,
+            min_chars=rag_config.gate_min_chars,
+            extra_small_talk=rag_config.gate_small_talk,
+        )
         logger.info(
             "RAG service configured: provider=%s, index=%s",
             rag_config.provider,
@@ -41,40 +98,323 @@ class RagService:
         )
 
     async def load(self) -> None:
-        self._loaded = False
-        faiss_file = self._index_dir / f"{self._index_name}.faiss"
-        store_file = self._index_dir / f"{self._index_name}.pkl"
-        if not faiss_file.exists() or not store_file.exists():
-            logger.info("FAISS index not found at %s. Skipping load.", faiss_file)
+        await self.reload(force=True)
+
+    def _paths(self, namespace: str | None) -> tuple[Path, str]:
+        path = namespace_index_path(self._index_path, namespace)
+        return path.parent, path.stem
+
+    def _slot(self, namespace: str | None) -> _LoadedIndex | None:
+        return self._default if namespace is None else self._namespaces.get(namespace)
+
+    async def reload(self, force: bool = False, namespace: str | None = None) -> bool:
+        """公開中のバージョンが変わっていれば裏で読み込み、参照を差し替える。差し替えたら True。
+
+        検索は開始時点のインデックス参照を保持するため、実行中の検索は旧インデックスで完了する。
+        """
+        if namespace is not None:
+            validate_namespace(namespace)
+        index_dir, name = self._paths(namespace)
+        async with self._load_locks.setdefault(namespace, asyncio.Lock()):
+            published = await asyncio.to_thread(current_version, index_dir, name)
+            loaded = self._slot(namespace)
+            if not force and loaded is not None and published == loaded.store.version:
+                return False
+
+            start = time.monotonic()
+            store = await asyncio.to_thread(open_rag_index, index_dir, name)
+            if store is None:
+                if loaded is None and namespace is None:
+                    logger.info("FAISS index not found under %s. Skipping load.", index_dir)
+                if loaded is None and namespace is not None:
+                    self._missing_namespaces.add(namespace)
+                return False
+
+            search_params = self._apply_search_params(store)
+            self._index_version += 1
+            slot = _LoadedIndex(
+                namespace=namespace,
+                store=store,
+                search_params=search_params,
+                loaded_at=time.time(),
+                generation=self._index_version,
+            )
+            # 旧インデックスは close せず、参照が外れた時点で解放させる (実行中の検索を壊さない)。
+            if namespace is None:
+                self._default = slot
+                self._loaded = True
+            else:
+                self._namespaces[namespace] = slot
+                self._namespaces.move_to_end(namespace)
+                self._missing_namespaces.discard(namespace)
+            logger.info(
+                "Loaded FAISS index from %s (%s, namespace=%s, version=%s, type=%s, search_params=%s, "
+                "%d vectors, %.1f MB %s, %.1f ms)",
+                index_dir,
+                type(store).__name__,
+                namespace or "-",
+                store.version,
+                self._index_type(store),
+                search_params,
+                store.ntotal,
+                store.nbytes / 1024 / 1024,
+                "mmapped" if getattr(store, "mmapped", False) else "in memory",
+                (time.monotonic() - start) * 1000,
+            )
+            if namespace is not None:
+                self._evict_namespaces()
+            return True
+
+    def _evict_namespaces(self) -> None:
+        """名前空間インデックスの合計サイズが上限を超えたら、最も長く使われていないものから外す。直近の 1 件は残す。"""
+        limit = self._config.namespace_cache_mb * 1024 * 1024
+        total = sum(slot.store.nbytes for slot in self._namespaces.values())
+        while total > limit and len(self._namespaces) > 1:
+            namespace, slot = self._namespaces.popitem(last=False)
+            total -= slot.store.nbytes
+            logger.info(
+                "Evicted RAG namespace %s (%.1f MB); %d namespaces, %.1f MB resident",
+                namespace,
+                slot.store.nbytes / 1024 / 1024,
+                len(self._namespaces),
+                total / 1024 / 1024,
+            )
+
+    async def _acquire(self, namespace: str | None) -> _LoadedIndex | None:
+        if namespace is None:
+            return self._default
+        if namespace not in self._namespaces and namespace not in self._missing_namespaces:
+            await self.reload(namespace=namespace)
+        slot = self._namespaces.get(namespace)
+        if slot is not None:
+            self._namespaces.move_to_end(namespace)
+        return slot
+
+    async def _select(self, namespace: str | None, character_id: int | None) -> _LoadedIndex | None:
+        """明示した名前空間、キャラクターの名前空間 (無ければ既定)、既定のインデックスの順に選ぶ。"""
+        if namespace is not None:
+            return await self._acquire(namespace)
+        if character_id is not None:
+            slot = await self._acquire(character_namespace(character_id))
+            if slot is not None:
+                return slot
+        return self._default
+
+    def _apply_search_params(self, store: RagIndex) -> dict[str, float]:
+        """マニフェストに保存された検索時パラメータを適用し、設定 (search_params) があれば上書きする。"""
+        manifest = getattr(store, "manifest", None) or {}
+        params = dict((manifest.get("ann") or {}).get("search_params") or {})
+        if self._config.search_params:
+            params.update(parse_search_params(self._config.search_params))
+        return apply_search_params(store.index, params) if params else {}
+
+    @staticmethod
+    def _index_type(store: RagIndex) -> str:
+        manifest = getattr(store, "manifest", None) or {}
+        return (manifest.get("ann") or {}).get("spec") or "flat"
+
+    def start_watching(self) -> None:
+        interval = self._config.reload_interval_sec
+        if interval <= 0 or self._watch_task is not None:
             return
+        self._watch_task = asyncio.create_task(self._watch(interval))
+
+    async def stop_watching(self) -> None:
+        task, self._watch_task = self._watch_task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _watch(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            # 未公開だった名前空間は次の利用時に 1 回だけ確認し直す。
+            self._missing_namespaces.clear()
+            # 読み込み済みの名前空間だけを確認し、追い出されたものは次の利用時に読み込む。
+            for namespace in [None, *self._namespaces]:
+                if namespace is not None and namespace not in self._namespaces:
+                    continue
+                try:
+                    await self.reload(namespace=namespace)
+                except Exception as exc:  # noqa: BLE001
+                    logger.warning(
+                        "RAG index reload failed (namespace=%s); keeping the current index: %s",
+                        namespace or "-",
+                        exc,
+                    )
+
+    def status(self, namespace: str | None = None) -> dict[str, object]:
+        if namespace is not None:
+            validate_namespace(namespace)
+        slot = self._slot(namespace)
+        store = slot.store if slot is not None else None
+        return {
+            "namespace": namespace,
+            "loaded": store is not None,
+            "version": store.version if store is not None else None,
+            "published_version": current_version(*self._paths(namespace)),
+            "format": type(store).__name__ if store is not None else None,
+            "vectors": store.ntotal if store is not None else 0,
+            "dimension": store.dimension if store is not None else None,
+            "index_type": self._index_type(store) if store is not None else None,
+            "search_params": slot.search_params if slot is not None else {},
+            "loaded_at": slot.loaded_at if slot is not None else None,
+            "generation": slot.generation if slot is not None else 0,
+            "lexical_index": bool(getattr(store, "has_lexical", False)),
+            "mmapped": bool(getattr(store, "mmapped", False)),
+            "search_modes": dict(self._mode_counts),
+            "gate": self._gate.stats(),
+        }
 
-        self._vector_store = FAISS.load_local(
-            folder_path=str(self._index_dir),
-            embeddings=DummyEmbeddings(),
-            index_name=self._index_name,
-            allow_dangerous_deserialization=True,
+    def namespaces_status(self) -> dict[str, object]:
+        loaded = [self.status(namespace) for namespace in reversed(self._namespaces)]
+        resident = sum(slot.store.nbytes for slot in self._namespaces.values())
+        return {
+            "published": list_namespaces(self._index_path),
+            "loaded": loaded,
+            "resident_mb": round(resident / 1024 / 1024, 3),
+            "cache_limit_mb": self._config.namespace_cache_mb,
+        }
+
+    async def search(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        namespace: str | None = None,
+        character_id: int | None = None,
+    ) -> list[Document]:
+        result = await self.search_detailed(
+            query, top_k=top_k, namespace=namespace, character_id=character_id
         )
-        self._loaded = True
-        logger.info("Loaded FAISS index from %s", faiss_file)
+        return result.documents
 
-    async def search(self, query: str, top_k: Optional[int] = None) -> list[Document]:
-        if not query.strip():
-            return []
-        if self._vector_store is None:
-            logger.info("Vector store is not loaded. Returning empty search result.")
-            return []
+    async def search_detailed(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        require_vector: bool = False,
+        namespace: str | None = None,
+        character_id: int | None = None,
+        gate: bool = False,
+    ) -> RagSearchResult:
+        """検索結果とクエリ埋め込みを返す。require_vector ならインデックス未ロードでも埋め込む。
+
+        namespace を指定するとその名前空間だけを検索し、character_id はキャラクター用の名前空間
+        (character-<id>) があればそれを、無ければ既定のインデックスを使う。
+        gate=True (会話ターン) では挨拶・短い発話の検索を省き、上位の距離が遠すぎる結果も使わない。
+        """
+        if not gate or not query.strip():
+            return await self._search(query, top_k, require_vector, namespace, character_id)
+
+        decision = self._gate.decide(query)
+        if not decision.retrieve:
+            self._gate.record_skip(decision.reason, saved_retrieval=not require_vector)
+            logger.info("RAG retrieval skipped (%s) for %r", decision.reason, query[:40])
+            query_vector, fallback_used = (
+                await self._embed_query(query) if require_vector else (None, False)
+            )
+            # 検索した場合と同じ名前空間・世代を返し、応答キャッシュのスコープと世代を揃える。
+            slot = await self._select(namespace, character_id)
+            return RagSearchResult(
+                documents=[],
+                query_vector=query_vector,
+                embedding_fallback=fallback_used,
+                namespace=slot.namespace if slot is not None else namespace,
+                generation=slot.generation if slot is not None else 0,
+                skipped_reason=decision.reason,
+            )
+
+        started = time.perf_counter()
+        result = await self._search(query, top_k, require_vector, namespace, character_id)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        max_distance = self._config.gate_max_distance
+        top_distance = result.top_distance
+        if max_distance > 0 and top_distance is not None and top_distance > max_distance:
+            # ベクトル検索で最も近い文書でも遠い場合は、語彙検索の一致があってもコンテキストは回答の助けにならない。
+            # 検索はしたので、省けたのはプロンプトのみとして 1 回だけ数える。
+            self._gate.record_skip("low_similarity", saved_retrieval=False, elapsed_ms=elapsed_ms)
+            logger.info(
+                "RAG context dropped: top-1 distance %.4f > %.4f", top_distance, max_distance
+            )
+            return replace(result, documents=[], distances=[], skipped_reason="low_similarity")
+        self._gate.record_retrieval(elapsed_ms)
+        return result
 
+    async def _embed_query(self, query: str) -> tuple[np.ndarray | None, bool]:
         fallback_before = getattr(self._embedding_client, "fallback_count", 0)
         vectors = await self._embedding_client.aembed([query])
         fallback_used = getattr(self._embedding_client, "fallback_count", 0) > fallback_before
-        if not vectors:
+        return (vectors[0] if len(vectors) else None), fallback_used
+
+    async def _search(
+        self,
+        query: str,
+        top_k: Optional[int],
+        require_vector: bool,
+        namespace: str | None,
+        character_id: int | None,
+    ) -> RagSearchResult:
+        if not query.strip():
+            return RagSearchResult(documents=[])
+        # ホットリロードで差し替わっても、この検索は取得した時点のインデックスで完結させる。
+        slot = await self._select(namespace, character_id)
+        if slot is None and not require_vector:
+            logger.info("Vector store is not loaded. Returning empty search result.")
+            return RagSearchResult(documents=[], namespace=namespace)
+
+        k = top_k or self._config.top_k
+        lexical_hits: list[tuple[int, float]] = []
+        documents: dict[int, Document] = {}
+        if slot is not None and self._config.hybrid_search and getattr(slot.store, "has_lexical", False):
+            store = slot.store
+            lexical_hits = await asyncio.to_thread(
+                store.search_lexical, query, max(k, self._config.hybrid_candidates)
+            )
+            if lexical_hits and not require_vector:
+                documents = await asyncio.to_thread(
+                    store.fetch_map, [doc_id for doc_id, _ in lexical_hits[:k]]
+                )
+                top = documents.get(lexical_hits[0][0])
+                if top is not None and is_decisive(
+                    query, lexical_hits, top.page_content, self._config.lexical_fast_path_ratio
+                ):
+                    # 固有名詞やコードが 1 文書に確定する場合は埋め込みとベクトル検索を省く。
+                    self._mode_counts["lexical"] += 1
+                    return RagSearchResult(
+                        documents=[
+                            documents[doc_id] for doc_id, _ in lexical_hits[:k] if doc_id in documents
+                        ],
+                        namespace=slot.namespace,
+                        generation=slot.generation,
+                        mode="lexical",
+                    )
+
+        query_vector, fallback_used = await self._embed_query(query)
+        if query_vector is None:
             logger.warning(
                 "Embedding returned no vectors for RAG search.",
                 extra={"fallback_used": fallback_used},
             )
-            return []
-        query_vector = vectors[0]
-        index_dim = getattr(getattr(self._vector_store, "index", None), "d", None)
+            return RagSearchResult(
+                documents=[],
+                embedding_fallback=fallback_used,
+                namespace=slot.namespace if slot is not None else namespace,
+                generation=slot.generation if slot is not None else 0,
+            )
+        if slot is None:
+            logger.info("Vector store is not loaded. Returning empty search result.")
+            return RagSearchResult(
+                documents=[],
+                query_vector=query_vector,
+                embedding_fallback=fallback_used,
+                namespace=namespace,
+            )
+        store = slot.store
+        index_dim = store.dimension
         provider_name = getattr(getattr(self._embedding_client, "config", None), "provider", None)
         if index_dim is not None and len(query_vector) != index_dim:
             logger.error(
@@ -87,20 +427,138 @@ class RagService:
             raise ValueError(
                 f"embedding dimension mismatch (query={len(query_vector)}, index={index_dim})"
             )
+        candidates = max(k, self._config.hybrid_candidates) if lexical_hits else k
+        distances, ids = await asyncio.to_thread(
+            store.search_ids, query_vector.reshape(1, -1), candidates
+        )
+        hits = [
+            (int(doc_id), float(distance))
+            for doc_id, distance in zip(ids[0], distances[0])
+            if doc_id != -1
+        ]
+        vector_distances = dict(hits)
+        if lexical_hits:
+            # ベクトルと語彙の順位を RRF で統合する。距離はベクトル側で見つかった文書にだけ残す。
+            fused = reciprocal_rank_fusion(
+                [[doc_id for doc_id, _ in hits], [doc_id for doc_id, _ in lexical_hits]],
+                self._config.rrf_k,
+            )
+            hits = [(doc_id, score) for doc_id, score in fused[:k]]
+        missing = [doc_id for doc_id, _ in hits if doc_id not in documents]
+        if missing:
+            documents.update(await asyncio.to_thread(store.fetch_map, missing))
+        hit_ids = [doc_id for doc_id, _ in hits if doc_id in documents]
+        mode = "hybrid" if lexical_hits else "vector"
+        self._mode_counts[mode] += 1
+        return RagSearchResult(
+            documents=[documents[doc_id] for doc_id in hit_ids],
+            query_vector=query_vector,
+            embedding_fallback=fallback_used,
+            distances=[vector_distances.get(doc_id) for doc_id in hit_ids],
+            top_distance=min(vector_distances.values(), default=None),
+            namespace=slot.namespace,
+            generation=slot.generation,
+            mode=mode,
+        )
+
+    async def search_many(
+        self, queries: list[str], top_k: Optional[int] = None, namespace: str | None = None
+    ) -> RagBatchSearchResult:
+        """全クエリを 1 回のバッチ埋め込みと 1 回の FAISS 行列検索で処理する。空のクエリは空の結果になる。"""
+        started = time.perf_counter()
+        timings = {"embed_ms": 0.0, "search_ms": 0.0, "fetch_ms": 0.0}
+        results: list[list[tuple[Document, float]]] = [[] for _ in queries]
+        positions = [index for index, query in enumerate(queries) if query.strip()]
+        slot = await self._acquire(namespace)
+        if slot is None or not positions:
+            if slot is None:
+                logger.info("Vector store is not loaded. Returning empty batch search result.")
+            timings["total_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            return RagBatchSearchResult(results=results, timings_ms=timings, namespace=namespace)
+        store = slot.store
+
+        fallback_before = getattr(self._embedding_client, "fallback_count", 0)
+        stage = time.perf_counter()
+        vectors = await self._embedding_client.aembed([queries[index] for index in positions])
+        timings["embed_ms"] = round((time.perf_counter() - stage) * 1000, 3)
+        fallback_used = getattr(self._embedding_client, "fallback_count", 0) > fallback_before
+        if len(vectors) != len(positions):
+            raise ValueError(f"expected {len(positions)} query embeddings, got {len(vectors)}")
+        if vectors.shape[1] != store.dimension:
+            raise ValueError(
+                f"embedding dimension mismatch (query={vectors.shape[1]}, index={store.dimension})"
+            )
+
         k = top_k or self._config.top_k
-        results = await asyncio.to_thread(
-            self._vector_store.similarity_search_by_vector, query_vector, k
+        stage = time.perf_counter()
+        distances, ids = await asyncio.to_thread(store.search_ids, vectors, k)
+        timings["search_ms"] = round((time.perf_counter() - stage) * 1000, 3)
+
+        stage = time.perf_counter()
+        # 複数クエリで重複する文書も 1 回の問い合わせでまとめて取得する。
+        documents = await asyncio.to_thread(
+            store.fetch_map, [int(doc_id) for doc_id in np.unique(ids) if doc_id != -1]
+        )
+        timings["fetch_ms"] = round((time.perf_counter() - stage) * 1000, 3)
+        for position, row_ids, row_distances in zip(positions, ids, distances):
+            results[position] = [
+                (documents[int(doc_id)], float(distance))
+                for doc_id, distance in zip(row_ids, row_distances)
+                if int(doc_id) in documents
+            ]
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return RagBatchSearchResult(
+            results=results,
+            timings_ms=timings,
+            index_version=store.version,
+            embedding_fallback=fallback_used,
+            namespace=namespace,
         )
-        return results
+
+    async def warmup(self) -> int:
+        """ゼロベクトルで 1 回検索してインデックスをページインさせ、件数を返す。"""
+        if self._default is None:
+            return 0
+        index = self._default.store.index
+        query = np.zeros((1, index.d), dtype=np.float32)
+        await asyncio.to_thread(index.search, query, min(self._config.top_k, max(index.ntotal, 1)))
+        return int(index.ntotal)
 
     def context_as_text(self, docs: list[Document]) -> str:
-        parts: list[str] = []
-        for idx, doc in enumerate(docs, start=1):
-            meta = doc.metadata or {}
-            source = meta.get("source") or "unknown"
-            parts.append(f"[{idx}] ({source}) {doc.page_content}")
-        return "\n\n".join(parts)
+        return format_context(docs)
+
+    def build_context(self, query: str, result: RagSearchResult) -> PackedContext:
+        """検索結果から重複を除き、トークン予算内に詰めたコンテキストを作る。削減できたトークン数を記録する。"""
+        packed = pack_context(
+            query,
+            result.documents,
+            distances=result.distances,
+            token_budget=self._config.context_token_budget,
+            mmr_lambda=self._config.context_mmr_lambda,
+            duplicate_threshold=self._config.context_duplicate_threshold,
+        )
+        if result.documents:
+            logger.info(
+                "RAG context packed: %d -> %d prompt tokens (saved %d; docs %d -> %d, duplicates=%d, trimmed=%d)",
+                packed.original_tokens,
+                packed.tokens,
+                packed.tokens_saved,
+                len(result.documents),
+                len(packed.documents),
+                packed.duplicates_removed,
+                packed.passages_trimmed,
+            )
+        return packed
+
+    @property
+    def top_k(self) -> int:
+        return self._config.top_k
 
     @property
     def is_loaded(self) -> bool:
         return self._loaded
+
+    @property
+    def index_version(self) -> int:
+        """既定インデックスの generation。名前空間を使う検索は RagSearchResult.generation を参照する。"""
+        return self._default.generation if self._default is not None else 0
@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import count
+from typing import Any
+
+import numpy as np
+
+from app.core.providers import ResponseCacheConfig
+from app.db.models import CharacterProfile
+from app.services.prompt_builder import build_system_prompt
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedResponse:
+    entry_id: int
+    assistant_text: str
+    used_context: str
+    audio_chunks: list[bytes] | None
+    similarity: float
+
+
+@dataclass
+class _CacheEntry:
+    scope: str
+    index_version: int
+    vector: np.ndarray
+    assistant_text: str
+    used_context: str
+    created_at: float
+    llm_latency_ms: float = 0.0
+    audio_chunks: list[bytes] | None = None
+    hits: int = 0
+
+
+@dataclass
+class _CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+    llm_latency_saved_ms: float = 0.0
+
+
+def build_cache_scope(
+    character: CharacterProfile | None, system_prompt: str | None, namespace: str | None = None
+) -> str:
+    """キャラクター・実効システムプロンプト・検索した RAG 名前空間からキャッシュのスコープキーを作る。"""
+    character_id = character.id if character else "-"
+    prompt_text = build_system_prompt(character, system_prompt)
+    digest = hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()[:16]
+    return f"{character_id}:{namespace or '-'}:{digest}"
+
+
+class SemanticResponseCache:
+    """クエリ埋め込みの類似度で応答テキストと TTS 音声を再利用するキャッシュ。"""
+
+    def __init__(self, config: ResponseCacheConfig):
+        self.config = config
+        self._entries: OrderedDict[int, _CacheEntry] = OrderedDict()
+        self._ids = count(1)
+        self._stats = _CacheStats()
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.enabled
+
+    def lookup(
+        self, vector: np.ndarray | None, scope: str, index_version: int
+    ) -> CachedResponse | None:
+        if not self.enabled or vector is None:
+            return None
+        query = self._normalize(vector)
+        if query is None:
+            self._stats.misses += 1
+            return None
+
+        now = time.monotonic()
+        best_id: int | None = None
+        best_score = -1.0
+        for entry_id, entry in list(self._entries.items()):
+            if now - entry.created_at > self.config.ttl_sec:
+                del self._entries[entry_id]
+                self._stats.expirations += 1
+                continue
+            if entry.scope != scope:
+                continue
+            if entry.index_version != index_version:
+                # 同じスコープ (= 同じ名前空間) のインデックスが差し替わったエントリは文脈が古いので破棄する。
+                # index_version は名前空間ごとの世代なので、他のスコープのエントリとは比較しない。
+                del self._entries[entry_id]
+                self._stats.invalidations += 1
+                continue
+            if entry.vector.shape != query.shape:
+                continue
+            score = float(np.dot(entry.vector, query))
+            if score > best_score:
+                best_id, best_score = entry_id, score
+
+        if best_id is None or best_score < self.config.similarity_threshold:
+            self._stats.misses += 1
+            return None
+
+        entry = self._entries[best_id]
+        self._entries.move_to_end(best_id)
+        entry.hits += 1
+        self._stats.hits += 1
+        self._stats.llm_latency_saved_ms += entry.llm_latency_ms
+        return CachedResponse(
+            entry_id=best_id,
+            assistant_text=entry.assistant_text,
+            used_context=entry.used_context,
+            audio_chunks=list(entry.audio_chunks) if entry.audio_chunks else None,
+            similarity=best_score,
+        )
+
+    def store(
+        self,
+        vector: np.ndarray | None,
+        scope: str,
+        index_version: int,
+        assistant_text: str,
+        used_context: str,
+        llm_latency_ms: float = 0.0,
+    ) -> int | None:
+        if not self.enabled or vector is None or not assistant_text.strip():
+            return None
+        normalized = self._normalize(vector)
+        if normalized is None:
+            return None
+        entry_id = next(self._ids)
+        self._entries[entry_id] = _CacheEntry(
+            scope=scope,
+            index_version=index_version,
+            vector=normalized,
+            assistant_text=assistant_text,
+            used_context=used_context,
+            created_at=time.monotonic(),
+            llm_latency_ms=max(0.0, llm_latency_ms),
+        )
+        self._stats.stores += 1
+        while len(self._entries) > self.config.max_entries:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+        return entry_id
+
+    def attach_audio(self, entry_id: int | None, audio_chunks: list[bytes]) -> None:
+        if entry_id is None or not audio_chunks:
+            return
+        entry = self._entries.get(entry_id)
+        if entry is not None:
+            entry.audio_chunks = list(audio_chunks)
+
+    def invalidate(self, reason: str) -> None:
+        if not self._entries:
+            return
+        removed = len(self._entries)
+        self._entries.clear()
+        self._stats.invalidations += removed
+        logger.info("Response cache invalidated: reason=%s entries=%s", reason, removed)
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self._stats.hits + self._stats.misses
+        audio_bytes = sum(
+            sum(len(chunk) for chunk in entry.audio_chunks or []) for entry in self._entries.values()
+        )
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "audio_bytes": audio_bytes,
+            "hits": self._stats.hits,
+            "misses": self._stats.misses,
+            "hit_rate": round(self._stats.hits / lookups, 4) if lookups else 0.0,
+            "stores": self._stats.stores,
+            "evictions": self._stats.evictions,
+            "expirations": self._stats.expirations,
+            "invalidations": self._stats.invalidations,
+            "llm_latency_saved_ms": round(self._stats.llm_latency_saved_ms, 1),
+        }
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray | None:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(array))
+        if array.ndim != 1 or norm == 0.0:
+            return None
+        return array / norm
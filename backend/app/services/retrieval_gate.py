@@ -0,0 +1,135 @@
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any
+
+# 検索しても答えに寄与しない挨拶・相づち。句読点・空白・記号を除いた NFKC 小文字で照合する。
+DEFAULT_SMALL_TALK = frozenset(
+    {
+        "こんにちは",
+        "こんばんは",
+        "おはよう",
+        "おはようございます",
+        "ありがとう",
+        "ありがとうございます",
+        "ありがとうございました",
+        "どうも",
+        "どうもありがとう",
+        "はい",
+        "いいえ",
+        "うん",
+        "ううん",
+        "ええ",
+        "そうだね",
+        "そうですね",
+        "なるほど",
+        "すごい",
+        "よろしく",
+        "よろしくお願いします",
+        "おやすみ",
+        "おやすみなさい",
+        "さようなら",
+        "またね",
+        "バイバイ",
+        "ただいま",
+        "おかえり",
+        "hello",
+        "hi",
+        "hey",
+        "thanks",
+        "thankyou",
+        "ok",
+        "okay",
+        "yes",
+        "no",
+        "bye",
+        "goodbye",
+        "goodnight",
+    }
+)
+_NOISE = re.compile(r"[\s\W_〜~]+")
+# 漢字・カタカナは 1 文字で語の情報を多く持つため、ひらがな・英字の 2 文字分と数える。
+_DENSE = re.compile(r"[々〆㐀-䶿一-鿿豈-﫿ァ-ヺ]")
+# 数字や大文字の略語 (型番・コード) を含む発話は短くても語彙検索で引ける。
+_CODE = re.compile(r"\d|[A-Z]{2,}")
+_EMA_WEIGHT = 0.1
+
+
+def normalize_utterance(text: str) -> str:
+    return _NOISE.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def utterance_weight(normalized: str) -> int:
+    """短い発話の判定に使う長さ。漢字・カタカナは 2、それ以外は 1 として数える。"""
+    return len(normalized) + len(_DENSE.findall(normalized))
+
+
+@dataclass
+class GateDecision:
+    retrieve: bool
+    reason: str
+
+
+class RetrievalGate:
+    """埋め込み前に検索の要否を判定する。挨拶・相づちと短すぎる発話は検索しない。
+
+    省けた時間は、検索を省いた回数 × 実際に検索したときの所要時間の移動平均で見積もる。
+    """
+
+    def __init__(self, enabled: bool = True, min_chars: int = 4, extra_small_talk: str = ""):
+        self.enabled = enabled
+        self.min_chars = min_chars
+        self.small_talk = DEFAULT_SMALL_TALK | {
+            normalize_utterance(phrase) for phrase in extra_small_talk.split(",") if phrase.strip()
+        }
+        self._counts: Counter[str] = Counter()
+        self._avg_retrieval_ms: float | None = None
+        self._saved_retrievals = 0
+
+    def decide(self, query: str) -> GateDecision:
+        if not self.enabled:
+            return GateDecision(retrieve=True, reason="disabled")
+        normalized = normalize_utterance(query)
+        if normalized in self.small_talk:
+            return GateDecision(retrieve=False, reason="small_talk")
+        if _CODE.search(unicodedata.normalize("NFKC", query)):
+            return GateDecision(retrieve=True, reason="code")
+        if utterance_weight(normalized) < self.min_chars:
+            return GateDecision(retrieve=False, reason="short_utterance")
+        return GateDecision(retrieve=True, reason="query")
+
+    def record_retrieval(self, elapsed_ms: float) -> None:
+        self._counts["retrieved"] += 1
+        self._observe_latency(elapsed_ms)
+
+    def record_skip(self, reason: str, saved_retrieval: bool = True, elapsed_ms: float | None = None) -> None:
+        """saved_retrieval が False (検索後に結果を捨てた) の場合は、省けたのはプロンプトのみ。
+
+        検索してから捨てた場合は elapsed_ms を渡すと所要時間の平均にだけ反映する (検索回数には数えない)。
+        """
+        self._counts[f"skipped:{reason}"] += 1
+        if saved_retrieval:
+            self._saved_retrievals += 1
+        if elapsed_ms is not None:
+            self._observe_latency(elapsed_ms)
+
+    def _observe_latency(self, elapsed_ms: float) -> None:
+        if self._avg_retrieval_ms is None:
+            self._avg_retrieval_ms = elapsed_ms
+        else:
+            self._avg_retrieval_ms += _EMA_WEIGHT * (elapsed_ms - self._avg_retrieval_ms)
+
+    def stats(self) -> dict[str, Any]:
+        skipped = {
+            key.split(":", 1)[1]: count for key, count in self._counts.items() if key.startswith("skipped:")
+        }
+        total = self._counts["retrieved"] + sum(skipped.values())
+        return {
+            "enabled": self.enabled,
+            "retrieved": self._counts["retrieved"],
+            "skipped": skipped,
+            "skip_rate": round(sum(skipped.values()) / total, 4) if total else 0.0,
+            "avg_retrieval_ms": round(self._avg_retrieval_ms, 3) if self._avg_retrieval_ms is not None else None,
+            "estimated_saved_ms": round(self._saved_retrievals * (self._avg_retrieval_ms or 0.0), 3),
+        }
@@ -9,6 +9,7 @@ from app.db.models import CharacterProfile
 from app.providers.llm import LLMClient
 from app.repositories.conversation_logs import ConversationLogRepository
 from app.services.rag_service import RagService
+from app.services.response_cache import SemanticResponseCache, build_cache_scope
 from app.services.prompt_builder import (
     MAX_ASSISTANT_CHARACTERS,
     build_chat_messages,
@@ -19,9 +20,15 @@ logger = logging.getLogger(__name__)
 
 
 class TextChatService:
-    def __init__(self, rag_service: RagService, llm_client: LLMClient):
+    def __init__(
+        self,
+        rag_service: RagService,
+        llm_client: LLMClient,
+        response_cache: SemanticResponseCache | None = None,
+    ):
         self._rag_service = rag_service
         self._llm_client = llm_client
+        self._response_cache = response_cache
 
     async def stream_text_chat(
         self,
@@ -33,18 +40,38 @@ class TextChatService:
         character: CharacterProfile | None = None,
         max_chars: int = MAX_ASSISTANT_CHARACTERS,
         system_prompt: str | None = None,
+        namespace: str | None = None,
     ) -> AsyncIterator[dict]:
         if not user_text.strip():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="user_text is empty."
             )
 
+        cache = self._response_cache
+        if cache is not None and not cache.enabled:
+            cache = None
         rag_start = time.monotonic()
-        docs = await self._rag_service.search(user_text, top_k=top_k)
+        rag_result = await self._rag_service.search_detailed(
+            user_text,
+            top_k=top_k,
+            require_vector=cache is not None,
+            namespace=namespace,
+            character_id=character.id if character else None,
+            gate=True,
+        )
         rag_latency_ms = (time.monotonic() - rag_start) * 1000
-        context_text = self._rag_service.context_as_text(docs)
+        docs = rag_result.documents
+        query_vector = None if rag_result.embedding_fallback else rag_result.query_vector
+        index_version = rag_result.generation
+        cache_scope = build_cache_scope(character, system_prompt, rag_result.namespace)
+        cached = cache.lookup(query_vector, cache_scope, index_version) if cache else None
+        if cached is not None:
+            context_text = cached.used_context
+        else:
+            packed = self._rag_service.build_context(user_text, rag_result)
+            context_text = packed.text
+            docs = packed.documents
         turn_identifier = turn_id or uuid4().hex
-        messages = build_chat_messages(user_text, context_text, character, system_prompt)
 
         yield {
             "event": "context",
@@ -57,24 +84,48 @@ class TextChatService:
 
         assistant_tokens: list[str] = []
         llm_start = time.monotonic()
-        async for token in self._llm_client.stream_chat(messages):
-            if not token:
-                continue
-            candidate = "".join(assistant_tokens) + token
-            if len(candidate.strip()) > max_chars:
-                break
-            assistant_tokens.append(token)
+        if cached is not None:
+            assistant_tokens.append(cached.assistant_text)
             yield {
                 "event": "token",
                 "data": {
                     "session_id": session_id,
                     "turn_id": turn_identifier,
-                    "token": token,
+                    "token": cached.assistant_text,
                 },
             }
+        else:
+            messages = build_chat_messages(user_text, context_text, character, system_prompt)
+            fallback_before = self._llm_client.fallback_count
+            async for token in self._llm_client.stream_chat(messages):
+                if not token:
+                    continue
+                candidate = "".join(assistant_tokens) + token
+                if len(candidate.strip()) > max_chars:
+                    break
+                assistant_tokens.append(token)
+                yield {
+                    "event": "token",
+                    "data": {
+                        "session_id": session_id,
+                        "turn_id": turn_identifier,
+                        "token": token,
+                    },
+                }
+            if not assistant_tokens or self._llm_client.fallback_count != fallback_before:
+                cache = None
 
         assistant_text = clamp_response_length("".join(assistant_tokens))
         llm_latency_ms = (time.monotonic() - llm_start) * 1000
+        if cache is not None and cached is None:
+            cache.store(
+                query_vector,
+                cache_scope,
+                index_version,
+                assistant_text=assistant_text,
+                used_context=context_text,
+                llm_latency_ms=llm_latency_ms,
+            )
         if repo:
             await repo.create(
                 session_id=session_id,
@@ -90,6 +141,7 @@ class TextChatService:
                 "turn_id": turn_identifier,
                 "assistant_text": assistant_text,
                 "used_context": context_text,
+                "cached": cached is not None,
                 "latency_ms": {
                     "rag": round(rag_latency_ms, 1),
                     "llm": round(llm_latency_ms, 1),
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from app.core.providers import WarmupConfig
+from app.providers.registry import ProviderRegistry
+from app.services.prompt_builder import build_chat_messages
+from app.services.rag_service import RagService
+
+logger = logging.getLogger(__name__)
+
+WARMUP_USER_TEXT = "こんにちは"
+WARMUP_TTS_TEXT = "こんにちは、準備ができました。"
+WARMUP_MOTION_PROMPT = "a person stands still"
+
+
+class ProviderWarmup:
+    """起動直後に各プロバイダへ代表リクエストを並列送信し、コールドスタートを先払いする。"""
+
+    def __init__(
+        self,
+        config: WarmupConfig,
+        providers: ProviderRegistry,
+        rag_service: RagService,
+    ):
+        self.config = config
+        self._providers = providers
+        self._rag_service = rag_service
+        self.status = "pending" if config.enabled and config.providers else "skipped"
+        self._results: dict[str, dict[str, Any]] = {}
+        self._started_at: float | None = None
+        self._total_ms: float | None = None
+
+    @property
+    def in_progress(self) -> bool:
+        return self.status in {"pending", "warming"}
+
+    async def run(self, system_prompt: str | None = None) -> None:
+        if self.status == "skipped":
+            return
+        self.status = "warming"
+        self._started_at = time.monotonic()
+        steps = self._build_steps(system_prompt)
+        await asyncio.gather(*(self._run_step(name, step) for name, step in steps.items()))
+        self._total_ms = round((time.monotonic() - self._started_at) * 1000, 1)
+        self.status = "ready"
+        logger.info(
+            "Provider warm-up finished",
+            extra={
+                "event": "warmup_done",
+                "latency_ms": {name: result["latency_ms"] for name, result in self._results.items()},
+            },
+        )
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "status": self.status,
+            "total_ms": self._total_ms,
+            "steps": dict(self._results),
+        }
+
+    def _build_steps(self, system_prompt: str | None) -> dict[str, Callable[[], Awaitable[Any]]]:
+        available: dict[str, Callable[[], Awaitable[Any]]] = {
+            "llm": lambda: self._providers.llm.warmup(
+                build_chat_messages(WARMUP_USER_TEXT, "", None, system_prompt)
+            ),
+            "tts": lambda: self._providers.tts.warmup(WARMUP_TTS_TEXT),
+            "embedding": lambda: self._providers.embedding.warmup(WARMUP_USER_TEXT),
+            "rag": self._rag_service.warmup,
+            "motion": lambda: self._providers.motion.warmup(WARMUP_MOTION_PROMPT),
+        }
+        steps: dict[str, Callable[[], Awaitable[Any]]] = {}
+        for name in self.config.providers:
+            step = available.get(name)
+            if step is None:
+                logger.warning("Unknown warm-up target ignored: %s", name)
+                continue
+            steps[name] = step
+        return steps
+
+    async def _run_step(self, name: str, step: Callable[[], Awaitable[Any]]) -> None:
+        start = time.monotonic()
+        result: dict[str, Any] = {"ok": False, "latency_ms": None, "detail": None}
+        self._results[name] = result
+        try:
+            detail = await asyncio.wait_for(step(), timeout=self.config.timeout_sec)
+            result["ok"] = True
+            if detail is not None:
+                result["detail"] = detail
+        except Exception as exc:  # noqa: BLE001
+            error_text = str(exc).strip()
+            result["detail"] = f"{exc.__class__.__name__}: {error_text}" if error_text else exc.__class__.__name__
+            logger.warning("Warm-up for %s failed: %s", name, result["detail"])
+        result["latency_ms"] = round((time.monotonic() - start) * 1000, 1)
@@ -6,7 +6,7 @@ import shutil
 import subprocess
 import time
 from collections import deque
-from typing import Deque
+from typing import AsyncIterator, Deque
 from uuid import uuid4
 
 from fastapi import WebSocket, WebSocketDisconnect
@@ -14,12 +14,16 @@ from fastapi import WebSocket, WebSocketDisconnect
 from app.db.models import CharacterProfile
 from app.providers.registry import ProviderRegistry
 from app.services.prompt_builder import (
+    EMPTY_INPUT_FALLBACK_TEXT,
+    FALLBACK_ASSISTANT_TEXT,
     MAX_ASSISTANT_CHARACTERS,
     build_chat_messages,
     clamp_response_length,
 )
 from app.services.rag_service import RagService
+from app.services.response_cache import CachedResponse, SemanticResponseCache, build_cache_scope
 from app.schemas.motion import MotionGenerateRequest
+from app.utils.opus import OpusStreamEncoder, opus_encoder_available
 
 logger = logging.getLogger(__name__)
 
@@ -43,9 +47,13 @@ class WebSocketSession:
         silence_flush_ms: int = 600,
         input_max_chunks: int = 150,
         tts_max_chunks: int = 50,
+        tts_max_audio_ms: int = 60_000,
         character: CharacterProfile | None = None,
         max_assistant_chars: int = MAX_ASSISTANT_CHARACTERS,
         system_prompt: str | None = None,
+        response_cache: SemanticResponseCache | None = None,
+        audio_codec: str | None = None,
+        rag_namespace: str | None = None,
     ):
         self.session_id = session_id
         self.websocket = websocket
@@ -59,6 +67,7 @@ class WebSocketSession:
         self._pcm_decoded_bytes = 0
         self._input_max_chunks = input_max_chunks
         self._tts_max_chunks = tts_max_chunks
+        self._tts_max_audio_ms = tts_max_audio_ms
         self._state: str = "listening"
         self._silence_task: asyncio.Task | None = None
         self._current_turn_id: str | None = None
@@ -73,13 +82,21 @@ class WebSocketSession:
         self._ffmpeg_available = shutil.which("ffmpeg") is not None
         self.request_id = request_id or uuid4().hex
         self._character = character
+        self._rag_namespace = rag_namespace
         self._max_assistant_chars = max_assistant_chars
         self._system_prompt = system_prompt
+        self.response_cache = response_cache
+        self.audio_codec = self._negotiate_audio_codec(audio_codec)
 
     async def run(self) -> None:
         await self.websocket.accept()
         await self.websocket.send_json(
-            {"type": "ready", "session_id": self.session_id, "request_id": self.request_id}
+            {
+                "type": "ready",
+                "session_id": self.session_id,
+                "request_id": self.request_id,
+                "audio_codec": self.audio_codec,
+            }
         )
         logger.info(
             "WebSocket session ready",
@@ -276,36 +293,75 @@ class WebSocketSession:
         assistant_text = ""
         fallback_used = False
         llm_latency_ms: float | None = None
+        cache = self.response_cache if self.response_cache and self.response_cache.enabled else None
+        cached: CachedResponse | None = None
+        cache_entry_id: int | None = None
 
         try:
-            docs = await self.rag_service.search(user_text)
-            context_text = self.rag_service.context_as_text(docs)
-            messages = build_chat_messages(
-                user_text, context_text, self._character, self._system_prompt
+            rag_result = await self.rag_service.search_detailed(
+                user_text,
+                require_vector=cache is not None,
+                namespace=self._rag_namespace,
+                character_id=self._character.id if self._character else None,
+                gate=True,
             )
-
-            tokens: list[str] = []
-            llm_start = time.monotonic()
-            async for token in self.providers.llm.stream_chat(messages):
-                if not token:
-                    continue
-                candidate = "".join(tokens) + token
-                if len(candidate.strip()) > self._max_assistant_chars:
-                    break
-                tokens.append(token)
+            # フォールバック埋め込みはハッシュ値なので類似度比較に使わない。
+            query_vector = None if rag_result.embedding_fallback else rag_result.query_vector
+            index_version = rag_result.generation
+            cache_scope = build_cache_scope(self._character, self._system_prompt, rag_result.namespace)
+            if cache is not None:
+                cached = cache.lookup(query_vector, cache_scope, index_version)
+
+            if cached is not None:
+                assistant_text = cached.assistant_text
+                context_text = cached.used_context
+                llm_latency_ms = 0.0
                 await self.websocket.send_json(
                     {
                         "type": "llm_token",
                         "session_id": self.session_id,
                         "turn_id": turn_id,
-                        "token": token,
+                        "token": assistant_text,
                     }
                 )
+            else:
+                context_text = self.rag_service.build_context(user_text, rag_result).text
+                messages = build_chat_messages(
+                    user_text, context_text, self._character, self._system_prompt
+                )
 
-            assistant_text = clamp_response_length("".join(tokens)) or self._fallback_text(
-                user_text
-            )
-            llm_latency_ms = (time.monotonic() - llm_start) * 1000
+                tokens: list[str] = []
+                llm_fallback_before = self.providers.llm.fallback_count
+                llm_start = time.monotonic()
+                async for token in self.providers.llm.stream_chat(messages):
+                    if not token:
+                        continue
+                    candidate = "".join(tokens) + token
+                    if len(candidate.strip()) > self._max_assistant_chars:
+                        break
+                    tokens.append(token)
+                    await self.websocket.send_json(
+                        {
+                            "type": "llm_token",
+                            "session_id": self.session_id,
+                            "turn_id": turn_id,
+                            "token": token,
+                        }
+                    )
+
+                assistant_text = clamp_response_length("".join(tokens)) or self._fallback_text(
+                    user_text
+                )
+                llm_latency_ms = (time.monotonic() - llm_start) * 1000
+                if cache is not None and tokens and self.providers.llm.fallback_count == llm_fallback_before:
+                    cache_entry_id = cache.store(
+                        query_vector,
+                        cache_scope,
+                        index_version,
+                        assistant_text=assistant_text,
+                        used_context=context_text,
+                        llm_latency_ms=llm_latency_ms,
+                    )
         except Exception as exc:  # noqa: BLE001
             fallback_used = True
             assistant_text = self._fallback_text(user_text)
@@ -335,6 +391,7 @@ class WebSocketSession:
                 "timestamp": time.time(),
                 "latency_ms": latency_payload,
                 "fallback": fallback_used,
+                "cached": cached is not None,
             }
         )
         logger.info(
@@ -343,20 +400,28 @@ class WebSocketSession:
                 "session_id": self.session_id,
                 "turn_id": turn_id,
                 "latency_ms": latency_payload,
-                "event": "llm_done",
+                "event": "llm_done_cached" if cached is not None else "llm_done",
                 "fallback": fallback_used,
             },
         )
 
         _ = asyncio.create_task(self._dispatch_motion(turn_id=turn_id, assistant_text=assistant_text))
 
+        cached_audio = cached.audio_chunks if cached is not None else None
+        if cached is not None and cached_audio is None:
+            # テキストのみキャッシュされていた場合は今回の合成結果を同じエントリに追加する。
+            cache_entry_id = cached.entry_id
         try:
-            await self._stream_tts(
+            audio_chunks = await self._stream_tts(
                 turn_id=turn_id,
                 text=assistant_text,
                 llm_latency_ms=llm_latency_value,
                 fallback=fallback_used,
+                cached_audio=cached_audio,
+                collect_audio=cache is not None and cache_entry_id is not None,
             )
+            if cache is not None and audio_chunks:
+                cache.attach_audio(cache_entry_id, audio_chunks)
         except Exception as exc:  # noqa: BLE001
             logger.exception(
                 "TTS pipeline failed for session",
@@ -405,9 +470,28 @@ class WebSocketSession:
             )
 
     async def _stream_tts(
-        self, turn_id: str, text: str, llm_latency_ms: float, fallback: bool
-    ) -> None:
+        self,
+        turn_id: str,
+        text: str,
+        llm_latency_ms: float,
+        fallback: bool,
+        cached_audio: list[bytes] | None = None,
+        collect_audio: bool = False,
+    ) -> list[bytes] | None:
         metadata = self.providers.tts.metadata()
+        encoder: OpusStreamEncoder | None = None
+        codec_payload: dict[str, object] = {"codec": self.audio_codec}
+        if self.audio_codec == "opus":
+            encoder = OpusStreamEncoder(
+                sample_rate=metadata["sample_rate"],
+                channels=metadata["channels"],
+                bitrate_kbps=self.providers.tts.config.opus_bitrate_kbps,
+            )
+            codec_payload = {
+                "codec": "opus",
+                "container": "ogg",
+                "bitrate_kbps": encoder.bitrate_kbps,
+            }
         tts_start = time.monotonic()
         await self.websocket.send_json(
             {
@@ -415,20 +499,43 @@ class WebSocketSession:
                 "session_id": self.session_id,
                 "turn_id": turn_id,
                 **metadata,
+                **codec_payload,
                 "fallback": fallback,
             }
         )
 
-        chunk_count = 0
-        async for chunk in self.providers.tts.stream_tts(text):
-            if not chunk:
-                continue
-            chunk_count += 1
-            if chunk_count > self._tts_max_chunks:
-                await self._send_error("tts backlog exceeded; dropping audio", recoverable=False)
-                break
-            await self.websocket.send_bytes(chunk)
-            await self._maybe_send_avatar_event(turn_id, chunk)
+        # PCM はプロバイダ側で chunk_ms 固定長に揃うため、上限を音声時間で数える。
+        max_chunks = self._tts_max_chunks
+        if metadata.get("frame_bytes"):
+            max_chunks = max(1, self._tts_max_audio_ms // metadata["chunk_ms"])
+        truncated = False
+        collected: list[bytes] | None = [] if collect_audio and cached_audio is None else None
+        tts_fallback_before = self.providers.tts.fallback_count
+        if cached_audio is not None:
+            source = self._iter_cached_audio(cached_audio)
+        else:
+            source = self.providers.tts.stream_sentences(text)
+
+        async def _pcm_frames() -> AsyncIterator[bytes]:
+            # 上限判定・口形イベント・キャッシュ用の収集はエンコード前の PCM に対して行う。
+            nonlocal truncated
+            chunk_count = 0
+            async for chunk in source:
+                if not chunk:
+                    continue
+                chunk_count += 1
+                if chunk_count > max_chunks:
+                    truncated = True
+                    await self._send_error("tts backlog exceeded; dropping audio", recoverable=False)
+                    break
+                await self._maybe_send_avatar_event(turn_id, chunk)
+                if collected is not None:
+                    collected.append(bytes(chunk))
+                yield chunk
+
+        outgoing = encoder.encode(_pcm_frames()) if encoder is not None else _pcm_frames()
+        async for payload in outgoing:
+            await self.websocket.send_bytes(payload)
 
         tts_end = time.monotonic()
         tts_latency = round((tts_end - tts_start) * 1000, 1)
@@ -444,6 +551,8 @@ class WebSocketSession:
                 "timestamp": time.time(),
                 "latency_ms": latency_payload,
                 "fallback": fallback,
+                "cached": cached_audio is not None,
+                **({"codec_stats": encoder.stats()} if encoder is not None else {}),
             }
         )
         logger.info(
@@ -454,8 +563,17 @@ class WebSocketSession:
                 "latency_ms": latency_payload,
                 "event": "tts_end",
                 "fallback": fallback,
+                **({"codec_stats": encoder.stats()} if encoder is not None else {}),
             },
         )
+        if collected is None or truncated or self.providers.tts.fallback_count != tts_fallback_before:
+            return None
+        return collected
+
+    async def _iter_cached_audio(self, chunks: list[bytes]) -> AsyncIterator[bytes]:
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(0)
 
     async def _maybe_send_avatar_event(self, turn_id: str, chunk: bytes) -> None:
         now = time.time()
@@ -473,10 +591,27 @@ class WebSocketSession:
             }
         )
 
+    def _negotiate_audio_codec(self, requested: str | None) -> str:
+        """クライアント要求と設定から下り音声のコーデックを決める。"""
+        tts = self.providers.tts
+        if not tts.is_raw_pcm:
+            # 上流が既に圧縮形式を返す場合は再エンコードせずそのまま流す。
+            return (tts.config.output_format or "").lower()
+        codec = (requested or tts.config.downstream_codec or "pcm").lower()
+        if codec != "opus":
+            return "pcm"
+        if not self._ffmpeg_available or not opus_encoder_available():
+            logger.warning(
+                "Opus downstream requested but ffmpeg is unavailable; falling back to PCM",
+                extra={"session_id": self.session_id, "event": "tts_codec_fallback"},
+            )
+            return "pcm"
+        return "opus"
+
     def _fallback_text(self, user_text: str) -> str:
         if user_text.strip():
-            return "現在応答を生成できません。時間をおいてもう一度お試しください。"
-        return "応答を生成できませんでした。"
+            return FALLBACK_ASSISTANT_TEXT
+        return EMPTY_INPUT_FALLBACK_TEXT
 
     async def _send_error(self, message: str, recoverable: bool) -> None:
         await self.websocket.send_json(
@@ -661,7 +796,7 @@ class WebSocketSession:
         if samples == 0:
             return 0.0
         total = 0.0
-        for i in range(0, len(chunk), 2):
+        for i in range(0, samples * 2, 2):
             sample = int.from_bytes(chunk[i : i + 2], "little", signed=True)
             total += sample * sample
         return math.sqrt(total / samples)
@@ -1,4 +1,5 @@
 import struct
+from collections.abc import Iterator
 
 
 def detect_audio_mime(audio_bytes: bytes) -> str | None:
@@ -39,3 +40,54 @@ def pcm_to_wav(pcm_bytes: bytes, sample_rate: int, channels: int = 1) -> bytes:
     )
     return header + pcm_bytes
 
+
+def pcm_frame_bytes(sample_rate: int, chunk_ms: int, channels: int = 1, sample_width: int = 2) -> int:
+    """Byte size of a `chunk_ms` frame, rounded down to whole samples (at least one)."""
+    samples_per_frame = max(1, int(sample_rate * chunk_ms / 1000))
+    return samples_per_frame * channels * sample_width
+
+
+class PcmFramer:
+    """Re-frame an s16le byte stream into fixed `chunk_ms` frames aligned to sample boundaries.
+
+    Incoming chunks of arbitrary size are copied into a preallocated frame buffer
+    through memoryview slices; leftover bytes are carried over to the next frame.
+    """
+
+    def __init__(self, sample_rate: int, chunk_ms: int, channels: int = 1, sample_width: int = 2):
+        self.block_align = channels * sample_width
+        self.frame_bytes = pcm_frame_bytes(sample_rate, chunk_ms, channels, sample_width)
+        self._buffer = bytearray(self.frame_bytes)
+        self._view = memoryview(self._buffer)
+        self._filled = 0
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        """Consume `data` and yield every frame that became complete."""
+        source = memoryview(data)
+        offset = 0
+        total = len(source)
+        while offset < total:
+            if self._filled == 0 and total - offset >= self.frame_bytes:
+                # Fast path: slice whole frames straight out of the input.
+                yield bytes(source[offset : offset + self.frame_bytes])
+                offset += self.frame_bytes
+                continue
+            take = min(self.frame_bytes - self._filled, total - offset)
+            self._view[self._filled : self._filled + take] = source[offset : offset + take]
+            self._filled += take
+            offset += take
+            if self._filled == self.frame_bytes:
+                yield bytes(self._view)
+                self._filled = 0
+
+    def flush(self) -> bytes:
+        """Return the pending partial frame padded with silence (empty if nothing is pending).
+
+        A trailing byte that does not form a whole sample is discarded.
+        """
+        aligned = self._filled - self._filled % self.block_align
+        self._filled = 0
+        if aligned == 0:
+            return b""
+        self._view[aligned:] = bytes(self.frame_bytes - aligned)
+        return bytes(self._view)
@@ -0,0 +1,148 @@
+"""Streaming Opus encoding of raw PCM through an ffmpeg subprocess."""
+
+import asyncio
+import logging
+import os
+import shutil
+from collections.abc import AsyncIterator
+from contextlib import suppress
+
+logger = logging.getLogger(__name__)
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def opus_encoder_available() -> bool:
+    """Return True when an ffmpeg binary (expected to ship libopus) is on PATH."""
+    return shutil.which("ffmpeg") is not None
+
+
+def _process_cpu_sec(pid: int) -> float | None:
+    """Read user+system CPU seconds of a child from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as handle:
+            fields = handle.read().rsplit(b")", 1)[1].split()
+    except (OSError, IndexError):
+        return None
+    # fields[0] is the state (3rd column); utime/stime are columns 14 and 15.
+    return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+
+
+class OpusStreamEncoder:
+    """Encode an s16le PCM stream into Ogg Opus pages as the PCM arrives.
+
+    One encoder instance handles one utterance. Byte counters and the encoder
+    CPU time are kept for bandwidth/cost reporting.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        channels: int = 1,
+        bitrate_kbps: int = 32,
+        frame_ms: int = 20,
+    ):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.bitrate_kbps = bitrate_kbps
+        self.frame_ms = frame_ms
+        self.pcm_bytes = 0
+        self.encoded_bytes = 0
+        self.cpu_sec: float | None = None
+
+    def _command(self) -> list[str]:
+        return [
+            "ffmpeg",
+            "-loglevel",
+            "error",
+            "-f",
+            "s16le",
+            "-ar",
+            str(self.sample_rate),
+            "-ac",
+            str(self.channels),
+            "-i",
+            "pipe:0",
+            "-c:a",
+            "libopus",
+            "-ar",
+            "48000",
+            "-b:a",
+            f"{self.bitrate_kbps}k",
+            "-frame_duration",
+            str(self.frame_ms),
+            # Emit one Ogg page per Opus packet instead of buffering ~1s per page.
+            "-page_duration",
+            str(self.frame_ms * 1000),
+            "-flush_packets",
+            "1",
+            "-f",
+            "ogg",
+            "pipe:1",
+        ]
+
+    async def encode(self, pcm_chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        process = await asyncio.create_subprocess_exec(
+            *self._command(),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        assert process.stdin is not None and process.stdout is not None
+
+        async def _feed() -> None:
+            try:
+                async for chunk in pcm_chunks:
+                    if not chunk:
+                        continue
+                    self.pcm_bytes += len(chunk)
+                    process.stdin.write(chunk)
+                    await process.stdin.drain()
+            finally:
+                with suppress(Exception):
+                    process.stdin.close()
+
+        feeder = asyncio.create_task(_feed())
+        try:
+            while True:
+                data = await process.stdout.read(4096)
+                if not data:
+                    break
+                self.encoded_bytes += len(data)
+                sampled = _process_cpu_sec(process.pid)
+                if sampled is not None:
+                    self.cpu_sec = sampled
+                yield data
+            await feeder
+            return_code = await process.wait()
+            if return_code != 0 and process.stderr is not None:
+                error = (await process.stderr.read()).decode("utf-8", "ignore").strip()
+                logger.warning("ffmpeg opus encode exited with %s: %s", return_code, error)
+        finally:
+            if not feeder.done():
+                feeder.cancel()
+                with suppress(asyncio.CancelledError):
+                    await feeder
+            if process.returncode is None:
+                with suppress(ProcessLookupError):
+                    process.kill()
+                await process.wait()
+
+    def stats(self) -> dict[str, float | int | None]:
+        pcm_bytes_per_sec = self.sample_rate * self.channels * 2
+        stream_sec = self.pcm_bytes / pcm_bytes_per_sec if pcm_bytes_per_sec else 0.0
+        return {
+            "codec": "opus",
+            "stream_sec": round(stream_sec, 3),
+            "pcm_bytes": self.pcm_bytes,
+            "encoded_bytes": self.encoded_bytes,
+            "bandwidth_saved_ratio": (
+                round(1 - self.encoded_bytes / self.pcm_bytes, 4) if self.pcm_bytes else None
+            ),
+            "encode_cpu_sec": round(self.cpu_sec, 4) if self.cpu_sec is not None else None,
+            "cpu_sec_per_stream_sec": (
+                round(self.cpu_sec / stream_sec, 4)
+                if self.cpu_sec is not None and stream_sec
+                else None
+            ),
+        }
@@ -0,0 +1,74 @@
+import hashlib
+import json
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pytest
+
+EMBEDDING_DIM = 8
+
+PROVIDERS_YAML = """\
+llm:
+  provider: openai
+  endpoint: http://llm.test/v1
+  model: test-llm
+stt:
+  provider: whisper
+  endpoint: http://stt.test
+tts:
+  provider: fish-speech
+  endpoint: http://tts.test
+rag:
+  provider: faiss
+  index_path: {index_path}
+  index_spec: flat
+  ingest_embedding_cache: "off"
+  ingest_dedup_threshold: 0
+embedding:
+  provider: openai
+  endpoint: http://embedding.test/v1
+  model: test-embedding
+  query_cache_size: 0
+motion:
+  provider: mdm
+  endpoint: http://motion.test
+"""
+
+
+def fake_vector(text: str) -> list[float]:
+    """本文から決まる疑似埋め込み。同じ本文には常に同じベクトルを返す。"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+    return np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype(float).tolist()
+
+
+class FakeEmbeddingServer:
+    """OpenAI 互換 /embeddings の代わり。受け取った本文を記録する。"""
+
+    def __init__(self) -> None:
+        self.inputs: list[str] = []
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        texts = json.loads(request.content)["input"]
+        self.inputs.extend(texts)
+        return httpx.Response(
+            200,
+            json={"data": [{"index": index, "embedding": fake_vector(text)} for index, text in enumerate(texts)]},
+        )
+
+
+@pytest.fixture
+def embedding_server(monkeypatch: pytest.MonkeyPatch) -> FakeEmbeddingServer:
+    server = FakeEmbeddingServer()
+    real_client = httpx.Client
+    monkeypatch.setattr(
+        httpx, "Client", lambda **kwargs: real_client(transport=httpx.MockTransport(server.handle), **kwargs)
+    )
+    return server
+
+
+@pytest.fixture
+def providers_path(tmp_path: Path) -> Path:
+    path = tmp_path / "providers.yaml"
+    path.write_text(PROVIDERS_YAML.format(index_path=tmp_path / "index" / "index.bin"), encoding="utf-8")
+    return path
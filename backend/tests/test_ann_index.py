@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from app.services.ann_index import (
+    IndexSpec,
+    auto_index_spec,
+    new_id_index,
+    parse_index_spec,
+    remove_ids,
+    resolve_index_spec,
+)
+
+
+def test_parse_index_spec_reads_type_and_parameters():
+    spec = parse_index_spec("HNSW-SQ8: M=16, efSearch=128, ef_construction=40")
+
+    assert spec == IndexSpec(kind="hnsw", encoding="sq8", hnsw_m=16, ef_search=128, ef_construction=40)
+    assert spec.describe() == "hnsw-sq8:M=16,efConstruction=40,efSearch=128"
+    assert spec.factory_string() == "HNSW16_SQ8"
+    assert parse_index_spec("ivf-pq:nlist=256,pqM=8").factory_string() == "IVF256,PQ8x8"
+    assert parse_index_spec("auto") is None
+
+
+@pytest.mark.parametrize("text", ["annoy", "hnsw:M", "hnsw:depth=3"])
+def test_parse_index_spec_rejects_unknown_input(text):
+    with pytest.raises(ValueError):
+        parse_index_spec(text)
+
+
+def test_auto_spec_grows_with_the_corpus():
+    assert auto_index_spec(10_000).name == "flat"
+    assert auto_index_spec(200_000).name == "hnsw"
+    assert auto_index_spec(5_000_000).name == "ivf-sq8"
+
+
+def test_resolve_fills_ivf_parameters_from_the_corpus_size():
+    spec = resolve_index_spec(parse_index_spec("ivf-sq8"), ntotal=1_000_000, dimension=384)
+
+    assert spec.nlist == 4000
+    assert spec.nprobe == 125
+
+
+def test_resolve_caps_nlist_to_trainable_clusters():
+    spec = resolve_index_spec(parse_index_spec("ivf:nlist=1024,nprobe=2048"), ntotal=3900, dimension=8)
+
+    assert (spec.nlist, spec.nprobe) == (100, 100)
+
+
+def test_resolve_degrades_untrainable_combinations():
+    pq = resolve_index_spec(parse_index_spec("pq:pqM=16"), ntotal=100, dimension=384)
+    small_ivf = resolve_index_spec(parse_index_spec("ivf-sq8"), ntotal=10, dimension=8)
+    odd_dimension = resolve_index_spec(parse_index_spec("pq:pqM=16"), ntotal=10_000, dimension=30)
+
+    assert pq.encoding == "flat"
+    assert (small_ivf.kind, small_ivf.encoding) == ("flat", "sq8")
+    assert odd_dimension.pq_m == 15
+
+
+def test_removing_from_hnsw_rebuilds_without_the_dropped_ids():
+    vectors = np.random.default_rng(0).standard_normal((200, 8)).astype(np.float32)
+    spec = resolve_index_spec(parse_index_spec("hnsw:M=8"), ntotal=200, dimension=8)
+    index = new_id_index(spec, 8)
+    index.add_with_ids(vectors, np.arange(1000, 1200, dtype=np.int64))
+
+    index = remove_ids(index, spec, [1000, 1001])
+
+    assert index.ntotal == 198
+    _, ids = index.search(vectors[:3], 1)
+    assert ids[:, 0].tolist()[2] == 1002
+    assert 1000 not in ids and 1001 not in ids
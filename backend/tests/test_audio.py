@@ -0,0 +1,34 @@
+from app.utils.audio import PcmFramer, pcm_frame_bytes
+
+
+def test_frame_size_is_rounded_down_to_whole_samples():
+    assert pcm_frame_bytes(44100, 40) == 1764 * 2
+    assert pcm_frame_bytes(22050, 30) == 661 * 2
+    assert pcm_frame_bytes(16000, 20, channels=2) == 320 * 4
+    assert pcm_frame_bytes(8000, 0) == 2
+
+
+def test_odd_sized_chunks_come_out_as_whole_frames_in_order():
+    framer = PcmFramer(16000, 10)
+    data = (bytes(range(256)) * 6)[:1300]
+
+    frames = [frame for start in range(0, len(data), 77) for frame in framer.feed(data[start : start + 77])]
+
+    assert [len(frame) for frame in frames] == [320] * 4
+    assert b"".join(frames) == data[:1280]
+    assert framer.flush() == data[1280:] + bytes(300)
+
+
+def test_flush_drops_a_trailing_partial_sample():
+    framer = PcmFramer(16000, 10)
+
+    assert list(framer.feed(b"\x01\x02\x03")) == []
+    assert framer.flush() == b"\x01\x02" + bytes(318)
+    assert framer.flush() == b""
+
+
+def test_flush_with_only_half_a_sample_returns_nothing():
+    framer = PcmFramer(16000, 10)
+    list(framer.feed(b"\x01"))
+
+    assert framer.flush() == b""
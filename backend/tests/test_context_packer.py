@@ -0,0 +1,88 @@
+from langchain_core.documents import Document
+
+from app.services.context_packer import estimate_tokens, format_context, pack_context
+
+
+def _doc(text: str, source: str | None = None) -> Document:
+    return Document(page_content=text, metadata={"source": source} if source else {})
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert estimate_tokens("東京タワー") == 5
+    assert estimate_tokens("abcd efgh") == 2
+    assert estimate_tokens("") == 0
+
+
+def test_near_identical_documents_are_dropped():
+    docs = [
+        _doc("ベータ製品の保証期間は購入日から2年間です。", "a.md"),
+        _doc("ベータ製品の保証期間は購入日から2年間です", "b.md"),
+        _doc("ガンマ計画の担当者は佐藤さんです。", "c.md"),
+    ]
+
+    packed = pack_context("保証期間", docs)
+
+    assert packed.duplicates_removed == 1
+    assert [doc.metadata["source"] for doc in packed.documents] == ["a.md", "c.md"]
+    assert packed.tokens < packed.original_tokens
+
+
+def test_overlap_between_chunks_of_the_same_source_is_removed():
+    shared = "この段落は前のチャンクと次のチャンクで重複している共通部分です。"
+    docs = [_doc("最初の説明があります。" + shared, "a.md"), _doc(shared + "続きの説明があります。", "a.md")]
+
+    packed = pack_context("説明", docs)
+
+    assert packed.text.count(shared) == 1
+    assert "[2] (a.md) 続きの説明があります。" in packed.text
+
+
+def test_overlap_is_kept_across_different_sources():
+    shared = "この段落は前のチャンクと次のチャンクで重複している共通部分です。"
+    docs = [_doc("最初の説明があります。" + shared, "a.md"), _doc(shared + "別の資料の記述が長く続きます。", "b.md")]
+
+    assert pack_context("説明", docs).text.count(shared) == 2
+
+
+def test_mmr_orders_by_distance_and_demotes_redundant_documents():
+    docs = [
+        _doc("温度センサーの校正手順は年に一度実施します。", "a.md"),
+        _doc("温度センサーの校正手順は年に一度実施し、記録を残します。", "b.md"),
+        _doc("湿度の管理基準は四十から六十パーセントです。", "c.md"),
+    ]
+
+    by_distance = pack_context("校正", docs, distances=[0.1, 0.2, 0.3], mmr_lambda=0.5, duplicate_threshold=1.1)
+    relevance_only = pack_context("校正", docs, distances=[0.3, 0.2, 0.1], mmr_lambda=1.0, duplicate_threshold=1.1)
+
+    assert [doc.metadata["source"] for doc in by_distance.documents] == ["a.md", "c.md", "b.md"]
+    assert [doc.metadata["source"] for doc in relevance_only.documents] == ["c.md", "b.md", "a.md"]
+
+
+def test_lexical_only_hits_without_distance_fall_back_to_rank():
+    docs = [_doc("温度の記録方法。", "a.md"), _doc("湿度の記録方法。", "b.md"), _doc("照度の記録方法。", "c.md")]
+
+    packed = pack_context("記録", docs, distances=[0.5, None, 0.1], mmr_lambda=1.0, duplicate_threshold=1.1)
+
+    # c は距離が最小、b は距離が無いので順位 (2 位) から関連度を求め、距離が最大の a より前に来る。
+    assert [doc.metadata["source"] for doc in packed.documents] == ["c.md", "b.md", "a.md"]
+
+
+def test_budget_trims_to_the_sentences_closest_to_the_query():
+    docs = [
+        _doc("短い前置きです。", "a.md"),
+        _doc("天気の話題が続きます。保証期間は購入日から二年です。無関係な雑談がさらに続いています。", "b.md"),
+    ]
+    budget = estimate_tokens(format_context(docs[:1])) + 25
+
+    packed = pack_context("保証期間は？", docs, token_budget=budget)
+
+    assert packed.tokens <= budget
+    assert packed.passages_trimmed == 1
+    assert "保証期間は購入日から二年です。" in packed.text
+    assert "無関係な雑談" not in packed.text
+
+
+def test_empty_input():
+    packed = pack_context("query", [])
+
+    assert packed.text == "" and packed.documents == []
@@ -0,0 +1,158 @@
+import asyncio
+import json
+
+import httpx
+import numpy as np
+
+from app.core.providers import EmbeddingConfig
+from app.providers.embedding import EmbeddingClient
+
+
+def _config(**overrides) -> EmbeddingConfig:
+    values = {"provider": "openai", "endpoint": "http://embedding.test/v1", "model": "m", "query_cache_size": 0}
+    return EmbeddingConfig(**{**values, **overrides})
+
+
+def _openai_response(texts: list[str]) -> httpx.Response:
+    return httpx.Response(
+        200, json={"data": [{"index": i, "embedding": [float(len(text)), 1.0]} for i, text in enumerate(texts)]}
+    )
+
+
+def test_requests_are_split_by_batch_size_and_keep_input_order():
+    batches: list[list[str]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        texts = json.loads(request.content)["input"]
+        batches.append(texts)
+        return _openai_response(texts)
+
+    client = EmbeddingClient(_config(batch_size=2), None, httpx.Client(transport=httpx.MockTransport(handler)))
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+
+    matrix = client.embed(texts)
+
+    assert sorted(len(batch) for batch in batches) == [1, 2, 2]
+    assert matrix.dtype == np.float32 and matrix.flags["C_CONTIGUOUS"]
+    assert matrix[:, 0].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+
+def test_async_batches_respect_max_concurrency():
+    active = 0
+    peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return _openai_response(json.loads(request.content)["input"])
+
+    async def main() -> np.ndarray:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http_client:
+            client = EmbeddingClient(_config(batch_size=1, max_concurrency=3), http_client)
+            return await client.aembed([str(i) * (i + 1) for i in range(9)])
+
+    matrix = asyncio.run(main())
+
+    assert peak == 3
+    assert matrix[:, 0].tolist() == [float(i + 1) for i in range(9)]
+
+
+def test_llama_server_falls_back_to_single_inputs_once():
+    bodies: list[object] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        content = json.loads(request.content)["content"]
+        bodies.append(content)
+        if isinstance(content, list):
+            return httpx.Response(400, json={"error": "multi-input not supported"})
+        return httpx.Response(200, json={"embedding": [[float(len(content)), 0.0]]})
+
+    client = EmbeddingClient(
+        _config(endpoint="http://embedding.test/embedding", batch_size=4),
+        None,
+        httpx.Client(transport=httpx.MockTransport(handler)),
+    )
+
+    first = client.embed(["a", "bb"])
+    second = client.embed(["ccc", "dddd"])
+
+    assert first[:, 0].tolist() == [1.0, 2.0] and second[:, 0].tolist() == [3.0, 4.0]
+    # 複数入力を拒否されたら以後は 1 件ずつ送り、同じ失敗を繰り返さない。
+    assert bodies == [["a", "bb"], "a", "bb", "ccc", "dddd"]
+
+
+def test_short_response_falls_back_instead_of_misaligning_vectors():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return _openai_response(json.loads(request.content)["input"][:1])
+
+    client = EmbeddingClient(_config(batch_size=8), None, httpx.Client(transport=httpx.MockTransport(handler)))
+
+    matrix = client.embed(["a", "b", "c"])
+
+    assert matrix.shape[0] == 3
+    assert client.fallback_count == 1
+
+
+def _async_client(handler, **overrides) -> EmbeddingClient:
+    config = _config(query_cache_size=8, **overrides)
+    return EmbeddingClient(config, httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+def test_query_cache_embeds_original_text_and_matches_variants():
+    sent: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        texts = json.loads(request.content)["input"]
+        sent.extend(texts)
+        return _openai_response(texts)
+
+    client = _async_client(handler)
+    first = asyncio.run(client.aembed(["Hello  World"]))
+    second = asyncio.run(client.aembed(["ｈｅｌｌｏ world "]))
+
+    # 文書と同じく元の表記のまま埋め込み、表記ゆれはキャッシュのキーだけで吸収する。
+    assert sent == ["Hello  World"]
+    assert np.array_equal(first, second)
+    assert client.cache_stats()["hits"] == 1
+
+
+def test_fallback_does_not_invalidate_cached_queries():
+    state = {"down": False}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if state["down"]:
+            return httpx.Response(503)
+        return _openai_response(json.loads(request.content)["input"])
+
+    client = _async_client(handler)
+    asyncio.run(client.aembed(["cached"]))
+    state["down"] = True
+
+    degraded = asyncio.run(client.aembed(["cached", "new"]))
+
+    assert degraded.shape[0] == 2
+    assert client.cache_stats()["entries"] == 1
+    assert client.cache_stats()["invalidations"] == 0
+
+
+def test_dimension_change_refetches_stale_entries():
+    state = {"dimension": 2}
+    sent: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        texts = json.loads(request.content)["input"]
+        sent.extend(texts)
+        vector = [1.0] * state["dimension"]
+        return httpx.Response(200, json={"data": [{"index": i, "embedding": vector} for i in range(len(texts))]})
+
+    client = _async_client(handler)
+    asyncio.run(client.aembed(["old"]))
+    state["dimension"] = 3
+
+    matrix = asyncio.run(client.aembed(["old", "new"]))
+
+    assert matrix.shape == (2, 3)
+    assert sent == ["old", "new", "old"]
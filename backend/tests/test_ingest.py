@@ -0,0 +1,83 @@
+from pathlib import Path
+
+import pytest
+
+from app.cli.ingest import IngestOptions, ingest
+from app.services.rag_index import open_rag_index
+
+
+@pytest.fixture
+def source_dir(tmp_path: Path) -> Path:
+    source = tmp_path / "source"
+    source.mkdir()
+    for name, text in {
+        "alpha.md": "アルファ社の本社は札幌にあります。創業は1998年です。",
+        "beta.md": "ベータ製品の保証期間は2年です。修理は窓口で受け付けます。",
+        "gamma.md": "ガンマ計画の担当者は佐藤さんです。進捗は毎週報告します。",
+    }.items():
+        (source / name).write_text(text, encoding="utf-8")
+    return source
+
+
+def _ingest(source: Path, providers_path: Path, incremental: bool):
+    index_path = providers_path.parent / "index" / "index.bin"
+    return ingest(source, providers_path, index_path, incremental=incremental, options=IngestOptions())
+
+
+def _contents(providers_path: Path) -> list[str]:
+    opened = open_rag_index(providers_path.parent / "index", "index")
+    assert opened is not None
+    try:
+        ids = list(range(int(opened.manifest["ingest"]["next_id"])))
+        return sorted(document.page_content for document in opened.fetch_map(ids).values())
+    finally:
+        opened.close()
+
+
+def test_incremental_without_changes_embeds_nothing(source_dir, providers_path, embedding_server):
+    _ingest(source_dir, providers_path, incremental=False)
+    embedding_server.inputs.clear()
+
+    report = _ingest(source_dir, providers_path, incremental=True)
+
+    assert report.mode == "incremental"
+    assert report.files_unchanged == 3
+    assert report.chunks_embedded == 0
+    assert embedding_server.inputs == []
+
+
+def test_incremental_embeds_only_changed_files(source_dir, providers_path, embedding_server):
+    _ingest(source_dir, providers_path, incremental=False)
+    embedding_server.inputs.clear()
+    (source_dir / "beta.md").write_text("ベータ製品の保証期間は3年に延びました。", encoding="utf-8")
+    (source_dir / "gamma.md").unlink()
+    (source_dir / "delta.md").write_text("デルタ支店は来月開業します。", encoding="utf-8")
+
+    report = _ingest(source_dir, providers_path, incremental=True)
+
+    assert (report.files_added, report.files_changed, report.files_removed, report.files_unchanged) == (1, 1, 1, 1)
+    assert sorted(embedding_server.inputs) == ["デルタ支店は来月開業します。", "ベータ製品の保証期間は3年に延びました。"]
+    assert report.chunks_reused == 1
+    assert _contents(providers_path) == [
+        "アルファ社の本社は札幌にあります。創業は1998年です。",
+        "デルタ支店は来月開業します。",
+        "ベータ製品の保証期間は3年に延びました。",
+    ]
+
+
+def test_incremental_without_published_index_runs_full_build(source_dir, providers_path, embedding_server):
+    report = _ingest(source_dir, providers_path, incremental=True)
+
+    assert report.mode == "full"
+    assert len(embedding_server.inputs) == 3
+
+
+def test_near_duplicate_chunks_are_not_embedded(source_dir, providers_path, embedding_server):
+    text = (source_dir / "beta.md").read_text(encoding="utf-8")
+    (source_dir / "beta-copy.md").write_text(text + " ", encoding="utf-8")
+    index_path = providers_path.parent / "index" / "index.bin"
+
+    report = ingest(source_dir, providers_path, index_path, options=IngestOptions(dedup_threshold=0.8))
+
+    assert report.chunks_deduplicated == 1
+    assert len(embedding_server.inputs) == 3
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from app.services.ingest_jobs import IngestJob, IngestJobConflictError, IngestJobManager
+
+from conftest import fake_vector
+
+
+class _EmbeddingHandler(BaseHTTPRequestHandler):
+    # ワーカーは別プロセスなので、httpx のモックではなく実際の HTTP で応答する。
+    release = threading.Event()
+
+    def do_POST(self) -> None:  # noqa: N802
+        self.release.wait(timeout=30)
+        texts = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["input"]
+        body = json.dumps(
+            {"data": [{"index": index, "embedding": fake_vector(text)} for index, text in enumerate(texts)]}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+class _FakeRagService:
+    def __init__(self) -> None:
+        self.reloaded: list[str | None] = []
+
+    async def reload(self, force: bool = False, namespace: str | None = None) -> bool:
+        self.reloaded.append(namespace)
+        return True
+
+
+@pytest.fixture
+def embedding_endpoint():
+    _EmbeddingHandler.release.set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _EmbeddingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    _EmbeddingHandler.release.set()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def manager(tmp_path: Path, providers_path: Path, embedding_endpoint: str):
+    providers_path.write_text(
+        providers_path.read_text(encoding="utf-8").replace("http://embedding.test/v1", embedding_endpoint),
+        encoding="utf-8",
+    )
+    source_root = tmp_path / "memories"
+    (source_root / "notes").mkdir(parents=True)
+    (source_root / "notes" / "a.md").write_text("アルファ社の本社は札幌にあります。", encoding="utf-8")
+    return IngestJobManager(_FakeRagService(), providers_path, tmp_path / "index" / "index.bin", source_root)
+
+
+async def _wait(job: IngestJob, timeout: float = 60) -> None:
+    async def until_finished() -> None:
+        while not job.finished:
+            await job.wait_changed(job.revision, 1.0)
+
+    await asyncio.wait_for(until_finished(), timeout)
+
+
+def test_job_succeeds_and_reloads_its_namespace(manager, tmp_path):
+    async def main() -> IngestJob:
+        job = manager.start("notes", namespace="character-1")
+        await _wait(job)
+        return job
+
+    job = asyncio.run(main())
+
+    assert job.status == "succeeded", job.error
+    assert job.report["chunks_embedded"] == 1
+    assert job.progress["files"] == job.progress["files_total"] == 1
+    assert manager._rag_service.reloaded == ["character-1"]
+    assert (tmp_path / "index" / "namespaces" / "character-1" / "index.current").exists()
+    assert manager.jobs() == [job]
+
+
+def test_second_job_conflicts_and_cancel_stops_the_worker(manager):
+    _EmbeddingHandler.release.clear()
+
+    async def main() -> IngestJob:
+        job = manager.start("notes")
+        with pytest.raises(IngestJobConflictError):
+            manager.start("notes")
+        assert manager.cancel(job.id)
+        await _wait(job)
+        return job
+
+    job = asyncio.run(main())
+
+    assert job.status == "cancelled"
+    assert manager._rag_service.reloaded == []
+    assert not manager.cancel(job.id)
+
+
+@pytest.mark.parametrize("source", ["../outside", "missing"])
+def test_sources_outside_the_root_or_missing_are_rejected(manager, source):
+    with pytest.raises(ValueError):
+        manager.resolve_source(source)
+
+
+class _QueuedEvents:
+    """タイムアウトした直後に done が届く状況を再現するキュー。"""
+
+    def __init__(self, events: list[dict]) -> None:
+        self._events = events
+
+    def get(self, block: bool, timeout: float) -> dict:
+        raise queue.Empty
+
+    def get_nowait(self) -> dict:
+        if not self._events:
+            raise queue.Empty
+        return self._events.pop(0)
+
+    def close(self) -> None:
+        pass
+
+
+class _ExitedProcess:
+    exitcode = 0
+
+    def is_alive(self) -> bool:
+        return False
+
+    def join(self) -> None:
+        pass
+
+
+def test_events_left_in_the_queue_after_exit_are_drained(tmp_path):
+    manager = IngestJobManager(_FakeRagService(), tmp_path, tmp_path / "index.bin", tmp_path)
+    job = IngestJob(id="job", source=str(tmp_path), status="running")
+    events = _QueuedEvents(
+        [
+            {"type": "progress", "progress": {"files": 1, "files_total": 2}},
+            {"type": "done", "report": {"chunks_embedded": 2}},
+        ]
+    )
+
+    asyncio.run(manager._supervise(job, _ExitedProcess(), events))
+
+    assert job.status == "succeeded"
+    assert job.report == {"chunks_embedded": 2}
+    assert job.progress["files"] == 2
@@ -0,0 +1,21 @@
+from app.cli.ingest_pipeline import NearDuplicateFilter
+
+BASE = "ベータ製品の保証期間は購入日から2年です。修理は全国の窓口で受け付けています。"
+
+
+def test_near_duplicate_is_reported_against_the_first_chunk():
+    dedup = NearDuplicateFilter(0.8)
+
+    assert dedup.check(1, BASE) is None
+    assert dedup.check(2, BASE + " ") == 1
+    assert dedup.check(3, "ガンマ計画の担当者は佐藤さんで、進捗は毎週金曜日に報告します。") is None
+    assert dedup.dropped == 1
+
+
+def test_added_chunks_are_matched_but_never_dropped():
+    dedup = NearDuplicateFilter(0.8)
+    dedup.add(10, BASE)
+    dedup.add(11, BASE)
+
+    assert dedup.check(12, BASE) == 10
+    assert dedup.dropped == 1
@@ -0,0 +1,56 @@
+import sqlite3
+from pathlib import Path
+
+from app.services.lexical_index import (
+    build_lexical_index,
+    is_decisive,
+    lexical_terms,
+    reciprocal_rank_fusion,
+    search_lexical_index,
+)
+
+
+def test_terms_split_cjk_into_bigrams_and_latin_into_words():
+    assert lexical_terms("東京タワーの高さは333m、型番ＡＢＣ-123") == [
+        "東京", "京タ", "タワ", "ワー", "ーの", "の高", "高さ", "さは", "333m", "型番", "abc", "123",
+    ]
+    assert lexical_terms("猫") == ["猫"]
+
+
+def _docstore(tmp_path: Path, contents: list[str]) -> Path:
+    path = tmp_path / "docs.sqlite"
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE documents (id INTEGER PRIMARY KEY, content TEXT)")
+    connection.executemany("INSERT INTO documents VALUES (?, ?)", enumerate(contents))
+    connection.commit()
+    connection.close()
+    return path
+
+
+def test_bm25_search_ranks_the_matching_document_first(tmp_path):
+    path = _docstore(
+        tmp_path,
+        ["型番 XR-1007 の保証期間は2年です。", "型番 XR-2000 の保証期間は3年です。", "湿度の管理基準について。"],
+    )
+    assert build_lexical_index(path) == 3
+    connection = sqlite3.connect(path)
+
+    hits = search_lexical_index(connection, "XR-1007 の保証", 5)
+
+    assert [doc_id for doc_id, _ in hits][:2] == [0, 1]
+    assert hits[0][1] > hits[1][1]
+    assert search_lexical_index(connection, "、。！", 5) == []
+
+
+def test_decisive_requires_every_term_and_a_clear_margin():
+    assert is_decisive("XR-1007", [(0, 9.0), (1, 2.0)], "型番 XR-1007", ratio=2.0)
+    assert not is_decisive("XR-1007", [(0, 9.0), (1, 6.0)], "型番 XR-1007", ratio=2.0)
+    assert not is_decisive("XR-1007 価格", [(0, 9.0)], "型番 XR-1007", ratio=2.0)
+    assert not is_decisive("XR-1007", [(0, 9.0)], "型番 XR-1007", ratio=0)
+
+
+def test_rrf_rewards_documents_found_by_both_rankings():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 4]], rrf_k=60)
+
+    assert [doc_id for doc_id, _ in fused] == [3, 1, 2, 4]
+    assert fused[0][1] == 1 / 63 + 1 / 61
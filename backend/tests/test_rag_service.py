@@ -0,0 +1,175 @@
+import asyncio
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app.cli.ingest import IngestOptions, ingest
+from app.core.providers import load_providers_config
+from app.providers.embedding import EmbeddingClient
+from app.services import rag_service as rag_service_module
+from app.services.rag_index import namespace_index_path
+from app.services.rag_service import RagService
+
+
+def _publish(tmp_path: Path, providers_path: Path, files: dict[str, str], namespace: str | None = None) -> None:
+    source = tmp_path / f"source-{namespace or 'default'}"
+    source.mkdir(exist_ok=True)
+    for name, text in files.items():
+        (source / name).write_text(text, encoding="utf-8")
+    index_path = namespace_index_path(tmp_path / "index" / "index.bin", namespace)
+    ingest(source, providers_path, index_path, options=IngestOptions())
+
+
+def _service(providers_path: Path, embedding_server, **overrides) -> RagService:
+    config = load_providers_config(providers_path)
+    rag_config = config.rag.model_copy(update=overrides)
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(embedding_server.handle))
+    return RagService(rag_config, EmbeddingClient(config.embedding, http_client))
+
+
+def test_missing_character_namespace_is_probed_once(tmp_path, providers_path, embedding_server, monkeypatch):
+    _publish(tmp_path, providers_path, {"shared.md": "共有の資料には営業時間が書かれています。"})
+    service = _service(providers_path, embedding_server)
+    opened: list[Path] = []
+    real_open = rag_service_module.open_rag_index
+
+    def counting_open(index_dir: Path, name: str):
+        opened.append(index_dir)
+        return real_open(index_dir, name)
+
+    monkeypatch.setattr(rag_service_module, "open_rag_index", counting_open)
+
+    async def main() -> list[str | None]:
+        await service.load()
+        opened.clear()
+        namespaces = []
+        for _ in range(3):
+            result = await service.search_detailed("営業時間", character_id=7)
+            namespaces.append(result.namespace)
+        return namespaces
+
+    assert asyncio.run(main()) == [None, None, None]
+    assert opened == [tmp_path / "index" / "namespaces" / "character-7"]
+
+
+def test_watcher_tick_forgets_missing_namespaces(tmp_path, providers_path, embedding_server):
+    _publish(tmp_path, providers_path, {"shared.md": "共有の資料には営業時間が書かれています。"})
+    service = _service(providers_path, embedding_server, reload_interval_sec=0.01)
+
+    async def main() -> str | None:
+        await service.load()
+        await service.search_detailed("好きな食べ物", character_id=7)
+        _publish(tmp_path, providers_path, {"profile.md": "キャラクター7の好きな食べ物はりんごです。"}, "character-7")
+        service.start_watching()
+        try:
+            await asyncio.sleep(0.05)
+            return (await service.search_detailed("好きな食べ物", character_id=7)).namespace
+        finally:
+            await service.stop_watching()
+
+    assert asyncio.run(main()) == "character-7"
+
+
+def test_published_namespace_is_used_after_reload(tmp_path, providers_path, embedding_server):
+    _publish(tmp_path, providers_path, {"shared.md": "共有の資料には営業時間が書かれています。"})
+    service = _service(providers_path, embedding_server)
+
+    async def main() -> tuple[str | None, str | None, list[str]]:
+        await service.load()
+        before = (await service.search_detailed("好きな食べ物", character_id=7)).namespace
+        _publish(tmp_path, providers_path, {"profile.md": "キャラクター7の好きな食べ物はりんごです。"}, "character-7")
+        # インジェストジョブと同じく、公開後に名前空間を再読み込みすると未公開の記録も消える。
+        assert await service.reload(namespace="character-7")
+        result = await service.search_detailed("好きな食べ物", character_id=7)
+        return before, result.namespace, [doc.page_content for doc in result.documents]
+
+    before, after, contents = asyncio.run(main())
+
+    assert before is None
+    assert after == "character-7"
+    assert contents == ["キャラクター7の好きな食べ物はりんごです。"]
+
+
+def test_explicit_unknown_namespace_returns_nothing(tmp_path, providers_path, embedding_server):
+    _publish(tmp_path, providers_path, {"shared.md": "共有の資料には営業時間が書かれています。"})
+    service = _service(providers_path, embedding_server)
+
+    async def main():
+        await service.load()
+        return await service.search_detailed("営業時間", namespace="character-9")
+
+    result = asyncio.run(main())
+
+    assert result.documents == []
+    assert result.namespace == "character-9"
+
+
+@pytest.mark.parametrize("namespace", ["../escape", ".hidden", ""])
+def test_invalid_namespace_is_rejected(providers_path, embedding_server, namespace):
+    service = _service(providers_path, embedding_server)
+
+    with pytest.raises(ValueError):
+        asyncio.run(service.reload(namespace=namespace))
+
+
+PRODUCTS = {f"product-{i}.md": f"製品{i}の説明です。型番 XR-{1000 + i} の保証期間は{i}年です。" for i in range(8)}
+
+
+def test_hybrid_results_keep_vector_distances(tmp_path, providers_path, embedding_server):
+    _publish(tmp_path, providers_path, PRODUCTS)
+    options = {"top_k": 3, "hybrid_candidates": 3, "lexical_fast_path_ratio": 0}
+    hybrid = _service(providers_path, embedding_server, **options)
+    vector_only = _service(providers_path, embedding_server, hybrid_search=False, **options)
+
+    async def main():
+        await hybrid.load()
+        await vector_only.load()
+        results = []
+        for query in ["XR-1005 の保証期間", "XR-1002", "製品7"]:
+            results.append((await hybrid.search_detailed(query), await vector_only.search_detailed(query)))
+        return results
+
+    lexical_only = 0
+    for fused, vector in asyncio.run(main()):
+        assert fused.mode == "hybrid" and vector.mode == "vector"
+        expected = {doc.page_content: distance for doc, distance in zip(vector.documents, vector.distances)}
+        assert len(fused.distances) == len(fused.documents)
+        for doc, distance in zip(fused.documents, fused.distances):
+            # ベクトル側で見つかった文書はその距離を、語彙検索だけで見つかった文書は None を持つ。
+            assert distance == expected.get(doc.page_content)
+            lexical_only += distance is None
+    assert lexical_only > 0
+
+
+def test_distance_gate_applies_to_hybrid_search(tmp_path, providers_path, embedding_server):
+    _publish(tmp_path, providers_path, PRODUCTS)
+    service = _service(providers_path, embedding_server, gate_max_distance=0.01, lexical_fast_path_ratio=0)
+
+    async def main():
+        await service.load()
+        return await service.search_detailed("XR-1005 の保証期間", gate=True)
+
+    result = asyncio.run(main())
+
+    assert result.mode == "hybrid"
+    assert result.top_distance is not None and result.top_distance > 0.01
+    assert result.skipped_reason == "low_similarity"
+    assert result.documents == []
+    gate = service.status()["gate"]
+    assert gate["retrieved"] == 0
+    assert gate["skipped"] == {"low_similarity": 1}
+
+
+def test_distance_gate_keeps_close_results(tmp_path, providers_path, embedding_server):
+    _publish(tmp_path, providers_path, PRODUCTS)
+    service = _service(providers_path, embedding_server, gate_max_distance=1000.0, lexical_fast_path_ratio=0)
+
+    async def main():
+        await service.load()
+        return await service.search_detailed("XR-1005 の保証期間", gate=True)
+
+    result = asyncio.run(main())
+
+    assert result.skipped_reason is None and result.documents
+    assert service.status()["gate"]["retrieved"] == 1
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from app.core.providers import ResponseCacheConfig
+from app.services import response_cache
+from app.services.response_cache import SemanticResponseCache, build_cache_scope
+
+
+@pytest.fixture
+def cache() -> SemanticResponseCache:
+    return SemanticResponseCache(ResponseCacheConfig(enabled=True, similarity_threshold=0.9))
+
+
+def _vector(*values: float) -> np.ndarray:
+    return np.array(values, dtype=np.float32)
+
+
+def test_hit_requires_same_scope_and_similar_query(cache):
+    cache.store(_vector(1, 0, 0), "a", 1, "answer", "context")
+
+    hit = cache.lookup(_vector(1, 0.1, 0), "a", 1)
+
+    assert hit is not None and hit.assistant_text == "answer"
+    assert cache.lookup(_vector(0, 1, 0), "a", 1) is None
+    assert cache.lookup(_vector(1, 0, 0), "b", 1) is None
+
+
+def test_new_index_version_expires_stale_entries(cache):
+    cache.store(_vector(1, 0, 0), "a", 1, "old answer", "context")
+
+    assert cache.lookup(_vector(1, 0, 0), "a", 2) is None
+    assert cache.stats()["invalidations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_new_index_version_keeps_entries_of_other_namespaces(cache):
+    cache.store(_vector(1, 0, 0), "a", 1, "old answer", "context")
+    cache.store(_vector(1, 0, 0), "b", 7, "other namespace", "context")
+
+    assert cache.lookup(_vector(1, 0, 0), "a", 2) is None
+    # 世代は名前空間ごとに数えるので、a の世代で引いても b のエントリは消えない。
+    hit = cache.lookup(_vector(1, 0, 0), "b", 7)
+    assert hit is not None and hit.assistant_text == "other namespace"
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache = SemanticResponseCache(ResponseCacheConfig(enabled=True, ttl_sec=60))
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    cache.store(_vector(1, 0), "a", 1, "answer", "")
+
+    now[0] += 61
+
+    assert cache.lookup(_vector(1, 0), "a", 1) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_oldest_entry_is_evicted_and_audio_is_returned():
+    cache = SemanticResponseCache(ResponseCacheConfig(enabled=True, max_entries=1))
+    first = cache.store(_vector(1, 0), "a", 1, "first", "")
+    second = cache.store(_vector(0, 1), "a", 1, "second", "")
+    cache.attach_audio(first, [b"stale"])
+    cache.attach_audio(second, [b"\x01\x00", b"\x02\x00"])
+
+    assert cache.lookup(_vector(1, 0), "a", 1) is None
+    hit = cache.lookup(_vector(0, 1), "a", 1)
+    assert hit is not None and hit.audio_chunks == [b"\x01\x00", b"\x02\x00"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_scope_changes_with_the_system_prompt():
+    assert build_cache_scope(None, "prompt") == build_cache_scope(None, "prompt")
+    assert build_cache_scope(None, "prompt") != build_cache_scope(None, "other prompt")
+
+
+def test_scope_includes_namespace():
+    assert build_cache_scope(None, "prompt", "character-1") != build_cache_scope(None, "prompt", "character-2")
+    assert build_cache_scope(None, "prompt", "character-1") != build_cache_scope(None, "prompt")
+    assert build_cache_scope(None, "prompt") == build_cache_scope(None, "prompt", None)
+
+
+def test_disabled_cache_stores_nothing():
+    cache = SemanticResponseCache(ResponseCacheConfig(enabled=False))
+
+    assert cache.store(_vector(1, 0), "a", 1, "answer", "") is None
+    assert cache.lookup(_vector(1, 0), "a", 1) is None
@@ -0,0 +1,41 @@
+import pytest
+
+from app.services.retrieval_gate import RetrievalGate
+
+
+@pytest.mark.parametrize(
+    ("query", "reason"),
+    [
+        ("こんにちは", "small_talk"),
+        ("それで", "short_utterance"),
+        ("住所は？", "query"),
+        ("X12", "code"),
+        ("ＡＢ", "code"),
+        ("保証期間を教えて", "query"),
+    ],
+)
+def test_decide(query, reason):
+    decision = RetrievalGate().decide(query)
+
+    assert decision.reason == reason
+    assert decision.retrieve == (reason in {"query", "code"})
+
+
+def test_extra_small_talk_and_disabled_gate():
+    assert RetrievalGate(extra_small_talk="了解です").decide("了解です！").reason == "small_talk"
+    assert RetrievalGate(enabled=False).decide("こんにちは").retrieve
+
+
+def test_each_turn_is_counted_once():
+    gate = RetrievalGate()
+    gate.record_retrieval(10.0)
+    gate.record_skip("small_talk")
+    gate.record_skip("low_similarity", saved_retrieval=False, elapsed_ms=20.0)
+
+    stats = gate.stats()
+
+    assert stats["retrieved"] == 1
+    assert stats["skipped"] == {"small_talk": 1, "low_similarity": 1}
+    assert stats["skip_rate"] == round(2 / 3, 4)
+    assert stats["avg_retrieval_ms"] == 11.0
+    assert stats["estimated_saved_ms"] == 11.0
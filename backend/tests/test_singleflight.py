@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from app.providers.singleflight import SingleFlight, canonical_key
+
+
+def test_canonical_key_ignores_key_order():
+    assert canonical_key("llm", {"a": 1, "b": [1, 2]}) == canonical_key("llm", {"b": [1, 2], "a": 1})
+    assert canonical_key("llm", {"a": 1}) != canonical_key("tts", {"a": 1})
+
+
+def test_concurrent_calls_share_one_upstream_call():
+    calls = 0
+
+    async def fetch() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def main() -> list[str]:
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+        assert flight.stats() == {"in_flight": 0, "leader_count": 1, "coalesced_count": 4}
+        return results
+
+    assert asyncio.run(main()) == ["result"] * 5
+    assert calls == 1
+
+
+def test_error_is_raised_to_every_waiter_and_the_next_call_retries():
+    attempts = 0
+
+    async def fetch() -> str:
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(0.01)
+        if attempts == 1:
+            raise RuntimeError("upstream down")
+        return "recovered"
+
+    async def main() -> None:
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(3)), return_exceptions=True)
+        assert [str(result) for result in results] == ["upstream down"] * 3
+        assert await flight.do("key", fetch) == "recovered"
+
+    asyncio.run(main())
+    assert attempts == 2
+
+
+def test_upstream_is_cancelled_only_when_every_waiter_cancels():
+    async def main() -> None:
+        flight = SingleFlight()
+        cancelled = False
+
+        async def fetch() -> str:
+            nonlocal cancelled
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+            return "never"
+
+        first = asyncio.create_task(flight.do("key", fetch))
+        second = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        assert not cancelled
+        second.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await second
+        await asyncio.sleep(0)
+        assert cancelled
+
+    asyncio.run(main())
+
+
+def test_stream_replays_items_to_late_subscribers():
+    produced = 0
+
+    async def source():
+        nonlocal produced
+        for chunk in (b"a", b"b", b"c"):
+            produced += 1
+            yield chunk
+            await asyncio.sleep(0.005)
+
+    async def collect(flight: SingleFlight, delay: float) -> list[bytes]:
+        await asyncio.sleep(delay)
+        return [chunk async for chunk in flight.stream("key", source)]
+
+    async def main() -> list[list[bytes]]:
+        flight = SingleFlight()
+        return await asyncio.gather(collect(flight, 0), collect(flight, 0.007))
+
+    assert asyncio.run(main()) == [[b"a", b"b", b"c"]] * 2
+    assert produced == 3
+
+
+def test_stream_error_reaches_every_subscriber():
+    async def source():
+        yield b"a"
+        await asyncio.sleep(0.005)
+        raise RuntimeError("tts failed")
+
+    async def collect(flight: SingleFlight) -> list[bytes]:
+        return [chunk async for chunk in flight.stream("key", source)]
+
+    async def main() -> list[object]:
+        flight = SingleFlight()
+        return await asyncio.gather(collect(flight), collect(flight), return_exceptions=True)
+
+    assert [str(result) for result in asyncio.run(main())] == ["tts failed"] * 2
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from app.core.providers import TTSProviderConfig
+from app.providers.tts import TTSClient
+from app.providers.tts_pipeline import TTSPipeline, split_sentences
+
+
+def test_split_sentences_merges_short_fragments():
+    assert split_sentences("はい。今日は晴れです。明日の天気は雨の予報です！") == [
+        "はい。今日は晴れです。",
+        "明日の天気は雨の予報です！",
+    ]
+    assert split_sentences("It works fine. Really well, in fact.") == ["It works fine.", "Really well, in fact."]
+    assert split_sentences("") == []
+
+
+def _collect(pipeline: TTSPipeline, sentences: list[str]) -> list[bytes]:
+    async def main() -> list[bytes]:
+        return [chunk async for chunk in pipeline.stream(sentences)]
+
+    return asyncio.run(main())
+
+
+def test_audio_is_delivered_in_sentence_order():
+    delays = {"first": 0.03, "second": 0.0, "third": 0.01}
+
+    async def synthesize(text: str):
+        await asyncio.sleep(delays[text])
+        yield f"{text}-1".encode()
+        yield f"{text}-2".encode()
+
+    chunks = _collect(TTSPipeline(synthesize, max_in_flight=3), ["first", "second", "third"])
+
+    assert chunks == [b"first-1", b"first-2", b"second-1", b"second-2", b"third-1", b"third-2"]
+
+
+def test_later_sentences_stop_buffering_at_the_memory_budget():
+    produced = {"head": 0, "next": 0}
+    next_before_head_done: list[int] = []
+
+    async def synthesize(text: str):
+        for _ in range(20):
+            if text == "head":
+                await asyncio.sleep(0.002)
+            produced[text] += 1
+            yield b"x" * 100
+        if text == "head":
+            next_before_head_done.append(produced["next"])
+
+    pipeline = TTSPipeline(synthesize, max_in_flight=2, memory_budget_bytes=300)
+
+    chunks = _collect(pipeline, ["head", "next"])
+
+    assert len(chunks) == 40
+    assert pipeline.budget_waits > 0
+    # 先頭の文が終わるまで、後続の文は上限 (3 チャンク) + 待機中の 1 チャンクまでしか読み出さない。
+    assert next_before_head_done[0] <= 4
+
+
+def test_error_is_raised_after_earlier_sentences_are_delivered():
+    async def synthesize(text: str):
+        if text == "broken":
+            raise RuntimeError("tts failed")
+        yield text.encode()
+
+    async def main() -> list[bytes]:
+        received: list[bytes] = []
+        with pytest.raises(RuntimeError, match="tts failed"):
+            async for chunk in TTSPipeline(synthesize).stream(["ok", "broken", "never"]):
+                received.append(chunk)
+        return received
+
+    assert asyncio.run(main()) == [b"ok"]
+
+
+@pytest.mark.parametrize(("output_format", "expected_calls"), [("pcm", 2), ("opus", 1)])
+def test_client_pipelines_sentences_only_for_raw_pcm(output_format, expected_calls):
+    config = TTSProviderConfig(provider="fish-speech", endpoint="http://tts.test", output_format=output_format)
+    client = TTSClient(config, http_client=None)  # type: ignore[arg-type]
+    calls: list[str] = []
+
+    async def fake_stream_tts(text: str, voice: str | None = None):
+        calls.append(text)
+        yield text.encode()
+
+    client.stream_tts = fake_stream_tts  # type: ignore[method-assign]
+    text = "今日は晴れています。明日は雨になりそうです。"
+
+    async def main() -> list[bytes]:
+        return [chunk async for chunk in client.stream_sentences(text)]
+
+    assert b"".join(asyncio.run(main())).decode() == text
+    assert len(calls) == expected_calls